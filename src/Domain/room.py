@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+# RoomStateManager の判定パラメータ名（部屋ごとに上書きできるもの）
+STATE_PARAM_NAMES = (
+    "grace_period_sec",
+    "arrival_window_before_sec",
+    "arrival_window_after_sec",
+    "cleanup_margin_sec",
+)
+
+
+@dataclass
+class Room:
+    """
+    監視対象の部屋1つを表すドメインモデル。
+
+    - device_ids: この部屋を映しているカメラ (device_id) の一覧
+    - *_sec     : RoomStateManager の判定パラメータ。None なら RoomStateManager の既定値を使う
+    """
+
+    room_id: str
+    name: str = ""
+    device_ids: List[str] = field(default_factory=list)
+    grace_period_sec: Optional[int] = None
+    arrival_window_before_sec: Optional[int] = None
+    arrival_window_after_sec: Optional[int] = None
+    cleanup_margin_sec: Optional[int] = None
+
+    def state_params(self) -> dict[str, int]:
+        """
+        上書き指定のある判定パラメータだけを dict で返す。
+        """
+        return {
+            name: getattr(self, name)
+            for name in STATE_PARAM_NAMES
+            if getattr(self, name) is not None
+        }
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "room_id": self.room_id,
+            "name": self.name,
+            "device_ids": list(self.device_ids),
+            **{name: getattr(self, name) for name in STATE_PARAM_NAMES},
+        }
@@ -3,78 +3,301 @@ import base64
 import json
 import sys
 import os
+import threading
 from dotenv import load_dotenv
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
-from SmartCamera import ObjectDetectionTop
-from SmartCamera import BoundingBox
-from SmartCamera import BoundingBox2d
+import numpy as np
+from Repository.token_manager import AccessTokenManager
+from Repository.http_client import ConsoleHttpClient, get_shared_http_client
+from Repository.inference_log import InferenceLogWriter
+from datetime import datetime
+from time_utils import JST, now_jst
+from Repository.detection_decoder import (
+    DETECTION_DTYPE,
+    count_by_class,
+    decode_detections,
+    decode_detections_dict,
+    read_area_counts,
+)
 
 class AiCameraRepository:
-    def __init__(self, console_endpoint: str, auth_endpoint: str, client_id: str, client_secret: str, device_id: str):
+    def __init__(self, console_endpoint: str, auth_endpoint: str, client_id: str, client_secret: str, device_id: str, http_client: ConsoleHttpClient = None, recorder: InferenceLogWriter = None):
         self.console_endpoint = console_endpoint
         self.auth_endpoint = auth_endpoint
         self.client_id = client_id
         self.client_secret = client_secret
         self.device_id = device_id
+        # 接続はプール済みセッションを共有し、タイムアウト・リトライもそこで付与する
+        self._http = http_client or get_shared_http_client()
+        # アクセストークンは有効期限までキャッシュして使い回す
+        self._token_manager = AccessTokenManager(auth_endpoint, client_id, client_secret, http_client=self._http)
+        # デバイスごとの「最後に見た推論結果のキー」と、最新結果（デコード済みビューのキャッシュ付き）
+        self._watermarks = {}
+        self._latest = {}
+        self._decodes = 0
+        self._area_count_reads = 0
+        self._skipped_polls = 0
+        self._lock = threading.Lock()
+        # 指定されていれば、新しく届いた生ペイロードをすべてログに記録する（障害調査のリプレイ用）
+        self._recorder = recorder
 
-    def fetch_inference_result(self) -> dict:
+    def _get_with_auth(self, url: str) -> requests.Response:
         """
-        カメラの推論結果を成形して返す
+        キャッシュ済みトークンで GET し、401 の場合はトークンを取り直して1回だけ再試行する
+        """
+        access_token = self._token_manager.get_token()
+        response = self._http.get(url, headers={'Authorization': f'Bearer {access_token}'})
+        if response.status_code == 401:
+            self._token_manager.invalidate(access_token)
+            access_token = self._token_manager.get_token()
+            response = self._http.get(url, headers={'Authorization': f'Bearer {access_token}'})
+        return response
+
+    def get_stats(self) -> dict:
+        """
+        監視用の統計情報を返す
         """
+        with self._lock:
+            decode = {
+                'decodes': self._decodes,
+                'area_count_reads': self._area_count_reads,
+                'skipped_polls': self._skipped_polls,
+            }
+        stats = {'token': self._token_manager.stats(), 'http': self._http.stats(), 'decode': decode}
+        if self._recorder is not None:
+            stats['recorder'] = self._recorder.stats()
+        return stats
+
+    def _fetch_raw_results(self, device_id: str, limit: int) -> list:
+        """
+        コンソールから推論結果を新しい順に最大 limit 件取得する。失敗時は None
+        """
+        # アクセストークンは AccessTokenManager がキャッシュ・更新する
+        url = f"{self.console_endpoint}/inferenceresults/devices/{device_id}?limit={limit}&scope=full"
+        
+        response = self._get_with_auth(url)
         
-        # 1. アクセストークン取得
-        auth = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
-        headers = {
-            'authorization': f'Basic {auth}',
-            'content-type': 'application/x-www-form-urlencoded'
-        }
-        data = 'grant_type=client_credentials&scope=system'
+        if response.status_code != 200:
+            return None
+        
+        return response.json()['data']
+    
+    @staticmethod
+    def _result_key(item: dict):
+        """
+        推論結果1件を識別するキー。推論時刻 T を優先し、なければ結果 ID を使う
+        """
+        inferences = item.get('inference_result', {}).get('Inferences') or [{}]
+        return inferences[0].get('T') or item.get('id') or item.get('_ts')
+    
+    def _take_new_results(self, device_id: str, items: list) -> list:
+        """
+        新しい順に並んだ items から、前回までに見た結果 (watermark) より新しいものだけを
+        古い順にして返し、watermark を最新の結果に進める
+        """
+        with self._lock:
+            watermark = self._watermarks.get(device_id)
+            new_items = []
+            for item in items:
+                if watermark is not None and self._result_key(item) == watermark:
+                    break
+                new_items.append(item)
+            
+            if new_items:
+                self._watermarks[device_id] = self._result_key(new_items[0])
+                # 最新結果のデコード済みビューは、必要になった時点で作ってキャッシュする
+                self._latest[device_id] = {'inference': new_items[0]['inference_result']['Inferences'][0]}
+            else:
+                self._skipped_polls += 1
         
-        response = requests.post(self.auth_endpoint, headers=headers, data=data)
-        access_token = response.json()['access_token']
+        new_items.reverse()
+        if self._recorder is not None:
+            self._record(device_id, new_items)
+        return new_items
+    
+    @staticmethod
+    def _inference_time(inference: dict):
+        """
+        推論時刻 T (yyyyMMddHHmmssfff, JST) を datetime にする。なければ・読めなければ受信時刻
+        まとめて取得したフレームも、それぞれの推論時刻で記録して再生時の間隔を保つため
+        """
+        t = inference.get('T')
+        if isinstance(t, str) and len(t) == 17 and t.isdigit():
+            try:
+                return datetime.strptime(t[:14], '%Y%m%d%H%M%S').replace(
+                    microsecond=int(t[14:]) * 1000, tzinfo=JST
+                )
+            except ValueError:
+                pass
+        return now_jst()
+    
+    def _record(self, device_id: str, items: list) -> None:
+        for item in items:
+            inference = item['inference_result']['Inferences'][0]
+            if 'O' not in inference:
+                continue
+            try:
+                self._recorder.append(
+                    device_id, self._inference_time(inference), base64.b64decode(inference['O'])
+                )
+            except Exception as e:
+                # 記録の失敗で監視を止めない
+                print(f"[AiCameraRepository] failed to record inference: {e}")
+    
+    def _latest_view(self, device_id: str, kind: str, compute):
+        """
+        デバイスの最新結果について kind ('dict' / 'array' / 'counts:...') のビューを返す
+        まだ作っていなければ compute(inference) で作ってキャッシュする。結果がなければ None
+        """
+        with self._lock:
+            entry = self._latest.get(device_id)
+            if entry is None:
+                return None
+            if kind in entry:
+                return entry[kind]
         
-        # 2. 推論結果取得
-        headers = {'Authorization': f'Bearer {access_token}'}
-        url = f"{self.console_endpoint}/inferenceresults/devices/{self.device_id}?limit=1&scope=full"
+        value = compute(entry['inference'])
+        with self._lock:
+            entry[kind] = value
+        return value
+    
+    def _decode_inference(self, inference: dict, as_array: bool = False):
+        """
+        Inferences の1要素 ('O' に Base64 の FlatBuffers) をデコードする
+        as_array=True なら DETECTION_DTYPE の構造化配列、そうでなければ従来の dict 形式 (O 以外のメタ情報付き)
+        dict 形式は配列を経由せずに組み立てる (検出が少ない通常のケースではそのほうが速い)
+        """
+        # Base64 でデコード
+        if 'O' not in inference:
+            return self._empty_view(as_array)
+        buf_decode = base64.b64decode(inference['O'])
         
-        response = requests.get(url, headers=headers)
+        with self._lock:
+            self._decodes += 1
         
-        if response.status_code != 200:
+        if as_array:
+            # FlatBuffers のベクタを直接辿って、検出を1つの構造化配列にする
+            return decode_detections(buf_decode)
+        meta = {k: v for k, v in inference.items() if k != 'O'}
+        return decode_detections_dict(buf_decode, base=meta)
+    
+    @staticmethod
+    def _empty_view(as_array: bool):
+        return np.empty(0, dtype=DETECTION_DTYPE) if as_array else {}
+    
+    def _latest_decoded(self, device_id: str, as_array: bool):
+        """
+        最新結果のデコード済みビュー。dict は呼び出し側が書き換えても影響しないようコピーを返す
+        """
+        view = self._latest_view(
+            device_id, 'array' if as_array else 'dict', lambda inference: self._decode_inference(inference, as_array)
+        )
+        if view is None:
+            return self._empty_view(as_array)
+        return view if as_array else dict(view)
+    
+    def fetch_inference_result(self, device_id: str = None, as_array: bool = False):
+        """
+        カメラの推論結果を成形して返す
+        前回から新しい推論結果が来ていなければ、デコードせずに前回の結果を返す
+        as_array=True なら dict ではなく DETECTION_DTYPE の構造化配列を返す
+        """
+        device_id = device_id or self.device_id
+        
+        items = self._fetch_raw_results(device_id, limit=1)
+        if items is None:
             return {"message": "Failed to get inference result"}
         
-        if len(response.json()['data']) == 0:
-            return {}
+        if len(items) == 0:
+            return self._empty_view(as_array)
         
-        buf = response.json()['data'][0]['inference_result']
+        self._take_new_results(device_id, items)
+        return self._latest_decoded(device_id, as_array)
+    
+    def fetch_new_inference_results(self, device_id: str = None, limit: int = 10, as_array: bool = False) -> list:
+        """
+        前回取得以降に届いた推論結果を、最大 limit 件まとめて古い順に返す
+        ポーリングが遅れてもその間のフレームを取りこぼさないようにするためのもの
+        新しい結果がなければ空リスト、取得に失敗した場合は None を返す
+        """
+        device_id = device_id or self.device_id
         
-        # Base64 でデコード
-        if 'O' in buf['Inferences'][0]:
-            buf_decode = base64.b64decode(buf['Inferences'][0]['O'])
-        else:
+        items = self._fetch_raw_results(device_id, limit=limit)
+        if items is None:
+            return None
+        
+        new_items = self._take_new_results(device_id, items)
+        results = [
+            self._decode_inference(item['inference_result']['Inferences'][0], as_array)
+            for item in new_items[:-1]
+        ]
+        if new_items:
+            results.append(self._latest_decoded(device_id, as_array))
+        return results
+    
+    def fetch_new_payloads(self, device_id: str = None, limit: int = 1) -> list:
+        """
+        前回取得以降に届いた推論結果の生ペイロード ('O' の Base64 文字列) を古い順に返す
+        デコードは呼び出し側 (DecodePool など) に任せる。取得に失敗した場合は None
+        """
+        device_id = device_id or self.device_id
+        
+        items = self._fetch_raw_results(device_id, limit=limit)
+        if items is None:
+            return None
+        
+        payloads = []
+        for item in self._take_new_results(device_id, items):
+            inference = item['inference_result']['Inferences'][0]
+            if 'O' in inference:
+                payloads.append(inference['O'])
+        return payloads
+    
+    def fetch_class_counts(self, device_id: str = None, prefer_area_count: bool = True) -> dict:
+        """
+        最新の推論結果からクラスごとの検出数 {class_id: count} を返す
+        prefer_area_count=True なら AreaCount ベクタを読み、付いていない場合だけ検出をデコードして数える
+        新しい結果がなければ前回の値を返す。取得に失敗した場合は None
+        """
+        device_id = device_id or self.device_id
+        
+        items = self._fetch_raw_results(device_id, limit=1)
+        if items is None:
+            return None
+        
+        if len(items) == 0:
             return {}
         
-        # デコードしたデータをflatbuffersでデシリアライズ
-        ppl_out = ObjectDetectionTop.ObjectDetectionTop.GetRootAsObjectDetectionTop(buf_decode, 0)
-        obj_data = ppl_out.Perception()
-        res_num = obj_data.ObjectDetectionListLength()
-        
-        # 逆シリアライズしたデータをjson形式で保存
-        buf['Inferences'][0].pop('O')
-        for i in range(res_num):
-            obj_list = obj_data.ObjectDetectionList(i)
-            union_type = obj_list.BoundingBoxType()
-            if union_type == BoundingBox.BoundingBox.BoundingBox2d:
-                bbox_2d = BoundingBox2d.BoundingBox2d()
-                bbox_2d.Init(obj_list.BoundingBox().Bytes, obj_list.BoundingBox().Pos)
-                buf['Inferences'][0][str(i + 1)] = {}
-                buf['Inferences'][0][str(i + 1)]['C'] = obj_list.ClassId()
-                buf['Inferences'][0][str(i + 1)]['P'] = obj_list.Score()
-                buf['Inferences'][0][str(i + 1)]['X'] = bbox_2d.Left()
-                buf['Inferences'][0][str(i + 1)]['Y'] = bbox_2d.Top()
-                buf['Inferences'][0][str(i + 1)]['x'] = bbox_2d.Right()
-                buf['Inferences'][0][str(i + 1)]['y'] = bbox_2d.Bottom()
-        
-        return buf['Inferences'][0]
+        self._take_new_results(device_id, items)
+        counts = self._latest_view(
+            device_id, f'counts:{prefer_area_count}', lambda inference: self._count_inference(inference, prefer_area_count)
+        )
+        return dict(counts or {})
+    
+    def _count_inference(self, inference: dict, prefer_area_count: bool) -> dict:
+        if 'O' not in inference:
+            return {}
+        buf = base64.b64decode(inference['O'])
+        
+        if prefer_area_count:
+            counts = read_area_counts(buf)
+            if counts is not None:
+                with self._lock:
+                    self._area_count_reads += 1
+                return counts
+        
+        with self._lock:
+            self._decodes += 1
+        return count_by_class(decode_detections(buf))
+    
+    def reset_watermark(self, device_id: str = None) -> None:
+        """
+        watermark を破棄し、次回は最新の結果を改めてデコードさせる
+        """
+        device_id = device_id or self.device_id
+        with self._lock:
+            self._watermarks.pop(device_id, None)
+            self._latest.pop(device_id, None)
     
     def fetch_dummy_result(self) -> dict:
         return 1
\ No newline at end of file
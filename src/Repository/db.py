@@ -1,7 +1,13 @@
 import os
+import queue
+import random
 import sqlite3
+import threading
+import time
 from pathlib import Path
 
+from time_utils import parse_jst_datetime, to_epoch_us
+
 # プロジェクトルートを自動推定
 # db.py は src/Repository/db.py にあるので、parents[2] がプロジェクトルート（/workspaces/C3 想定）
 BASE_DIR = Path(__file__).resolve().parents[2]
@@ -31,14 +37,156 @@ def ensure_db_dir():
     db_path.parent.mkdir(parents=True, exist_ok=True)
 
 
-def get_connection():
+# 接続を開いたときに設定する PRAGMA（接続ごとの設定なので、開くたびに必要）
+# - synchronous=NORMAL: WAL ではコミットごとの fsync を省いても壊れない
+# journal_mode=WAL はファイルに残る設定なので、init_db で一度だけ設定する
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+    f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))}",
+    f"PRAGMA cache_size=-{int(os.getenv('SQLITE_CACHE_KB', '16384'))}",
+)
+# BEGIN IMMEDIATE が busy_timeout 待っても書き込みロックを取れなかったときのやり直し回数
+SQLITE_BUSY_RETRIES = int(os.getenv("SQLITE_BUSY_RETRIES", "3"))
+# プロセス全体で手元に置いておく空き接続の上限（DB ファイルごと）。
+# Flask の threaded サーバーはリクエストごとに新しいスレッドで動くので、スレッドをまたいで使い回す。
+# 0 なら close() のたびに本当に閉じる（プール導入前と同じ）
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+
+_pools: dict = {}
+_pools_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"opened": 0, "reused": 0, "discarded": 0, "busy_retries": 0}
+
+
+class PooledConnection:
+    """
+    get_connection() が返す接続。sqlite3.Connection の薄いラッパーで、
+    close() で実際には閉じずに、ロールバックと row_factory の初期化をしてプールに戻す。
+    呼び出し側は従来どおり get_connection() → 使う → close() でよい。
+    """
+
+    __slots__ = ("_conn", "_path", "_closed")
+
+    def __init__(self, conn: sqlite3.Connection, path: str) -> None:
+        self._conn = conn
+        self._path = path
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    @property
+    def row_factory(self):
+        return self._conn.row_factory
+
+    @row_factory.setter
+    def row_factory(self, factory) -> None:
+        self._conn.row_factory = factory
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        conn = self._conn
+        try:
+            # コミットされずに残った変更は次の利用者に持ち越さない
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+        except sqlite3.Error:
+            conn.close()
+            return
+        try:
+            if SQLITE_POOL_SIZE <= 0:
+                raise queue.Full
+            _idle_connections(self._path).put_nowait(conn)
+        except queue.Full:
+            conn.close()
+            with _stats_lock:
+                _stats["discarded"] += 1
+
+
+def _idle_connections(path: str) -> "queue.LifoQueue[sqlite3.Connection]":
+    # 最後に返した接続から使う（ページキャッシュが温まっている）
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(path, queue.LifoQueue(maxsize=SQLITE_POOL_SIZE))
+    return pool
+
+
+def _open(path: str) -> sqlite3.Connection:
     ensure_db_dir()
-    return sqlite3.connect(get_db_path(), check_same_thread=False)
+    # プールの接続はスレッドをまたいで使う（同時に使うのは借りている1スレッドだけ）
+    conn = sqlite3.connect(
+        path, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000
+    )
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
+    return conn
 
 
-def init_db():
-    conn = get_connection()
-    cur = conn.cursor()
+def get_connection() -> PooledConnection:
+    """
+    プールから空き接続を1つ借りる（なければ開いて PRAGMA を設定する）。
+    使い終わったら close() で返すこと。DB_PATH が変わったら別のプールになる。
+    """
+    path = get_db_path()
+    if SQLITE_POOL_SIZE > 0:
+        try:
+            conn = _idle_connections(path).get_nowait()
+            key = "reused"
+        except queue.Empty:
+            conn = _open(path)
+            key = "opened"
+    else:
+        conn = _open(path)
+        key = "opened"
+    with _stats_lock:
+        _stats[key] += 1
+    return PooledConnection(conn, path)
+
+
+def begin_immediate(conn, retries: int = SQLITE_BUSY_RETRIES) -> None:
+    """
+    書き込みロックを取ってからトランザクションを始める（BEGIN IMMEDIATE）。
+    読んで確かめてから書く処理で、その間に他の接続の書き込みが割り込まないようにする。
+    ロックは busy_timeout まで待ち、それでも取れなければ少し間を空けて retries 回までやり直す。
+    """
+    for attempt in range(retries + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) or attempt == retries:
+                raise
+            with _stats_lock:
+                _stats["busy_retries"] += 1
+            # 同時に諦めた接続どうしが同じ間隔でぶつからないようにずらす
+            time.sleep(random.uniform(0, 0.05 * 2**attempt))
+
+
+def connection_stats() -> dict:
+    """
+    接続プールの統計（開いた数・再利用した数・上限超過で閉じた数・BEGIN IMMEDIATE のやり直し回数）。
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _create_base_schema(cur: sqlite3.Cursor) -> None:
+    """
+    スキーマバージョン 0（マイグレーション導入前）のテーブルを作る。
+    以降の変更は MIGRATIONS に足していく。
+    """
 
     # --- users テーブル（新規） ---
     cur.execute(
@@ -78,6 +226,35 @@ def init_db():
     """
     )
 
+    # --- rooms / room_devices テーブル（部屋レジストリ） ---
+    cur.execute(
+        """
+    CREATE TABLE IF NOT EXISTS rooms (
+      room_id                   TEXT PRIMARY KEY,
+      name                      TEXT NOT NULL DEFAULT '',
+      grace_period_sec          INTEGER,  -- NULL なら RoomStateManager の既定値
+      arrival_window_before_sec INTEGER,
+      arrival_window_after_sec  INTEGER,
+      cleanup_margin_sec        INTEGER
+    );
+    """
+    )
+    cur.execute(
+        """
+    CREATE TABLE IF NOT EXISTS room_devices (
+      room_id   TEXT NOT NULL,
+      device_id TEXT NOT NULL,
+      PRIMARY KEY (room_id, device_id)
+    );
+    """
+    )
+    cur.execute(
+        """
+    CREATE INDEX IF NOT EXISTS idx_room_devices_device
+      ON room_devices(device_id);
+    """
+    )
+
     # --- penalty_events テーブル（新規） ---
     cur.execute(
         """
@@ -107,5 +284,134 @@ def init_db():
     """
     )
 
+
+
+# --- マイグレーション ---
+#
+# スキーマバージョンは PRAGMA user_version に持つ。init_db() は起動のたびに呼ばれ、
+# 未適用のマイグレーションを古い順に適用してからバージョンを上げる。
+# 各マイグレーションは途中で止まっても（プロセスの終了など）次の起動でやり直せるように書く。
+
+# バックフィルで1回のトランザクションに書き換える行数
+# （大きな DB でも監視スレッドの書き込みを長く待たせない）
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "5000"))
+
+
+def _has_column(cur: sqlite3.Cursor, table: str, column: str) -> bool:
+    return any(row[1] == column for row in cur.execute(f"PRAGMA table_info({table})"))
+
+
+def _add_column(cur: sqlite3.Cursor, table: str, column: str, decl: str) -> None:
+    if not _has_column(cur, table, column):
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _backfill(conn, table: str, source_columns, target_columns, convert) -> int:
+    """
+    target_columns[0] が NULL の行を MIGRATION_BATCH_SIZE 行ずつ読み、
+    source_columns の値を convert した値で target_columns を埋める。埋めた行数を返す。
+    """
+    select_sql = (
+        f"SELECT rowid, {', '.join(source_columns)} FROM {table} "
+        f"WHERE {target_columns[0]} IS NULL LIMIT ?"
+    )
+    update_sql = (
+        f"UPDATE {table} SET {', '.join(c + ' = ?' for c in target_columns)} "
+        f"WHERE rowid = ?"
+    )
+    total = 0
+    while True:
+        rows = conn.execute(select_sql, (MIGRATION_BATCH_SIZE,)).fetchall()
+        if not rows:
+            return total
+        conn.executemany(
+            update_sql,
+            [tuple(convert(v) for v in row[1:]) + (row[0],) for row in rows],
+        )
+        conn.commit()
+        total += len(rows)
+
+
+def _iso_to_epoch_us(value: str) -> int:
+    return to_epoch_us(parse_jst_datetime(value))
+
+
+def _migrate_1_epoch_columns(conn) -> None:
+    """
+    時刻の範囲検索を ISO 文字列の比較から整数（UNIX エポックからのマイクロ秒）の比較に移す。
+    文字列の比較はオフセットが揃っていることが前提で、読み出しのたびに fromisoformat も要るため。
+
+    - reservations.start_us / end_us, penalty_events.timestamp_us を追加して既存行を埋める
+      （ISO 文字列の列も人が読む用にそのまま書き続ける）
+    - 範囲検索用の索引を整数列で作り直し、文字列の索引は消す
+    """
+    cur = conn.cursor()
+    _add_column(cur, "reservations", "start_us", "INTEGER")
+    _add_column(cur, "reservations", "end_us", "INTEGER")
+    _add_column(cur, "penalty_events", "timestamp_us", "INTEGER")
     conn.commit()
-    conn.close()
+
+    filled = _backfill(
+        conn, "reservations", ("start_time", "end_time"), ("start_us", "end_us"), _iso_to_epoch_us
+    )
+    filled += _backfill(
+        conn, "penalty_events", ("timestamp",), ("timestamp_us",), _iso_to_epoch_us
+    )
+    if filled:
+        print(f"[DB] backfilled epoch columns: {filled} rows")
+
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_res_room_us ON reservations(room_id, start_us, end_us)"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_res_user_us ON reservations(user_id, start_us)"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_penalty_user_us ON penalty_events(user_id, timestamp_us)"
+    )
+    cur.execute("DROP INDEX IF EXISTS idx_res_room_time")
+    cur.execute("DROP INDEX IF EXISTS idx_res_user_time")
+    cur.execute("DROP INDEX IF EXISTS idx_penalty_user_time")
+
+
+# (バージョン, 適用する関数)。バージョンは 1 から順に増やす
+MIGRATIONS = [
+    (1, _migrate_1_epoch_columns),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn) -> int:
+    """
+    未適用のマイグレーションを適用して、適用後のスキーマバージョンを返す。
+    """
+    version = get_schema_version(conn)
+    for target, apply in MIGRATIONS:
+        if target <= version:
+            continue
+        print(f"[DB] migrating schema {version} -> {target}")
+        apply(conn)
+        conn.execute(f"PRAGMA user_version = {target}")
+        conn.commit()
+        version = target
+    return version
+
+
+def init_db():
+    """
+    テーブルがなければ作り、既存の DB は最新のスキーマまでその場で上げる（起動時に呼ぶ）。
+    """
+    conn = get_connection()
+    try:
+        # WAL: 読み取りが書き込み（監視スレッドの mark_used 等）を待たせない。DB ファイルに残る設定
+        conn.execute("PRAGMA journal_mode=WAL")
+        if get_schema_version(conn) == 0:
+            _create_base_schema(conn.cursor())
+            conn.commit()
+        migrate(conn)
+    finally:
+        conn.close()
@@ -0,0 +1,366 @@
+from __future__ import annotations
+
+import base64
+import struct
+from functools import cached_property
+from typing import Dict, Optional
+
+import numpy as np
+
+from SmartCamera import BoundingBox
+
+# 1検出 = 1レコードの構造化配列
+DETECTION_DTYPE = np.dtype(
+    [
+        ("class_id", "<u4"),
+        ("score", "<f4"),
+        ("left", "<i4"),
+        ("top", "<i4"),
+        ("right", "<i4"),
+        ("bottom", "<i4"),
+        # ObjectDetectionList 内での位置（BoundingBox2d 以外を読み飛ばしても元の番号を保つ）
+        ("index", "<u4"),
+    ]
+)
+
+# dict 形式を作るとき、検出がこの数以下なら配列を作らずにスカラー読み出しで直接組み立てる
+# （検出が数件なら NumPy 配列を作るほうが遅い）
+DICT_SCALAR_MAX_OBJECTS = 24
+
+# vtable 内のフィールド位置 (4 + 2 * フィールド番号)
+_GENERAL_OBJECT_CLASS_ID = 4
+_GENERAL_OBJECT_BBOX_TYPE = 6
+_GENERAL_OBJECT_BBOX = 8
+_GENERAL_OBJECT_SCORE = 10
+
+
+class _BufferReader:
+    """
+    FlatBuffers のバッファを memoryview 越しに読むための小さなヘルパー。
+
+    - 単発の読み出しは struct.unpack_from で行う
+    - 位置の配列を渡した場合は NumPy のファンシーインデックスでまとめて読む
+      Builder が出力したバッファはスカラーがサイズ境界に揃っているので、
+      通常は uint32 / uint16 ビューを直接引く。揃っていない位置が混じる場合のみバイト単位で組み立てる。
+    """
+
+    def __init__(self, buf) -> None:
+        self.mv = memoryview(buf).cast("B")
+        self.size = len(self.mv)
+
+    # NumPy ビューは一括読み出しを使うときだけ作る（AreaCount だけ読む場合は不要）
+
+    @cached_property
+    def u8(self) -> np.ndarray:
+        return np.frombuffer(self.mv, dtype=np.uint8)
+
+    @cached_property
+    def _u16(self) -> np.ndarray:
+        return np.frombuffer(self.mv[: self.size // 2 * 2], dtype="<u2")
+
+    @cached_property
+    def _u32(self) -> np.ndarray:
+        return np.frombuffer(self.mv[: self.size // 4 * 4], dtype="<u4")
+
+    # --- scalar ---
+
+    def u8_at(self, pos: int) -> int:
+        return self.mv[pos]
+
+    def f32_at(self, pos: int) -> float:
+        return struct.unpack_from("<f", self.mv, pos)[0]
+
+    def u32_at(self, pos: int) -> int:
+        return struct.unpack_from("<I", self.mv, pos)[0]
+
+    def i32_at(self, pos: int) -> int:
+        return struct.unpack_from("<i", self.mv, pos)[0]
+
+    def u16_at(self, pos: int) -> int:
+        return struct.unpack_from("<H", self.mv, pos)[0]
+
+    def field_at(self, table: int, slot: int) -> int:
+        """
+        table のフィールド slot の (table からの) オフセット。存在しなければ 0
+        """
+        vtable = table - self.i32_at(table)
+        if slot >= self.u16_at(vtable):
+            return 0
+        return self.u16_at(vtable + slot)
+
+    # --- vectorized ---
+
+    def _check(self, pos: np.ndarray, width: int) -> None:
+        if pos.size and (pos.min() < 0 or pos.max() + width > self.size):
+            raise ValueError("malformed FlatBuffers payload: offset out of range")
+
+    def u8_array(self, pos: np.ndarray) -> np.ndarray:
+        self._check(pos, 1)
+        return self.u8[pos]
+
+    def u32(self, pos: np.ndarray) -> np.ndarray:
+        self._check(pos, 4)
+        if not (pos & 3).any():
+            return self._u32[pos >> 2]
+        b = self.u8
+        return (
+            b[pos].astype(np.uint32)
+            | (b[pos + 1].astype(np.uint32) << 8)
+            | (b[pos + 2].astype(np.uint32) << 16)
+            | (b[pos + 3].astype(np.uint32) << 24)
+        )
+
+    def i32(self, pos: np.ndarray) -> np.ndarray:
+        return self.u32(pos).view(np.int32)
+
+    def u16(self, pos: np.ndarray) -> np.ndarray:
+        self._check(pos, 2)
+        if not (pos & 1).any():
+            return self._u16[pos >> 1]
+        b = self.u8
+        return b[pos].astype(np.uint16) | (b[pos + 1].astype(np.uint16) << 8)
+
+    def fields(self, tables: np.ndarray, slots: tuple) -> list:
+        """
+        tables の各テーブルについて、フィールド slots のオフセットを返す（なければ 0）。
+
+        同じ形のテーブルは vtable を共有するのが普通なので、全テーブルの vtable が
+        同一であればスカラーのオフセットを返し、そうでなければテーブルごとの配列を返す。
+        """
+        vtables = tables - self.i32(tables).astype(np.int64)
+        first = int(vtables[0])
+        if (vtables == first).all():
+            return [self.field_at(int(tables[0]), slot) for slot in slots]
+
+        vt_len = self.u16(vtables)
+        result = []
+        for slot in slots:
+            present = vt_len > slot
+            offsets = self.u16(np.where(present, vtables + slot, vtables))
+            result.append(np.where(present, offsets, 0).astype(np.int64))
+        return result
+
+    def read(self, tables: np.ndarray, offset, kind: str) -> np.ndarray:
+        """
+        フィールド値をまとめて読む。offset が 0 のテーブルはデフォルト値 0 になる。
+        kind は "u8" / "u32" / "i32"。
+        """
+        if np.ndim(offset) == 0 and offset == 0:
+            dtype = {"u8": np.uint8, "u32": np.uint32, "i32": np.int32}[kind]
+            return np.zeros(tables.size, dtype=dtype)
+        pos = tables + offset
+        if kind == "u8":
+            values = self.u8_array(pos)
+        elif kind == "u32":
+            values = self.u32(pos)
+        else:
+            values = self.i32(pos)
+        if np.ndim(offset) == 0:
+            return values
+        return np.where(offset != 0, values, values.dtype.type(0))
+
+
+def _perception_vector(reader: _BufferReader) -> Optional[int]:
+    """
+    ObjectDetectionTop.Perception.ObjectDetectionList ベクタの位置を返す。なければ None
+    """
+    root = reader.u32_at(0)
+    o = reader.field_at(root, 4)
+    if o == 0:
+        return None
+    perception = root + o + reader.u32_at(root + o)
+    o = reader.field_at(perception, 4)
+    if o == 0:
+        return None
+    return perception + o + reader.u32_at(perception + o)
+
+
+def decode_detections(buf) -> np.ndarray:
+    """
+    Base64 デコード済みの ObjectDetectionTop バッファから、
+    BoundingBox2d を持つ検出を DETECTION_DTYPE の構造化配列として取り出す。
+
+    生成コード (SmartCamera.*) のアクセサを1件ずつ呼ぶ代わりに、
+    ベクタのオフセットをまとめて辿るので、検出ごとの Python オブジェクトを作らない。
+    """
+    try:
+        reader = _BufferReader(buf)
+        vec = _perception_vector(reader)
+        if vec is None:
+            return np.empty(0, dtype=DETECTION_DTYPE)
+
+        n = reader.u32_at(vec)
+        if n == 0:
+            return np.empty(0, dtype=DETECTION_DTYPE)
+        elems = vec + 4 + 4 * np.arange(n, dtype=np.int64)
+        tables = elems + reader.u32(elems).astype(np.int64)
+
+        # BoundingBox2d 以外（union 未設定を含む）は従来どおり読み飛ばす
+        class_off, type_off, bbox_off, score_off = reader.fields(
+            tables,
+            (
+                _GENERAL_OBJECT_CLASS_ID,
+                _GENERAL_OBJECT_BBOX_TYPE,
+                _GENERAL_OBJECT_BBOX,
+                _GENERAL_OBJECT_SCORE,
+            ),
+        )
+        keep = (
+            reader.read(tables, type_off, "u8")
+            == BoundingBox.BoundingBox.BoundingBox2d
+        ) & (np.asarray(bbox_off) != 0)
+        index = np.arange(n, dtype=np.uint32)
+        if not keep.all():
+            tables = tables[keep]
+            index = index[keep]
+            class_off, bbox_off, score_off = (
+                o if np.ndim(o) == 0 else o[keep]
+                for o in (class_off, bbox_off, score_off)
+            )
+
+        out = np.zeros(tables.size, dtype=DETECTION_DTYPE)
+        if tables.size == 0:
+            return out
+
+        out["index"] = index
+        out["class_id"] = reader.read(tables, class_off, "u32")
+        out["score"] = reader.read(tables, score_off, "u32").view(np.float32)
+
+        ref = tables + bbox_off
+        boxes = ref + reader.u32(ref).astype(np.int64)
+        names = ("left", "top", "right", "bottom")
+        for name, o in zip(names, reader.fields(boxes, (4, 6, 8, 10))):
+            out[name] = reader.read(boxes, o, "i32")
+        return out
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"malformed FlatBuffers payload: {e}") from e
+
+
+def detections_to_dict(detections: np.ndarray, base: Optional[dict] = None) -> dict:
+    """
+    構造化配列を従来の dict 形式 ({"1": {"C", "P", "X", "Y", "x", "y"}, ...}) に変換する。
+    キーは ObjectDetectionList 内の位置 + 1（読み飛ばした検出の番号は欠番のまま）。
+    base を渡した場合は、そのキー（T など）を引き継ぐ。
+    """
+    result = dict(base) if base else {}
+    rows = zip(
+        detections["index"].tolist(),
+        detections["class_id"].tolist(),
+        detections["score"].tolist(),
+        detections["left"].tolist(),
+        detections["top"].tolist(),
+        detections["right"].tolist(),
+        detections["bottom"].tolist(),
+    )
+    for i, c, p, left, top, right, bottom in rows:
+        result[str(i + 1)] = {"C": c, "P": p, "X": left, "Y": top, "x": right, "y": bottom}
+    return result
+
+
+def decode_detections_dict(buf, base: Optional[dict] = None) -> dict:
+    """
+    Base64 デコード済みの ObjectDetectionTop バッファを、従来の dict 形式に直接デコードする。
+    detections_to_dict(decode_detections(buf), base) と同じ結果になる。
+
+    検出が DICT_SCALAR_MAX_OBJECTS 件以下なら struct で1件ずつ読む（配列を作らない）。
+    それより多ければ一括デコードしてから変換する。
+    """
+    try:
+        reader = _BufferReader(buf)
+        vec = _perception_vector(reader)
+        result = dict(base) if base else {}
+        if vec is None:
+            return result
+
+        n = reader.u32_at(vec)
+        if n > DICT_SCALAR_MAX_OBJECTS:
+            return detections_to_dict(decode_detections(buf), base=base)
+
+        for i in range(n):
+            elem = vec + 4 + 4 * i
+            table = elem + reader.u32_at(elem)
+            o_type = reader.field_at(table, _GENERAL_OBJECT_BBOX_TYPE)
+            o_bbox = reader.field_at(table, _GENERAL_OBJECT_BBOX)
+            # BoundingBox2d 以外（union 未設定を含む）は読み飛ばす
+            if (
+                not o_type
+                or reader.u8_at(table + o_type) != BoundingBox.BoundingBox.BoundingBox2d
+                or not o_bbox
+            ):
+                continue
+            o_class = reader.field_at(table, _GENERAL_OBJECT_CLASS_ID)
+            o_score = reader.field_at(table, _GENERAL_OBJECT_SCORE)
+            ref = table + o_bbox
+            box = ref + reader.u32_at(ref)
+            coords = []
+            for slot in (4, 6, 8, 10):
+                o = reader.field_at(box, slot)
+                coords.append(reader.i32_at(box + o) if o else 0)
+            result[str(i + 1)] = {
+                "C": reader.u32_at(table + o_class) if o_class else 0,
+                "P": reader.f32_at(table + o_score) if o_score else 0.0,
+                "X": coords[0],
+                "Y": coords[1],
+                "x": coords[2],
+                "y": coords[3],
+            }
+        return result
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"malformed FlatBuffers payload: {e}") from e
+
+
+def read_area_counts(buf) -> Optional[Dict[int, int]]:
+    """
+    ObjectDetectionTop.AreaCount ベクタから {class_id: count} を読む。
+    AreaCount が付いていないペイロードなら None を返す（呼び出し側で検出のデコードに切り替える）。
+
+    読むのは root テーブルと CountData の数フィールドだけで、検出リストには触れない。
+    """
+    try:
+        reader = _BufferReader(buf)
+        root = reader.u32_at(0)
+        o = reader.field_at(root, 6)
+        if o == 0:
+            return None
+        vec = root + o + reader.u32_at(root + o)
+
+        counts: Dict[int, int] = {}
+        for j in range(reader.u32_at(vec)):
+            elem = vec + 4 + 4 * j
+            table = elem + reader.u32_at(elem)
+            o_class = reader.field_at(table, 4)
+            o_count = reader.field_at(table, 6)
+            class_id = reader.u32_at(table + o_class) if o_class else 0
+            count = reader.u32_at(table + o_count) if o_count else 0
+            counts[class_id] = counts.get(class_id, 0) + count
+        return counts
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"malformed FlatBuffers payload: {e}") from e
+
+
+def count_by_class(detections: np.ndarray) -> Dict[int, int]:
+    """
+    検出の構造化配列から {class_id: count} を作る（AreaCount がない場合のフォールバック）。
+    """
+    class_ids, counts = np.unique(detections["class_id"], return_counts=True)
+    return dict(zip(class_ids.tolist(), counts.tolist()))
+
+
+def count_classes(buf, prefer_area_count: bool = True) -> Dict[int, int]:
+    """
+    デコード済みバッファから {class_id: count} を作る。
+    prefer_area_count=True なら AreaCount を優先し、なければ検出をデコードして数える。
+    """
+    if prefer_area_count:
+        counts = read_area_counts(buf)
+        if counts is not None:
+            return counts
+    return count_by_class(decode_detections(buf))
+
+
+def decode_class_counts(encoded: str, prefer_area_count: bool = True) -> Dict[int, int]:
+    """
+    Base64 文字列のまま受け取ったペイロード ('O') から {class_id: count} を作る。
+    DecodePool のワーカー（別プロセス含む）で実行できるよう、モジュール関数にしている。
+    """
+    return count_classes(base64.b64decode(encoded), prefer_area_count)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import threading
+from typing import Iterable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def _build_retry(
+    total: int,
+    backoff_factor: float,
+    backoff_jitter: float,
+    status_forcelist: Iterable[int],
+) -> Retry:
+    """
+    ジッター付き指数バックオフの Retry を作る。
+    backoff_jitter は urllib3 2.x 以降でのみ指定できるので、古い版では省略する。
+    """
+    kwargs = dict(
+        total=total,
+        connect=total,
+        read=total,
+        status=total,
+        backoff_factor=backoff_factor,
+        status_forcelist=tuple(status_forcelist),
+        # トークン取得 (POST) も冪等なので再試行対象に含める
+        allowed_methods=frozenset({"GET", "POST"}),
+        raise_on_status=False,
+    )
+    try:
+        return Retry(backoff_jitter=backoff_jitter, **kwargs)
+    except TypeError:
+        return Retry(**kwargs)
+
+
+class ConsoleHttpClient:
+    """
+    コンソール API 用の、コネクションプール付き HTTP クライアント。
+
+    - requests.Session を共有して TCP/TLS 接続を keep-alive で使い回す
+    - ホストごとの同時接続数を pool_maxsize で制限する（上限到達時は空きを待つ）
+    - 全リクエストに connect / read タイムアウトを付け、ハングで監視ループが止まらないようにする
+    - 接続エラーや 429/5xx はジッター付き指数バックオフで再試行する
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 10.0,
+        total_retries: int = 2,
+        backoff_factor: float = 0.3,
+        backoff_jitter: float = 0.2,
+        status_forcelist: Iterable[int] = (429, 500, 502, 503, 504),
+    ) -> None:
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = _build_retry(
+            total_retries, backoff_factor, backoff_jitter, status_forcelist
+        )
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry,
+            pool_block=True,
+        )
+        self._session = requests.Session()
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self._session.get(url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self._session.post(url, **kwargs)
+
+    def close(self) -> None:
+        self._session.close()
+
+    def stats(self) -> dict:
+        """
+        接続の再利用状況を返す。
+        requests - connections が「新規接続せずに済んだ」リクエスト数。
+        """
+        hosts = {}
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "connections": pool.num_connections,
+                "requests": pool.num_requests,
+            }
+
+        total_conns = sum(h["connections"] for h in hosts.values())
+        total_reqs = sum(h["requests"] for h in hosts.values())
+        return {
+            "connections_opened": total_conns,
+            "requests": total_reqs,
+            "reused": max(0, total_reqs - total_conns),
+            "hosts": hosts,
+        }
+
+
+_shared_client: Optional[ConsoleHttpClient] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_http_client() -> ConsoleHttpClient:
+    """
+    プロセス内で共有する ConsoleHttpClient を返す（初回呼び出し時に生成）。
+    """
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = ConsoleHttpClient()
+        return _shared_client
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import heapq
+import os
+import struct
+import threading
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional
+
+from time_utils import JST, to_jst
+
+# セグメントファイル名: inference-000001.log, inference-000002.log, ...
+SEGMENT_PREFIX = "inference-"
+SEGMENT_SUFFIX = ".log"
+
+# レコード = [本体長 u32][CRC32 u32][zlib 圧縮した本体]
+_RECORD_HEADER = struct.Struct("<II")
+# 本体 = [受信時刻 (epoch 秒) f64][device_id 長 u16][device_id][生ペイロード (FlatBuffers)]
+_BODY_HEADER = struct.Struct("<dH")
+# 読み出し時に並べ直す時刻の幅（秒）。複数デバイスを並行に取得して書くので、ファイル上では前後しうる
+REORDER_WINDOW_SEC = 60.0
+
+
+@dataclass(frozen=True)
+class InferenceRecord:
+    """
+    記録された推論結果1件。payload は Base64 デコード済みの ObjectDetectionTop バッファ。
+    """
+
+    device_id: str
+    timestamp: datetime
+    payload: bytes
+
+
+def _encode_record(record: InferenceRecord) -> bytes:
+    device = record.device_id.encode("utf-8")
+    body = (
+        _BODY_HEADER.pack(record.timestamp.timestamp(), len(device))
+        + device
+        + record.payload
+    )
+    compressed = zlib.compress(body)
+    return _RECORD_HEADER.pack(len(compressed), zlib.crc32(compressed)) + compressed
+
+
+def _decode_record(compressed: bytes) -> InferenceRecord:
+    body = zlib.decompress(compressed)
+    ts, device_len = _BODY_HEADER.unpack_from(body, 0)
+    start = _BODY_HEADER.size
+    device_id = body[start : start + device_len].decode("utf-8")
+    return InferenceRecord(
+        device_id=device_id,
+        timestamp=datetime.fromtimestamp(ts, tz=JST),
+        payload=body[start + device_len :],
+    )
+
+
+def list_segments(directory: str | os.PathLike) -> List[Path]:
+    """
+    ディレクトリ内のセグメントファイルを書き込み順に返す。
+    """
+    directory = Path(directory)
+    if not directory.is_dir():
+        return []
+    return sorted(
+        p
+        for p in directory.iterdir()
+        if p.name.startswith(SEGMENT_PREFIX) and p.name.endswith(SEGMENT_SUFFIX)
+    )
+
+
+class InferenceLogWriter:
+    """
+    カメラが返した生ペイロードを、長さ付き・レコード単位圧縮のセグメントログに追記する。
+
+    - 1セグメントが segment_max_bytes を超えたら次のファイルに切り替える
+    - 追記のみなので、プロセスが途中で落ちても壊れるのは末尾の1レコードだけ（読み出し側で無視する）
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike,
+        segment_max_bytes: int = 64 * 1024 * 1024,
+    ) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_max_bytes = segment_max_bytes
+
+        self._lock = threading.Lock()
+        self._file: Optional[BinaryIO] = None
+        self._segment_size = 0
+        segments = list_segments(self.directory)
+        # 既存ログがあれば、その次の番号から書き始める（既存セグメントには追記しない）
+        self._next_seq = (
+            int(segments[-1].name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)]) + 1
+            if segments
+            else 1
+        )
+        self._records = 0
+
+    def append(self, device_id: str, timestamp: datetime, payload: bytes) -> None:
+        data = _encode_record(
+            InferenceRecord(device_id, to_jst(timestamp), bytes(payload))
+        )
+        with self._lock:
+            if self._file is None or self._segment_size >= self.segment_max_bytes:
+                self._open_next_segment()
+            self._file.write(data)
+            self._file.flush()
+            self._segment_size += len(data)
+            self._records += 1
+
+    def _open_next_segment(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        path = self.directory / f"{SEGMENT_PREFIX}{self._next_seq:06d}{SEGMENT_SUFFIX}"
+        self._next_seq += 1
+        self._file = open(path, "ab")
+        self._segment_size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "directory": str(self.directory),
+                "records": self._records,
+                "segment_size": self._segment_size,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class InferenceLogReader:
+    """
+    InferenceLogWriter が書いたログを、セグメント単位・レコード単位で遅延読み出しする。
+    一度に保持するのは並べ直し用の直近 REORDER_WINDOW_SEC 秒分のレコードだけなので、
+    何日分のログでもメモリに載せる必要はない。
+    """
+
+    def __init__(self, directory: str | os.PathLike) -> None:
+        self.directory = Path(directory)
+
+    def __iter__(self) -> Iterator[InferenceRecord]:
+        return self.iter_records()
+
+    def iter_records(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        device_ids: Optional[set] = None,
+        reorder_sec: float = REORDER_WINDOW_SEC,
+    ) -> Iterator[InferenceRecord]:
+        """
+        [since, until) の範囲のレコードを時刻順に返す。device_ids を渡すとそのデバイスだけに絞る。
+
+        ファイル上の並びは時刻順とは限らない（デバイスごとの取得が並行に書き込む）ので、
+        最新の時刻から reorder_sec 秒以内のレコードは手元に溜めて並べ直してから返す。
+        until 以降のレコードが出ても読み進め、セグメント全体が until 以降だったときに打ち切る。
+        """
+        window = timedelta(seconds=reorder_sec)
+        pending: list = []  # (timestamp, 読んだ順, record) のヒープ
+        seq = 0
+        latest: Optional[datetime] = None
+        for segment in list_segments(self.directory):
+            segment_first: Optional[datetime] = None
+            for record in self._iter_segment(segment):
+                ts = record.timestamp
+                if segment_first is None or ts < segment_first:
+                    segment_first = ts
+                if latest is None or ts > latest:
+                    latest = ts
+                if since is not None and ts < since:
+                    continue
+                if until is not None and ts >= until:
+                    continue
+                if device_ids is not None and record.device_id not in device_ids:
+                    continue
+                heapq.heappush(pending, (ts, seq, record))
+                seq += 1
+                while pending and pending[0][0] <= latest - window:
+                    yield heapq.heappop(pending)[2]
+            if until is not None and segment_first is not None and segment_first >= until:
+                break
+        while pending:
+            yield heapq.heappop(pending)[2]
+
+    def _iter_segment(self, path: Path) -> Iterator[InferenceRecord]:
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(_RECORD_HEADER.size)
+                if len(header) < _RECORD_HEADER.size:
+                    return
+                length, crc = _RECORD_HEADER.unpack(header)
+                compressed = f.read(length)
+                if len(compressed) < length or zlib.crc32(compressed) != crc:
+                    # 書き込み途中で止まった末尾レコード
+                    print(f"[InferenceLogReader] truncated record in {path.name}, skipped")
+                    return
+                yield _decode_record(compressed)
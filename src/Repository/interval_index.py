@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import bisect
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Tuple
+
+
+class IntervalIndex:
+    """
+    1部屋分の「有効な（CANCELLED 以外の）予約区間」を開始時刻順に持つ索引。
+
+    予約は作成時にバッファ込みの重複チェックを通るので、索引内の区間は互いに重ならない。
+    そのため開始時刻順に並べると終了時刻も同じ順に並び、
+    「[start - B, end + B) と重なる区間があるか」は bisect で判定できる (O(log n))。
+
+    区間は最大 _BLOCK_SIZE 件ずつのブロックに分けて持つ。1本の list に insert すると
+    1件ごとに O(n) の移動が起きて 10^6 件規模で遅くなるので、挿入・削除で動かすのは
+    1ブロック分だけにする（全体の再ソートもしない）。
+    """
+
+    _BLOCK_SIZE = 1024
+
+    __slots__ = ("_starts", "_ends", "_values", "_last_starts", "_last_ends", "_len")
+
+    def __init__(self) -> None:
+        # ブロックごとの開始時刻・終了時刻・値（同じ添字が同じ区間）
+        self._starts: List[List[datetime]] = []
+        self._ends: List[List[datetime]] = []
+        self._values: List[List[Any]] = []
+        # 各ブロック末尾の開始時刻・終了時刻（どのブロックを見るかの bisect 用）
+        self._last_starts: List[datetime] = []
+        self._last_ends: List[datetime] = []
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    # --- 位置の計算 ---
+
+    def _locate(self, start: datetime, right: bool = False) -> Tuple[int, int]:
+        """
+        開始時刻順の挿入位置を (ブロック, ブロック内の位置) で返す。
+        right=False なら bisect_left、True なら bisect_right 相当。
+        """
+        find = bisect.bisect_right if right else bisect.bisect_left
+        b = find(self._last_starts, start)
+        if b == len(self._starts):
+            # 全ブロックの末尾より後ろ → 最後のブロックの末尾
+            if b == 0:
+                return 0, 0
+            b -= 1
+            return b, len(self._starts[b])
+        return b, find(self._starts[b], start)
+
+    def _before(self, b: int, i: int) -> Optional[Tuple[int, int]]:
+        """
+        (b, i) の1つ前の区間の位置。先頭なら None。
+        """
+        if i > 0:
+            return b, i - 1
+        if b > 0:
+            return b - 1, len(self._starts[b - 1]) - 1
+        return None
+
+    # --- 参照 ---
+
+    def find_overlap(
+        self, start: datetime, end: datetime, buffer: timedelta = timedelta(0)
+    ) -> Optional[Any]:
+        """
+        end > s_i - buffer かつ start < e_i + buffer となる区間の値を返す。なければ None。
+        """
+        # s_i < end + buffer を満たす区間のうち最後のもの（終了時刻が最大）だけ見ればよい
+        pos = self._before(*self._locate(end + buffer))
+        if pos is not None:
+            b, i = pos
+            if self._ends[b][i] + buffer > start:
+                return self._values[b][i]
+        return None
+
+    def values_containing(self, t: datetime) -> List[Any]:
+        """
+        s_i <= t <= e_i となる区間の値を開始時刻順に返す。
+        区間は重ならないので高々2件（バッファ 0 で e_i == s_j == t のときだけ2件）。
+        """
+        found = []
+        pos = self._before(*self._locate(t, right=True))
+        while pos is not None and len(found) < 2:
+            b, i = pos
+            if self._ends[b][i] < t:
+                break
+            found.append(self._values[b][i])
+            pos = self._before(b, i)
+        found.reverse()
+        return found
+
+    def values_ending_after(self, since: datetime) -> List[Any]:
+        """
+        e_i >= since の区間の値を開始時刻順に返す。
+        """
+        b = bisect.bisect_left(self._last_ends, since)
+        if b == len(self._ends):
+            return []
+        result = self._values[b][bisect.bisect_left(self._ends[b], since) :]
+        for values in self._values[b + 1 :]:
+            result.extend(values)
+        return result
+
+    def values_starting_after(self, t: datetime, limit: int) -> List[Any]:
+        """
+        s_i >= t の区間の値を開始時刻順に最大 limit 件返す。
+        """
+        b, i = self._locate(t)
+        result: List[Any] = []
+        while b < len(self._values) and len(result) < limit:
+            result.extend(self._values[b][i : i + limit - len(result)])
+            b, i = b + 1, 0
+        return result
+
+    # --- 更新 ---
+
+    def add(self, start: datetime, end: datetime, value: Any) -> None:
+        if not self._starts:
+            self._starts.append([start])
+            self._ends.append([end])
+            self._values.append([value])
+            self._last_starts.append(start)
+            self._last_ends.append(end)
+            self._len = 1
+            return
+
+        b, i = self._locate(start)
+        self._starts[b].insert(i, start)
+        self._ends[b].insert(i, end)
+        self._values[b].insert(i, value)
+        self._len += 1
+        if len(self._starts[b]) > self._BLOCK_SIZE:
+            # 大きくなったブロックは半分に割る
+            half = len(self._starts[b]) // 2
+            for blocks in (self._starts, self._ends, self._values):
+                blocks.insert(b + 1, blocks[b][half:])
+                del blocks[b][half:]
+            self._last_starts.insert(b + 1, None)
+            self._last_ends.insert(b + 1, None)
+            self._refresh(b + 1)
+        self._refresh(b)
+
+    def remove(self, start: datetime, value: Any) -> bool:
+        """
+        区間を外す（キャンセル時）。見つからなければ False。
+        """
+        if not self._starts:
+            return False
+        b, i = self._locate(start)
+        if i >= len(self._starts[b]) or self._values[b][i] is not value:
+            return False
+        del self._starts[b][i]
+        del self._ends[b][i]
+        del self._values[b][i]
+        self._len -= 1
+        if self._starts[b]:
+            self._refresh(b)
+        else:
+            for blocks in (self._starts, self._ends, self._values, self._last_starts, self._last_ends):
+                del blocks[b]
+        return True
+
+    def _refresh(self, b: int) -> None:
+        self._last_starts[b] = self._starts[b][-1]
+        self._last_ends[b] = self._ends[b][-1]
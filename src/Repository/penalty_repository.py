@@ -6,6 +6,7 @@ from typing import List, Tuple, Optional
 import sqlite3
 
 from Repository.db import get_connection
+from time_utils import from_epoch_us, to_epoch_us
 
 
 class BasePenaltyRepository:
@@ -103,10 +104,10 @@ class SqlitePenaltyRepository(BasePenaltyRepository):
             cur = conn.cursor()
             cur.execute(
                 """
-            INSERT INTO penalty_events (user_id, reason, points, timestamp)
-            VALUES (?, ?, ?, ?)
+            INSERT INTO penalty_events (user_id, reason, points, timestamp, timestamp_us)
+            VALUES (?, ?, ?, ?, ?)
             """,
-                (user_id, reason, points, at.isoformat()),
+                (user_id, reason, points, at.isoformat(), to_epoch_us(at)),
             )
             conn.commit()
         finally:
@@ -121,12 +122,12 @@ class SqlitePenaltyRepository(BasePenaltyRepository):
             cur = conn.cursor()
             cur.execute(
                 """
-            SELECT timestamp, reason, points
+            SELECT timestamp_us, reason, points
             FROM penalty_events
-            WHERE user_id = ? AND timestamp >= ?
-            ORDER BY timestamp
+            WHERE user_id = ? AND timestamp_us >= ?
+            ORDER BY timestamp_us
             """,
-                (user_id, since.isoformat()),
+                (user_id, to_epoch_us(since)),
             )
             rows = cur.fetchall()
         finally:
@@ -134,7 +135,7 @@ class SqlitePenaltyRepository(BasePenaltyRepository):
 
         events: List[Tuple[datetime, str, int]] = []
         for r in rows:
-            ts = datetime.fromisoformat(r["timestamp"])
+            ts = from_epoch_us(r["timestamp_us"])
             events.append((ts, r["reason"], int(r["points"])))
         return events
 
@@ -1,13 +1,48 @@
 from __future__ import annotations
 
+import bisect
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 import sqlite3
+import threading
 
 from Domain.reservation import Reservation, ReservationStatus
-from Repository.db import get_connection
-from time_utils import to_jst, now_jst
+from Repository.db import begin_immediate, get_connection
+from Repository.interval_index import IntervalIndex
+from time_utils import from_epoch_us, now_jst, to_epoch_us, to_jst
+
+# query_reservations の1ページの上限
+MAX_QUERY_LIMIT = 500
+
+
+def _sort_key(res: Reservation) -> Tuple[datetime, str]:
+    """
+    予約一覧の並び順（開始時刻、同じなら reservation_id）。ページングのカーソルもこの順で進む。
+    """
+    return res.start_time, res.reservation_id
+
+
+def encode_cursor(res: Reservation) -> str:
+    """
+    query_reservations の next_cursor を作る（このページの最後の予約の "開始時刻(us):ID"）。
+    """
+    return f"{to_epoch_us(res.start_time)}:{res.reservation_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[int, str]:
+    """
+    encode_cursor の逆。形式が違えば ValueError。
+    """
+    start_us, sep, reservation_id = cursor.partition(":")
+    if not sep or not start_us.lstrip("-").isdigit():
+        raise ValueError(f"invalid cursor: {cursor}")
+    return int(start_us), reservation_id
+
+
+def _check_limit(limit: int) -> None:
+    if not 1 <= limit <= MAX_QUERY_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_QUERY_LIMIT}")
 
 
 class InMemoryReservationRepository:
@@ -16,26 +51,108 @@ class InMemoryReservationRepository:
 
     - 本番では DB バックエンドに差し替える前提で、インターフェースを意識して設計する。
     - SqliteReservationRepository とインターフェースを揃えておくこと。
+
+    スレッド安全性:
+    - 部屋ごとの状態（予約リスト・区間索引・ID 集合）の読み書きは、その部屋のロックの中で行う。
+      ロックは room_id のハッシュで lock_stripes 本に振り分けるので、別の部屋への予約は並行して進む
+    - get_reservations_for_room は部屋ごとに公開したスナップショット（tuple）をロックなしで読む。
+      書き込みはスナップショットを捨てるだけで、次に読む人がロックの中で作り直す。
+      利用者ごとの予約リスト（query_reservations 用）も同じ作りで、利用者ごとのロックで守る
+      （部屋のロックを持ったまま利用者のロックを取ることはあるが、逆はしない）
+    - リスナーへの通知はロックの外で呼ぶ（コールバックからこのリポジトリを読んでもよい）
     """
 
-    def __init__(self, buffer_minutes: int = 5) -> None:
-        # room_id -> List[Reservation]
+    def __init__(self, buffer_minutes: int = 5, lock_stripes: int = 64) -> None:
+        # room_id -> List[Reservation]（作成順に追記し、読むときに開始時刻順に並べ直す）
         self._reservations_by_room: Dict[str, List[Reservation]] = {}
+        # room_id -> 開始時刻順に並べた予約のスナップショット。追記すると消え、次に読むときに作り直す
+        self._snapshots: Dict[str, Tuple[Reservation, ...]] = {}
+        # user_id -> List[Reservation] と、そのスナップショット（部屋ごとのものと同じ作り）
+        self._reservations_by_user: Dict[str, List[Reservation]] = {}
+        self._user_snapshots: Dict[str, Tuple[Reservation, ...]] = {}
+        # 部屋ごと・利用者ごとのロック（ID のハッシュで振り分ける）
+        self._room_locks = [threading.Lock() for _ in range(max(1, lock_stripes))]
+        self._user_locks = [threading.Lock() for _ in range(max(1, lock_stripes))]
+        # reservation_id の採番と登録を部屋をまたいで一意にするためのロック
+        self._id_lock = threading.Lock()
+        # reservation_id -> Reservation（get_reservation_by_id / mark_* を O(1) にするための索引）
+        # 値は _reservations_by_room と同じオブジェクトなので、ステータス変更も自動で反映される
+        self._reservations_by_id: Dict[str, Reservation] = {}
+        # room_id -> その部屋の reservation_id 集合
+        self._ids_by_room: Dict[str, Set[str]] = {}
+        # room_id -> CANCELLED 以外の予約の区間索引（重複チェック・期間での絞り込み用）
+        self._intervals_by_room: Dict[str, IntervalIndex] = {}
         # 予約と予約の間に設ける前後バッファ
         self._buffer: timedelta = timedelta(minutes=buffer_minutes)
+        # 予約の作成・キャンセル時に room_id を渡して呼ぶコールバック
+        self._listeners: List[Callable[[str], None]] = []
+        # 有効な予約区間が増えた・減ったときに (予約, +1 / -1) を渡して呼ぶコールバック
+        self._interval_listeners: List[Callable[[Reservation, int], None]] = []
+
+    def add_listener(self, callback: Callable[[str], None]) -> None:
+        """
+        予約が作成・キャンセルされたときに callback(room_id) を呼ぶよう登録する。
+        """
+        self._listeners.append(callback)
+
+    def add_interval_listener(self, callback: Callable[[Reservation, int], None]) -> None:
+        """
+        予約が作成されたら callback(予約, +1)、有効な予約がキャンセルされたら callback(予約, -1) を呼ぶ。
+        キャンセル済みの予約をもう一度キャンセルしても呼ばない。
+        """
+        self._interval_listeners.append(callback)
+
+    def _notify(self, room_id: str) -> None:
+        for callback in self._listeners:
+            callback(room_id)
 
-    def _get_room_list(self, room_id: str) -> List[Reservation]:
-        if room_id not in self._reservations_by_room:
-            self._reservations_by_room[room_id] = []
-        return self._reservations_by_room[room_id]
+    def _notify_interval(self, res: Reservation, delta: int) -> None:
+        for callback in self._interval_listeners:
+            callback(res, delta)
+
+    def _room_lock(self, room_id: str) -> threading.Lock:
+        return self._room_locks[hash(room_id) % len(self._room_locks)]
+
+    def _user_lock(self, user_id: str) -> threading.Lock:
+        return self._user_locks[hash(user_id) % len(self._user_locks)]
+
+    @staticmethod
+    def _snapshot(
+        snapshots: Dict[str, Tuple[Reservation, ...]],
+        lists: Dict[str, List[Reservation]],
+        lock: threading.Lock,
+        key: str,
+    ) -> Tuple[Reservation, ...]:
+        """
+        lists[key] を _sort_key 順に並べたスナップショットを返す（なければロックの中で作る）。
+        """
+        snapshot = snapshots.get(key)
+        if snapshot is None:
+            with lock:
+                snapshot = snapshots.get(key)
+                if snapshot is None:
+                    res_list = lists.get(key)
+                    if res_list is None:
+                        return ()
+                    res_list.sort(key=_sort_key)
+                    snapshot = snapshots[key] = tuple(res_list)
+        return snapshot
 
     def _generate_reservation_id(self, room_id: str, start: datetime) -> str:
         """
         予約ID生成規則。
         既存実装と互換性を持たせるために、room_id と開始時刻からIDを作る。
+        キャンセル済みの枠を取り直したなどで既に使われていれば、
+        SqliteReservationRepository と同じく -1, -2,... のサフィックスを付ける。
         """
         ts = int(start.timestamp())
-        return f"{room_id}-{ts}"
+        base_id = f"{room_id}-{ts}"
+        reservation_id = base_id
+        suffix = 1
+        while reservation_id in self._reservations_by_id:
+            reservation_id = f"{base_id}-{suffix}"
+            suffix += 1
+        return reservation_id
 
     def create_reservation(
         self,
@@ -57,59 +174,152 @@ class InMemoryReservationRepository:
         if end <= start:
             raise ValueError("end_time must be after start_time")
 
-        room_res_list = self._get_room_list(room_id)
         B = self._buffer
+        with self._room_lock(room_id):
+            intervals = self._intervals_by_room.setdefault(room_id, IntervalIndex())
 
-        # バッファ込みの重複チェック
-        for res in room_res_list:
-            if res.status == ReservationStatus.CANCELLED:
-                continue
-            s_i = res.start_time
-            e_i = res.end_time
+            # バッファ込みの重複チェック（CANCELLED は索引に入っていない）
             # NG条件: end > s_i - B かつ start < e_i + B
-            if end > (s_i - B) and start < (e_i + B):
+            res = intervals.find_overlap(start, end, B)
+            if res is not None:
                 raise ValueError(
                     f"Reservation conflicts with existing one: "
                     f"existing={res.reservation_id}, "
-                    f"existing_range=({s_i} - {e_i}), "
+                    f"existing_range=({res.start_time} - {res.end_time}), "
                     f"new_range=({start} - {end}), "
                     f"buffer={B}"
                 )
 
-        if reservation_id is None:
-            reservation_id = self._generate_reservation_id(room_id, start)
+            with self._id_lock:
+                if reservation_id is None:
+                    reservation_id = self._generate_reservation_id(room_id, start)
+                elif reservation_id in self._reservations_by_id:
+                    raise ValueError(f"reservation_id already exists: {reservation_id}")
+
+                new_res = Reservation(
+                    reservation_id=reservation_id,
+                    room_id=room_id,
+                    user_id=user_id,
+                    start_time=start,
+                    end_time=end,
+                    status=ReservationStatus.ACTIVE,
+                )
+                self._reservations_by_id[reservation_id] = new_res
+
+            self._reservations_by_room.setdefault(room_id, []).append(new_res)
+            self._snapshots.pop(room_id, None)
+            intervals.add(start, end, new_res)
+            self._ids_by_room.setdefault(room_id, set()).add(reservation_id)
+            with self._user_lock(user_id):
+                self._reservations_by_user.setdefault(user_id, []).append(new_res)
+                self._user_snapshots.pop(user_id, None)
+
+        self._notify(room_id)
+        self._notify_interval(new_res, +1)
+        return new_res
 
-        new_res = Reservation(
-            reservation_id=reservation_id,
-            room_id=room_id,
-            user_id=user_id,
-            start_time=start,
-            end_time=end,
-            status=ReservationStatus.ACTIVE,
+    def get_reservations_for_room(self, room_id: str) -> List[Reservation]:
+        """
+        指定部屋の全予約を開始時刻順（同じなら reservation_id 順）に返す。
+        """
+        return list(
+            self._snapshot(
+                self._snapshots, self._reservations_by_room, self._room_lock(room_id), room_id
+            )
         )
-        room_res_list.append(new_res)
 
-        # 開始時刻でソートしておく
-        room_res_list.sort(key=lambda r: r.start_time)
-
-        return new_res
+    def query_reservations(
+        self,
+        room_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        start_from: Optional[datetime] = None,
+        start_to: Optional[datetime] = None,
+        statuses: Optional[Iterable[ReservationStatus]] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Reservation], Optional[str]]:
+        """
+        条件に合う予約を開始時刻順（同じなら reservation_id 順）に最大 limit 件返す。
 
-    def get_reservations_for_room(self, room_id: str) -> List[Reservation]:
+        - start_from <= start_time < start_to で絞る（None なら片側は無制限）
+        - cursor には前のページの next_cursor を渡す。続きがなければ next_cursor は None
+        - user_id があれば利用者ごとの、なければ部屋ごとのスナップショットを二分探索して読むので、
+          他の利用者・期間外の予約の件数にはよらない（どちらもなければ全予約を並べる）
+        """
+        _check_limit(limit)
+        if user_id is not None:
+            candidates = self._snapshot(
+                self._user_snapshots, self._reservations_by_user, self._user_lock(user_id), user_id
+            )
+        elif room_id is not None:
+            candidates = self._snapshot(
+                self._snapshots, self._reservations_by_room, self._room_lock(room_id), room_id
+            )
+        else:
+            candidates = sorted(self._reservations_by_id.values(), key=_sort_key)
+
+        lo = 0
+        if start_from is not None:
+            lo = bisect.bisect_left(candidates, (to_jst(start_from), ""), key=_sort_key)
+        if cursor is not None:
+            start_us, last_id = decode_cursor(cursor)
+            lo = max(
+                lo,
+                bisect.bisect_right(candidates, (from_epoch_us(start_us), last_id), key=_sort_key),
+            )
+        end = to_jst(start_to) if start_to is not None else None
+        wanted = set(statuses) if statuses is not None else None
+
+        page: List[Reservation] = []
+        for i in range(lo, len(candidates)):
+            res = candidates[i]
+            if end is not None and res.start_time >= end:
+                break
+            if room_id is not None and res.room_id != room_id:
+                continue
+            if wanted is not None and res.status not in wanted:
+                continue
+            if len(page) == limit:
+                return page, encode_cursor(page[-1])
+            page.append(res)
+        return page, None
+
+    def get_upcoming_reservations(
+        self, room_id: str, since: datetime
+    ) -> List[Reservation]:
         """
-        指定部屋の全予約を開始時刻順に返す。
+        指定部屋の、CANCELLED 以外で end_time >= since の予約を開始時刻順に返す。
         """
-        room_res_list = self._reservations_by_room.get(room_id, [])
-        return list(room_res_list)
+        with self._room_lock(room_id):
+            intervals = self._intervals_by_room.get(room_id)
+            if intervals is None:
+                return []
+            return intervals.values_ending_after(to_jst(since))
 
     def get_reservation_by_id(self, reservation_id: str) -> Optional[Reservation]:
         """
         ID から予約を1件取得する。見つからなければ None。
         """
-        for room_res_list in self._reservations_by_room.values():
-            for res in room_res_list:
-                if res.reservation_id == reservation_id:
-                    return res
-        return None
+        return self._reservations_by_id.get(reservation_id)
+
+    def get_next_reservations(
+        self, room_id: str, after: datetime, limit: int = 10
+    ) -> List[Reservation]:
+        """
+        指定部屋の、CANCELLED 以外で start_time >= after の予約を開始時刻順に limit 件返す。
+        """
+        with self._room_lock(room_id):
+            intervals = self._intervals_by_room.get(room_id)
+            if intervals is None:
+                return []
+            return intervals.values_starting_after(to_jst(after), limit)
+
+    def get_reservation_ids_for_room(self, room_id: str) -> Set[str]:
+        """
+        指定部屋の reservation_id 集合（のコピー）を返す。
+        """
+        with self._room_lock(room_id):
+            return set(self._ids_by_room.get(room_id, ()))
 
     def get_active_reservation(
         self,
@@ -126,32 +336,29 @@ class InMemoryReservationRepository:
             now = now_jst()
         now = to_jst(now)
 
-        room_res_list = self._reservations_by_room.get(room_id, [])
-        for res in room_res_list:
-            if res.status in (ReservationStatus.ACTIVE, ReservationStatus.USED):
-                if res.start_time <= now <= res.end_time:
+        # 有効な予約同士は重ならないので、now を含む区間だけを見ればよい
+        with self._room_lock(room_id):
+            intervals = self._intervals_by_room.get(room_id)
+            if intervals is None:
+                return None
+            for res in intervals.values_containing(now):
+                if res.status in (ReservationStatus.ACTIVE, ReservationStatus.USED):
                     return res
-        return None
+            return None
 
     def mark_used(self, reservation_id: str) -> bool:
         """
         指定予約を USED 状態にする。成功したら True。
+        CANCELLED の予約は区間索引から外してあるので、そのままにして False を返す。
         """
-        res = self.get_reservation_by_id(reservation_id)
-        if res is None:
-            return False
-        res.status = ReservationStatus.USED
-        return True
+        return self._set_status(reservation_id, ReservationStatus.USED)
 
     def mark_no_show(self, reservation_id: str) -> bool:
         """
         指定予約を NO_SHOW 状態にする。成功したら True。
+        CANCELLED の予約は区間索引から外してあるので、そのままにして False を返す。
         """
-        res = self.get_reservation_by_id(reservation_id)
-        if res is None:
-            return False
-        res.status = ReservationStatus.NO_SHOW
-        return True
+        return self._set_status(reservation_id, ReservationStatus.NO_SHOW)
 
     def cancel_reservation(self, reservation_id: str) -> bool:
         """
@@ -160,9 +367,27 @@ class InMemoryReservationRepository:
         res = self.get_reservation_by_id(reservation_id)
         if res is None:
             return False
-        res.status = ReservationStatus.CANCELLED
+        with self._room_lock(res.room_id):
+            was_live = res.status != ReservationStatus.CANCELLED
+            if was_live:
+                self._intervals_by_room[res.room_id].remove(res.start_time, res)
+            res.status = ReservationStatus.CANCELLED
+        self._notify(res.room_id)
+        if was_live:
+            self._notify_interval(res, -1)
         return True
 
+    def _set_status(self, reservation_id: str, status: ReservationStatus) -> bool:
+        res = self.get_reservation_by_id(reservation_id)
+        if res is None:
+            return False
+        # キャンセルと同時に来ても、CANCELLED を上書きしないように部屋のロックの中で確かめる
+        with self._room_lock(res.room_id):
+            if res.status == ReservationStatus.CANCELLED:
+                return False
+            res.status = status
+            return True
+
 
 class SqliteReservationRepository:
     """
@@ -172,16 +397,94 @@ class SqliteReservationRepository:
     - reservations テーブルのスキーマは Repository.db.init_db() に依存する。
     """
 
+    # 予約区間の検索に使う SQL。どれも idx_res_room_us (room_id, start_us, end_us) を
+    # start_us の範囲で引き、必要な行だけを読む（Simulator/check_query_plans で確認する）。
+    # 時刻は UNIX エポックからのマイクロ秒（整数）で比較する。
+    # CANCELLED 以外の予約は互いに重ならないので、開始時刻順に並べると終了時刻も同じ順になる
+    _INDEXED_QUERIES = {
+        # [start - B, end + B) と重なる予約: start_us < end + B の中で開始が最も遅い1件だけ見ればよい
+        "conflict": """
+            SELECT reservation_id, start_us, end_us
+            FROM (
+                SELECT reservation_id, start_us, end_us
+                FROM reservations
+                WHERE room_id = :room_id AND start_us < :until AND status != :cancelled
+                ORDER BY start_us DESC
+                LIMIT 1
+            )
+            WHERE end_us > :since
+        """,
+        # 時刻 t を含む ACTIVE / USED の予約: start_us <= t の中で開始が遅い2件だけ見ればよい
+        # （バッファ 0 だと e_i == s_j == t で2件が t を含みうるので、呼び出し側で開始の早い方を選ぶ）
+        "active_at": """
+            SELECT reservation_id, room_id, user_id, start_us, end_us, status
+            FROM (
+                SELECT reservation_id, room_id, user_id, start_us, end_us, status
+                FROM reservations
+                WHERE room_id = :room_id AND start_us <= :t AND status != :cancelled
+                ORDER BY start_us DESC
+                LIMIT 2
+            )
+            WHERE end_us >= :t AND status IN (:active, :used)
+        """,
+        # end_us >= since の予約: since より前に始まる最後の1件（なければ since）以降だけを見ればよい
+        "upcoming": """
+            SELECT reservation_id, room_id, user_id, start_us, end_us, status
+            FROM reservations
+            WHERE room_id = :room_id
+              AND start_us >= COALESCE((
+                  SELECT start_us FROM reservations
+                  WHERE room_id = :room_id AND start_us < :since AND status != :cancelled
+                  ORDER BY start_us DESC
+                  LIMIT 1
+              ), :since)
+              AND end_us >= :since
+              AND status != :cancelled
+            ORDER BY start_us
+        """,
+        # t 以降に始まる予約を開始時刻順に limit 件
+        "next": """
+            SELECT reservation_id, room_id, user_id, start_us, end_us, status
+            FROM reservations
+            WHERE room_id = :room_id AND start_us >= :t AND status != :cancelled
+            ORDER BY start_us
+            LIMIT :limit
+        """,
+    }
+
     def __init__(self, buffer_minutes: int = 5) -> None:
         self._buffer: timedelta = timedelta(minutes=buffer_minutes)
+        self._listeners: List[Callable[[str], None]] = []
+        self._interval_listeners: List[Callable[[Reservation, int], None]] = []
+
+    def add_listener(self, callback: Callable[[str], None]) -> None:
+        """
+        このインスタンス経由で予約が作成・キャンセルされたときに callback(room_id) を呼ぶ。
+        """
+        self._listeners.append(callback)
+
+    def add_interval_listener(self, callback: Callable[[Reservation, int], None]) -> None:
+        """
+        このインスタンス経由で予約が作成されたら callback(予約, +1)、
+        有効な予約がキャンセルされたら callback(予約, -1) を呼ぶ。
+        """
+        self._interval_listeners.append(callback)
+
+    def _notify(self, room_id: str) -> None:
+        for callback in self._listeners:
+            callback(room_id)
+
+    def _notify_interval(self, res: Reservation, delta: int) -> None:
+        for callback in self._interval_listeners:
+            callback(res, delta)
 
     def _generate_reservation_id(self, room_id: str, start: datetime) -> str:
         ts = int(start.timestamp())
         return f"{room_id}-{ts}"
 
     def _row_to_reservation(self, row: sqlite3.Row) -> Reservation:
-        start = datetime.fromisoformat(row["start_time"])
-        end = datetime.fromisoformat(row["end_time"])
+        start = from_epoch_us(row["start_us"])
+        end = from_epoch_us(row["end_us"])
         status = ReservationStatus(row["status"])
         return Reservation(
             reservation_id=row["reservation_id"],
@@ -208,89 +511,95 @@ class SqliteReservationRepository:
         if end <= start:
             raise ValueError("end_time must be after start_time")
 
+        B = self._buffer
+        now = now_jst().isoformat()
+        params = {
+            "reservation_id": reservation_id,
+            "base_id": self._generate_reservation_id(room_id, start),
+            "room_id": room_id,
+            "user_id": user_id,
+            "start_time": start.isoformat(),
+            "end_time": end.isoformat(),
+            "start_us": to_epoch_us(start),
+            "end_us": to_epoch_us(end),
+            "status": ReservationStatus.ACTIVE.value,
+            "now": now,
+        }
+
         conn = get_connection()
         conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-
-        # 1) 予約IDの一意性を先に確保する
-        if reservation_id is None:
-            base_id = self._generate_reservation_id(room_id, start)
-            reservation_id = base_id
-
-            # base_id が既に存在するなら -1, -2,... とサフィックスを付けて空きを探す
-            suffix = 1
-            while True:
-                cur.execute(
-                    "SELECT 1 FROM reservations WHERE reservation_id = ?",
-                    (reservation_id,),
-                )
-                row = cur.fetchone()
-                if row is None:
-                    break  # この reservation_id は未使用なのでOK
-
-                reservation_id = f"{base_id}-{suffix}"
-                suffix += 1
-
-        # 2) room_id 単位で既存予約を取得して、バッファ込みの重複チェック
-        cur.execute(
-            """
-            SELECT reservation_id, room_id, user_id,
-                   start_time, end_time, status
-            FROM reservations
-            WHERE room_id = ?
-            """,
-            (room_id,),
-        )
-        rows = cur.fetchall()
-        B = self._buffer
+        try:
+            cur = conn.cursor()
+            # 重複チェックから挿入までを1つの書き込みトランザクションで行う。
+            # 別々だと、同じ枠への同時リクエストが両方ともチェックを通って二重予約になる
+            begin_immediate(conn)
 
-        for row in rows:
-            if row["status"] == ReservationStatus.CANCELLED.value:
-                continue
-            s_i = datetime.fromisoformat(row["start_time"])
-            e_i = datetime.fromisoformat(row["end_time"])
-            if end > (s_i - B) and start < (e_i + B):
-                conn.close()
+            # 1) バッファ込みの重複チェック（idx_res_room_us を start_us の降順にたどり、
+            #    最初の非 CANCELLED 行で止まる）
+            cur.execute(
+                self._INDEXED_QUERIES["conflict"],
+                {
+                    "room_id": room_id,
+                    "until": to_epoch_us(end + B),
+                    "since": to_epoch_us(start - B),
+                    "cancelled": ReservationStatus.CANCELLED.value,
+                },
+            )
+            row = cur.fetchone()
+            if row is not None:
                 raise ValueError(
                     f"Reservation conflicts with existing one: "
                     f"existing={row['reservation_id']}, "
-                    f"existing_range=({s_i} - {e_i}), "
+                    f"existing_range=({from_epoch_us(row['start_us'])} - "
+                    f"{from_epoch_us(row['end_us'])}), "
                     f"new_range=({start} - {end}), "
                     f"buffer={B}"
                 )
 
-        now = now_jst().isoformat()
-
-        # 3) 挿入時に万一 UNIQUE 制約違反が起きても ValueError に変換して上に返す
-        try:
-            cur.execute(
-                """
-                INSERT INTO reservations
-                  (reservation_id, room_id, user_id,
-                   start_time, end_time, status,
-                   created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    reservation_id,
-                    room_id,
-                    user_id,
-                    start.isoformat(),
-                    end.isoformat(),
-                    ReservationStatus.ACTIVE.value,
-                    now,
-                    now,
-                ),
-            )
+            # 2) 挿入。ID 未指定なら INSERT 文の中で空き ID を決める（問い合わせの往復なし）:
+            #    base_id が未使用なら base_id、使用済みなら base_id-N（N は既存サフィックスの最大 + 1）。
+            #    サフィックス付きの ID は主キー上の範囲 (base_id-, base_id.) で探す（'.' は '-' の次の文字）
+            #    明示した ID が使用済みなら UNIQUE 制約違反を ValueError に変換して上に返す
+            try:
+                cur.execute(
+                    """
+                    INSERT INTO reservations
+                      (reservation_id, room_id, user_id,
+                       start_time, end_time, start_us, end_us, status,
+                       created_at, updated_at)
+                    SELECT
+                      COALESCE(
+                        :reservation_id,
+                        CASE
+                          WHEN NOT EXISTS (
+                            SELECT 1 FROM reservations WHERE reservation_id = :base_id
+                          ) THEN :base_id
+                          ELSE :base_id || '-' || (
+                            SELECT COALESCE(
+                              MAX(CAST(substr(reservation_id, length(:base_id) + 2) AS INTEGER)), 0
+                            ) + 1
+                            FROM reservations
+                            WHERE reservation_id > :base_id || '-'
+                              AND reservation_id < :base_id || '.'
+                          )
+                        END
+                      ),
+                      :room_id, :user_id, :start_time, :end_time, :start_us, :end_us,
+                      :status, :now, :now
+                    RETURNING reservation_id
+                    """,
+                    params,
+                )
+                reservation_id = cur.fetchone()["reservation_id"]
+            except sqlite3.IntegrityError as e:
+                raise ValueError(f"failed to create reservation: {e}") from e
             conn.commit()
-        except sqlite3.IntegrityError as e:
+        finally:
+            # コミットしていなければ close() がロールバックして書き込みロックを放す
             conn.close()
-            # ここに来るのは、基本的には reservation_id のユニーク制約違反のみのはず
-            raise ValueError(f"failed to create reservation: {e}") from e
-
-        conn.close()
 
-        return Reservation(
+        self._notify(room_id)
+        new_res = Reservation(
             reservation_id=reservation_id,
             room_id=room_id,
             user_id=user_id,
@@ -298,6 +607,8 @@ class SqliteReservationRepository:
             end_time=end,
             status=ReservationStatus.ACTIVE,
         )
+        self._notify_interval(new_res, +1)
+        return new_res
 
     def get_reservations_for_room(self, room_id: str) -> List[Reservation]:
         conn = get_connection()
@@ -306,10 +617,10 @@ class SqliteReservationRepository:
         cur.execute(
             """
             SELECT reservation_id, room_id, user_id,
-                   start_time, end_time, status
+                   start_us, end_us, status
             FROM reservations
             WHERE room_id = ?
-            ORDER BY start_time
+            ORDER BY start_us, reservation_id
             """,
             (room_id,),
         )
@@ -317,6 +628,118 @@ class SqliteReservationRepository:
         conn.close()
         return [self._row_to_reservation(r) for r in rows]
 
+    def _query(self, name: str, **params) -> List[Reservation]:
+        conn = get_connection()
+        conn.row_factory = sqlite3.Row
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                self._INDEXED_QUERIES[name],
+                {
+                    "cancelled": ReservationStatus.CANCELLED.value,
+                    "active": ReservationStatus.ACTIVE.value,
+                    "used": ReservationStatus.USED.value,
+                    **params,
+                },
+            )
+            rows = cur.fetchall()
+        finally:
+            conn.close()
+        return [self._row_to_reservation(r) for r in rows]
+
+    @staticmethod
+    def _reservation_query(
+        room_id: Optional[str],
+        user_id: Optional[str],
+        start_from: Optional[datetime],
+        start_to: Optional[datetime],
+        statuses: Optional[Iterable[ReservationStatus]],
+        limit: int,
+        cursor: Optional[str],
+    ) -> Tuple[str, dict]:
+        """
+        query_reservations の SQL とパラメータを組み立てる（Simulator/check_query_plans からも使う）。
+        user_id があれば idx_res_user_us、room_id だけなら idx_res_room_us を start_us の範囲で引く。
+        続きがあるかを知るために limit + 1 件読む。
+        """
+        clauses = []
+        params: dict = {"limit": limit + 1}
+        if room_id is not None:
+            clauses.append("room_id = :room_id")
+            params["room_id"] = room_id
+        if user_id is not None:
+            clauses.append("user_id = :user_id")
+            params["user_id"] = user_id
+        if start_from is not None:
+            clauses.append("start_us >= :start_from")
+            params["start_from"] = to_epoch_us(start_from)
+        if start_to is not None:
+            clauses.append("start_us < :start_to")
+            params["start_to"] = to_epoch_us(start_to)
+        if statuses is not None:
+            names = []
+            for i, status in enumerate(statuses):
+                params[f"status_{i}"] = status.value
+                names.append(f":status_{i}")
+            clauses.append(f"status IN ({', '.join(names) or 'NULL'})")
+        if cursor is not None:
+            # (start_us, reservation_id) > カーソル。start_us >= の側で索引の範囲を絞る
+            params["cursor_start"], params["cursor_id"] = decode_cursor(cursor)
+            clauses.append(
+                "start_us >= :cursor_start"
+                " AND (start_us > :cursor_start OR reservation_id > :cursor_id)"
+            )
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"""
+            SELECT reservation_id, room_id, user_id, start_us, end_us, status
+            FROM reservations
+            {where}
+            ORDER BY start_us, reservation_id
+            LIMIT :limit
+        """
+        return sql, params
+
+    def query_reservations(
+        self,
+        room_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        start_from: Optional[datetime] = None,
+        start_to: Optional[datetime] = None,
+        statuses: Optional[Iterable[ReservationStatus]] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Reservation], Optional[str]]:
+        _check_limit(limit)
+        sql, params = self._reservation_query(
+            room_id, user_id, start_from, start_to, statuses, limit, cursor
+        )
+        conn = get_connection()
+        conn.row_factory = sqlite3.Row
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+        page = [self._row_to_reservation(r) for r in rows[:limit]]
+        next_cursor = encode_cursor(page[-1]) if len(rows) > limit else None
+        return page, next_cursor
+
+    def get_upcoming_reservations(
+        self, room_id: str, since: datetime
+    ) -> List[Reservation]:
+        """
+        CANCELLED 以外で end_time >= since の予約だけを返す（過去の行は読まない）。
+        """
+        return self._query(
+            "upcoming", room_id=room_id, since=to_epoch_us(since)
+        )
+
+    def get_next_reservations(
+        self, room_id: str, after: datetime, limit: int = 10
+    ) -> List[Reservation]:
+        return self._query(
+            "next", room_id=room_id, t=to_epoch_us(after), limit=limit
+        )
+
     def get_reservation_by_id(self, reservation_id: str) -> Optional[Reservation]:
         conn = get_connection()
         conn.row_factory = sqlite3.Row
@@ -324,7 +747,7 @@ class SqliteReservationRepository:
         cur.execute(
             """
             SELECT reservation_id, room_id, user_id,
-                   start_time, end_time, status
+                   start_us, end_us, status
             FROM reservations
             WHERE reservation_id = ?
             """,
@@ -336,6 +759,16 @@ class SqliteReservationRepository:
             return None
         return self._row_to_reservation(row)
 
+    def get_reservation_ids_for_room(self, room_id: str) -> Set[str]:
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT reservation_id FROM reservations WHERE room_id = ?", (room_id,)
+        )
+        ids = {row[0] for row in cur.fetchall()}
+        conn.close()
+        return ids
+
     def get_active_reservation(
         self,
         room_id: str,
@@ -343,17 +776,16 @@ class SqliteReservationRepository:
     ) -> Optional[Reservation]:
         if now is None:
             now = now_jst()
-        now = to_jst(now)
-
-        # シンプルに全件を取得して Python でフィルタ
-        all_res = self.get_reservations_for_room(room_id)
-        for res in all_res:
-            if res.status in (ReservationStatus.ACTIVE, ReservationStatus.USED):
-                if res.start_time <= now <= res.end_time:
-                    return res
-        return None
+        found = self._query(
+            "active_at", room_id=room_id, t=to_epoch_us(now)
+        )
+        return min(found, key=lambda r: r.start_time) if found else None
 
     def _update_status(self, reservation_id: str, status: ReservationStatus) -> bool:
+        """
+        USED / NO_SHOW にする（キャンセルは cancel_reservation）。
+        InMemoryReservationRepository と同じく、CANCELLED の予約は USED / NO_SHOW にしない。
+        """
         conn = get_connection()
         cur = conn.cursor()
         now = now_jst().isoformat()
@@ -361,9 +793,9 @@ class SqliteReservationRepository:
             """
             UPDATE reservations
             SET status = ?, updated_at = ?
-            WHERE reservation_id = ?
+            WHERE reservation_id = ? AND status != ?
             """,
-            (status.value, now, reservation_id),
+            (status.value, now, reservation_id, ReservationStatus.CANCELLED.value),
         )
         conn.commit()
         changed = cur.rowcount > 0
@@ -377,4 +809,33 @@ class SqliteReservationRepository:
         return self._update_status(reservation_id, ReservationStatus.NO_SHOW)
 
     def cancel_reservation(self, reservation_id: str) -> bool:
-        return self._update_status(reservation_id, ReservationStatus.CANCELLED)
+        """
+        CANCELLED にする。有効な予約だったときだけ、変更後の行を RETURNING で受け取って通知する
+        （キャンセル済みの予約をもう一度キャンセルしても True だが、通知はしない）。
+        """
+        conn = get_connection()
+        conn.row_factory = sqlite3.Row
+        try:
+            row = conn.execute(
+                """
+                UPDATE reservations
+                SET status = ?, updated_at = ?
+                WHERE reservation_id = ? AND status != ?
+                RETURNING reservation_id, room_id, user_id, start_us, end_us, status
+                """,
+                (
+                    ReservationStatus.CANCELLED.value,
+                    now_jst().isoformat(),
+                    reservation_id,
+                    ReservationStatus.CANCELLED.value,
+                ),
+            ).fetchone()
+            conn.commit()
+        finally:
+            conn.close()
+        if row is None:
+            return self.get_reservation_by_id(reservation_id) is not None
+        res = self._row_to_reservation(row)
+        self._notify(res.room_id)
+        self._notify_interval(res, -1)
+        return True
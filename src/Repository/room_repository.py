@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from Domain.room import STATE_PARAM_NAMES, Room
+from Repository.db import get_connection
+
+
+class InMemoryRoomRepository:
+    """
+    部屋レジストリ（部屋 → カメラ・判定パラメータ）の in-memory 実装。
+    SqliteRoomRepository とインターフェースを揃えておくこと。
+    """
+
+    def __init__(self) -> None:
+        self._rooms: Dict[str, Room] = {}
+        self._lock = threading.Lock()
+
+    def upsert_room(self, room: Room) -> Room:
+        return self.upsert_rooms([room])[0]
+
+    def upsert_rooms(self, rooms: Iterable[Room]) -> List[Room]:
+        rooms = list(rooms)
+        with self._lock:
+            for room in rooms:
+                self._rooms[room.room_id] = room
+        return rooms
+
+    def get_room(self, room_id: str) -> Optional[Room]:
+        return self._rooms.get(room_id)
+
+    def list_rooms(self) -> List[Room]:
+        """
+        全部屋を room_id 順に返す。
+        """
+        with self._lock:
+            return sorted(self._rooms.values(), key=lambda r: r.room_id)
+
+    def delete_room(self, room_id: str) -> bool:
+        with self._lock:
+            return self._rooms.pop(room_id, None) is not None
+
+
+class SqliteRoomRepository:
+    """
+    部屋レジストリの SQLite 実装。
+    rooms / room_devices テーブルのスキーマは Repository.db.init_db() に依存する。
+    """
+
+    _ROOM_COLUMNS = ("room_id", "name") + STATE_PARAM_NAMES
+
+    def upsert_room(self, room: Room) -> Room:
+        return self.upsert_rooms([room])[0]
+
+    def upsert_rooms(self, rooms: Iterable[Room]) -> List[Room]:
+        """
+        複数の部屋を1トランザクションで登録・更新する（数千部屋の初期登録用）。
+        """
+        rooms = list(rooms)
+        columns = ", ".join(self._ROOM_COLUMNS)
+        placeholders = ", ".join("?" for _ in self._ROOM_COLUMNS)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in self._ROOM_COLUMNS[1:])
+
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.executemany(
+                f"""
+                INSERT INTO rooms ({columns}) VALUES ({placeholders})
+                ON CONFLICT(room_id) DO UPDATE SET {updates}
+                """,
+                [tuple(getattr(r, c) for c in self._ROOM_COLUMNS) for r in rooms],
+            )
+            cur.executemany(
+                "DELETE FROM room_devices WHERE room_id = ?",
+                [(r.room_id,) for r in rooms],
+            )
+            cur.executemany(
+                "INSERT INTO room_devices (room_id, device_id) VALUES (?, ?)",
+                [(r.room_id, d) for r in rooms for d in r.device_ids],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return rooms
+
+    def _load(self, where: str = "", params: tuple = ()) -> List[Room]:
+        conn = get_connection()
+        conn.row_factory = sqlite3.Row
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                f"SELECT {', '.join(self._ROOM_COLUMNS)} FROM rooms {where} ORDER BY room_id",
+                params,
+            )
+            rooms = {
+                row["room_id"]: Room(**{c: row[c] for c in self._ROOM_COLUMNS})
+                for row in cur.fetchall()
+            }
+            if not rooms:
+                return []
+            if where:
+                cur.execute(
+                    f"""
+                    SELECT room_id, device_id FROM room_devices
+                    WHERE room_id IN ({', '.join('?' for _ in rooms)})
+                    ORDER BY room_id, device_id
+                    """,
+                    tuple(rooms),
+                )
+            else:
+                cur.execute(
+                    "SELECT room_id, device_id FROM room_devices ORDER BY room_id, device_id"
+                )
+            for row in cur.fetchall():
+                rooms[row["room_id"]].device_ids.append(row["device_id"])
+            return list(rooms.values())
+        finally:
+            conn.close()
+
+    def get_room(self, room_id: str) -> Optional[Room]:
+        rooms = self._load("WHERE room_id = ?", (room_id,))
+        return rooms[0] if rooms else None
+
+    def list_rooms(self) -> List[Room]:
+        return self._load()
+
+    def delete_room(self, room_id: str) -> bool:
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM room_devices WHERE room_id = ?", (room_id,))
+            cur.execute("DELETE FROM rooms WHERE room_id = ?", (room_id,))
+            conn.commit()
+            return cur.rowcount > 0
+        finally:
+            conn.close()
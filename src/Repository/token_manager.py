@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import base64
+import threading
+import time
+from typing import Callable, Optional
+
+from Repository.http_client import ConsoleHttpClient, get_shared_http_client
+
+
+class AccessTokenManager:
+    """
+    client_credentials で取得したアクセストークンをキャッシュするマネージャ。
+
+    - レスポンスの expires_in を覚えておき、有効期限内はキャッシュを返す
+    - 期限切れ間近 (refresh_margin_sec 以内) になったらバックグラウンドで先回りして更新する
+    - 未取得 / 完全に期限切れの場合だけ、呼び出し元スレッドで同期的に取得する
+    - hit / miss / refresh の回数を stats() で返す（認証トラフィックの確認用）
+    """
+
+    def __init__(
+        self,
+        auth_endpoint: str,
+        client_id: str,
+        client_secret: str,
+        refresh_margin_sec: float = 60.0,
+        default_expires_in_sec: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+        http_client: Optional[ConsoleHttpClient] = None,
+    ) -> None:
+        self.auth_endpoint = auth_endpoint
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.refresh_margin_sec = refresh_margin_sec
+        # expires_in が返ってこなかった場合に仮定する有効期間
+        self.default_expires_in_sec = default_expires_in_sec
+        self._clock = clock
+        self._http = http_client or get_shared_http_client()
+
+        self._token: Optional[str] = None
+        self._expires_at: float = 0.0
+        self._refresh_at: float = 0.0
+
+        # 状態の読み書き用ロックと、トークン取得リクエストの多重発行を防ぐロック
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._background_refreshing = False
+
+        # 統計カウンタ
+        self._hits = 0
+        self._misses = 0
+        self._refreshes = 0
+        self._background_refreshes = 0
+        self._failures = 0
+        self._invalidations = 0
+
+    # --- public API ---
+
+    def get_token(self) -> str:
+        """
+        有効なアクセストークンを返す。
+        キャッシュが使えない場合のみ認証エンドポイントに問い合わせる。
+        """
+        with self._lock:
+            now = self._clock()
+            if self._token is not None and now < self._expires_at:
+                self._hits += 1
+                if now >= self._refresh_at and not self._background_refreshing:
+                    # まだ使えるトークンを返しつつ、裏で更新しておく
+                    self._background_refreshing = True
+                    threading.Thread(
+                        target=self._background_refresh, daemon=True
+                    ).start()
+                return self._token
+            self._misses += 1
+
+        with self._fetch_lock:
+            # 待っている間に他スレッドが更新済みならそれを使う
+            with self._lock:
+                if self._token is not None and self._clock() < self._expires_at:
+                    return self._token
+            return self._refresh()
+
+    def invalidate(self, token: Optional[str] = None) -> None:
+        """
+        キャッシュ中のトークンを破棄する（401 を受け取ったとき用）。
+        token を指定した場合は、キャッシュがそのトークンのときだけ破棄する。
+        """
+        with self._lock:
+            if token is not None and token != self._token:
+                # 既に別スレッドが新しいトークンに差し替えている
+                return
+            self._token = None
+            self._expires_at = 0.0
+            self._refresh_at = 0.0
+            self._invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            remaining = (
+                max(0.0, self._expires_at - self._clock())
+                if self._token is not None
+                else 0.0
+            )
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "refreshes": self._refreshes,
+                "background_refreshes": self._background_refreshes,
+                "failures": self._failures,
+                "invalidations": self._invalidations,
+                "expires_in_sec": round(remaining, 1),
+            }
+
+    # --- internal ---
+
+    def _request_token(self) -> tuple[str, float]:
+        """
+        認証エンドポイントから (access_token, expires_in) を取得する。
+        """
+        auth = base64.b64encode(
+            f"{self.client_id}:{self.client_secret}".encode()
+        ).decode()
+        headers = {
+            "authorization": f"Basic {auth}",
+            "content-type": "application/x-www-form-urlencoded",
+        }
+        data = "grant_type=client_credentials&scope=system"
+
+        response = self._http.post(self.auth_endpoint, headers=headers, data=data)
+        response.raise_for_status()
+        body = response.json()
+
+        try:
+            expires_in = float(body.get("expires_in", self.default_expires_in_sec))
+        except (TypeError, ValueError):
+            expires_in = self.default_expires_in_sec
+        return body["access_token"], expires_in
+
+    def _refresh(self) -> str:
+        try:
+            token, expires_in = self._request_token()
+        except Exception:
+            with self._lock:
+                self._failures += 1
+            raise
+
+        now = self._clock()
+        # 有効期間が短いトークンでも、期間の半分は更新せずに使う
+        margin = min(self.refresh_margin_sec, expires_in / 2)
+        with self._lock:
+            self._token = token
+            self._expires_at = now + expires_in
+            self._refresh_at = now + expires_in - margin
+            self._refreshes += 1
+        return token
+
+    def _background_refresh(self) -> None:
+        try:
+            with self._fetch_lock:
+                with self._lock:
+                    # 同期取得が先に済んでいれば何もしない
+                    if self._clock() < self._refresh_at:
+                        return
+                self._refresh()
+                with self._lock:
+                    self._background_refreshes += 1
+        except Exception as e:
+            print(f"[AccessTokenManager] background refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._background_refreshing = False
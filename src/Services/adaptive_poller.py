@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Tuple
+
+from Domain.reservation import ReservationStatus
+from Services.room_state_manager import RoomState, RoomStateManager
+
+
+class AdaptivePollingPolicy:
+    """
+    予約スケジュールに合わせてカメラの取得間隔を決めるポリシー。
+
+    - [start - arrival_window_before_sec, end + grace_period_sec] の間と、
+      部屋が IN_USE（OVERSTAY 検知中を含む）の間は fast_interval_sec ごとに取得する
+    - それ以外は floor_sec から backoff_factor 倍ずつ間隔を伸ばし、ceiling_sec で頭打ちにする
+    - ただし次の予約ウィンドウの開始は飛び越さない（ウィンドウ開始時点で必ず1回取得する）
+
+    予約ウィンドウは reservation_repo.get_upcoming_reservations で終わっていない予約だけ読み、
+    予約の作成・キャンセル通知か、部屋の状態遷移（利用開始・ノーショー確定など）が来るまでキャッシュする。
+    ウィンドウは開始順に持って二分探索し、終わったものは先頭から捨てる。
+    時刻・秒数はすべて（仮想時計を含む）now_jst 基準。
+    """
+
+    def __init__(
+        self,
+        reservation_repo: Any,
+        room_manager: RoomStateManager,
+        fast_interval_sec: float = 5.0,
+        floor_sec: float = 30.0,
+        ceiling_sec: float = 900.0,
+        backoff_factor: float = 2.0,
+    ) -> None:
+        if not 0 < fast_interval_sec <= floor_sec <= ceiling_sec:
+            raise ValueError("require 0 < fast_interval_sec <= floor_sec <= ceiling_sec")
+        if backoff_factor < 1.0:
+            raise ValueError("backoff_factor must be >= 1")
+        self._repo = reservation_repo
+        self._room_manager = room_manager
+        self.fast_interval_sec = fast_interval_sec
+        self.floor_sec = floor_sec
+        self.ceiling_sec = ceiling_sec
+        self.backoff_factor = backoff_factor
+
+        self._lock = threading.Lock()
+        self._backoff_sec = floor_sec
+        # 開始順の window_start / window_end。None なら次回読み直す
+        # （1部屋の予約は重ならないので、開始順に並べれば終了も昇順になる）
+        self._windows: Optional[Tuple[List[datetime], List[datetime]]] = None
+        # ウィンドウを読んだ時刻。これより前を聞かれたら（時計が戻ったら）読み直す
+        self._loaded_at: Optional[datetime] = None
+        if hasattr(reservation_repo, "add_listener"):
+            reservation_repo.add_listener(self._on_reservation_change)
+        if hasattr(room_manager, "add_transition_listener"):
+            room_manager.add_transition_listener(self._on_transition)
+
+        # 統計
+        self._fast_polls = 0
+        self._backoff_polls = 0
+        self._window_loads = 0
+
+    def _on_reservation_change(self, room_id: str) -> None:
+        if room_id == self._room_manager.room_id:
+            with self._lock:
+                self._windows = None
+
+    def _on_transition(self, prev_state: RoomState, new_state: RoomState) -> None:
+        # USED / NO_SHOW への変更は予約リポジトリの通知に乗らないので、状態遷移で読み直す
+        with self._lock:
+            self._windows = None
+
+    def _get_windows(self, current_time: datetime) -> Tuple[List[datetime], List[datetime]]:
+        """
+        current_time 以降に関係する予約ウィンドウの (開始のリスト, 終了のリスト)。
+        終わったウィンドウは先頭から捨てる。
+        """
+        with self._lock:
+            windows = self._windows
+            if windows is not None and current_time >= self._loaded_at:
+                starts, ends = windows
+                # current_time より前に終わったウィンドウは捨てる（リストは差し替えて、読んでいる側に影響させない）
+                ended = bisect_left(ends, current_time)
+                if ended:
+                    windows = self._windows = (starts[ended:], ends[ended:])
+                return windows
+
+        before = timedelta(seconds=self._room_manager.arrival_window_before_sec)
+        grace = timedelta(seconds=self._room_manager.grace_period_sec)
+        starts: List[datetime] = []
+        ends: List[datetime] = []
+        for res in self._repo.get_upcoming_reservations(
+            self._room_manager.room_id, current_time - grace
+        ):
+            # ノーショー確定の予約は、もう検知するものがない（キャンセル済みは返ってこない）
+            if res.status == ReservationStatus.NO_SHOW:
+                continue
+            starts.append(res.start_time - before)
+            ends.append(res.end_time + grace)
+        with self._lock:
+            self._windows = (starts, ends)
+            self._loaded_at = current_time
+            self._window_loads += 1
+        return starts, ends
+
+    def is_hot(self, current_time: datetime) -> bool:
+        """
+        今が高頻度で取得すべき時間帯か。
+        """
+        if self._room_manager.current_state == RoomState.IN_USE:
+            return True
+        starts, ends = self._get_windows(current_time)
+        i = bisect_right(starts, current_time)
+        # current_time 以前に始まった最後のウィンドウ（終了が最も遅い）に入っているか
+        return i > 0 and current_time <= ends[i - 1]
+
+    def next_interval(self, current_time: datetime) -> float:
+        """
+        current_time に取得した後、次に取得するまでの秒数を返す。
+        """
+        if self.is_hot(current_time):
+            with self._lock:
+                self._backoff_sec = self.floor_sec
+                self._fast_polls += 1
+            return self.fast_interval_sec
+
+        with self._lock:
+            interval = self._backoff_sec
+            self._backoff_sec = min(
+                self.ceiling_sec, self._backoff_sec * self.backoff_factor
+            )
+            self._backoff_polls += 1
+
+        starts, _ = self._get_windows(current_time)
+        i = bisect_right(starts, current_time)
+        if i < len(starts):
+            interval = min(interval, (starts[i] - current_time).total_seconds())
+        return interval
+
+    def reset(self) -> None:
+        """
+        予約や状態が変わったときに呼ぶ。バックオフを floor_sec からやり直す。
+        """
+        with self._lock:
+            self._backoff_sec = self.floor_sec
+            self._windows = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "fast_polls": self._fast_polls,
+                "backoff_polls": self._backoff_polls,
+                "current_backoff_sec": self._backoff_sec,
+                "window_loads": self._window_loads,
+                "fast_interval_sec": self.fast_interval_sec,
+                "floor_sec": self.floor_sec,
+                "ceiling_sec": self.ceiling_sec,
+            }
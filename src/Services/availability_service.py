@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import re
+import threading
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from Domain.reservation import Reservation
+from time_utils import JST, now_jst, to_jst
+
+MINUTES_PER_DAY = 24 * 60
+_MINUTE = timedelta(minutes=1)
+_FREE_RUN = re.compile(b"\x00+")
+
+
+class _DayTimeline:
+    """
+    部屋1つ・1日分の分単位のタイムライン。
+    counts[i] は、その日の i 分目（00:00 起点）を「予約 + 前後バッファ」で塞いでいる予約の数。
+    バッファ同士は重なりうるので、ビットではなく数で持つ（キャンセルで 1 減らせるように）。
+    """
+
+    __slots__ = ("counts", "ids")
+
+    def __init__(self) -> None:
+        self.counts = bytearray(MINUTES_PER_DAY)
+        # counts に反映済みの reservation_id（同じ予約を2回足したり、足していない予約を引いたりしない）
+        self.ids: Set[str] = set()
+
+
+class AvailabilityService:
+    """
+    部屋ごと・日ごとの空き時間を、分単位のタイムラインから返す。
+
+    - 予約 [s, e) は [s - buffer, e + buffer) を塞ぐ（create_reservation の重複チェックと同じ条件）。
+      分の途中にかかる場合は、その分ごと塞ぐ（空きを広めに返さない）
+    - タイムラインは (部屋, 日) ごとに初回に reservation_repo.get_upcoming_reservations から作り、
+      以降は add_interval_listener の通知（作成 +1 / キャンセル -1）でその分だけ書き換える
+    - 通知を出さないリポジトリでは毎回作り直す
+    - 作ったタイムラインは max_days 個まで持ち、超えたら古く作ったものから捨てる
+    """
+
+    def __init__(
+        self,
+        reservation_repo: Any,
+        buffer_minutes: int,
+        min_minutes: int,
+        max_minutes: int,
+        max_days: int = 10_000,
+    ) -> None:
+        self._repo = reservation_repo
+        self.buffer = timedelta(minutes=buffer_minutes)
+        self.min_minutes = min_minutes
+        self.max_minutes = max_minutes
+        self._max_days = max_days
+        self._timelines: Dict[Tuple[str, date], _DayTimeline] = {}
+        self._lock = threading.Lock()
+        self._listening = hasattr(reservation_repo, "add_interval_listener")
+        if self._listening:
+            reservation_repo.add_interval_listener(self._on_interval_changed)
+
+        # 統計
+        self._builds = 0
+        self._updates = 0
+
+    # --- タイムラインの維持 ---
+
+    @staticmethod
+    def _day_start(day: date) -> datetime:
+        return datetime.combine(day, time(), tzinfo=JST)
+
+    def _blocked_minutes(self, res: Reservation, day: date) -> Tuple[int, int]:
+        """
+        res が day に塞ぐ分の範囲 [lo, hi)（その日にかからなければ lo >= hi）。
+        """
+        day_start = self._day_start(day)
+        lo = (res.start_time - self.buffer - day_start) // _MINUTE
+        hi = -((day_start - (res.end_time + self.buffer)) // _MINUTE)  # 切り上げ
+        return max(0, lo), min(MINUTES_PER_DAY, hi)
+
+    def _days_of(self, res: Reservation) -> Iterable[date]:
+        first = to_jst(res.start_time - self.buffer).date()
+        last = to_jst(res.end_time + self.buffer).date()
+        day = first
+        while day <= last:
+            yield day
+            day += timedelta(days=1)
+
+    def _apply(self, timeline: _DayTimeline, res: Reservation, day: date, delta: int) -> None:
+        if delta > 0:
+            if res.reservation_id in timeline.ids:
+                return
+            timeline.ids.add(res.reservation_id)
+        else:
+            if res.reservation_id not in timeline.ids:
+                return
+            timeline.ids.discard(res.reservation_id)
+        lo, hi = self._blocked_minutes(res, day)
+        counts = timeline.counts
+        for i in range(lo, hi):
+            counts[i] += delta
+
+    def _build(self, room_id: str, day: date) -> _DayTimeline:
+        day_start = self._day_start(day)
+        day_end = day_start + timedelta(days=1)
+        timeline = _DayTimeline()
+        for res in self._repo.get_upcoming_reservations(room_id, day_start - self.buffer):
+            if res.start_time - self.buffer >= day_end:
+                break
+            self._apply(timeline, res, day, +1)
+        self._builds += 1
+        return timeline
+
+    def _timeline(self, room_id: str, day: date) -> _DayTimeline:
+        # self._lock の中で呼ぶこと
+        key = (room_id, day)
+        timeline = self._timelines.get(key)
+        if timeline is None or not self._listening:
+            timeline = self._build(room_id, day)
+            if len(self._timelines) >= self._max_days:
+                self._timelines.pop(next(iter(self._timelines)))
+            self._timelines[key] = timeline
+        return timeline
+
+    def _on_interval_changed(self, res: Reservation, delta: int) -> None:
+        """
+        予約の作成 (+1)・キャンセル (-1) の通知。作成済みのタイムラインだけ書き換える。
+        """
+        with self._lock:
+            for day in self._days_of(res):
+                timeline = self._timelines.get((res.room_id, day))
+                if timeline is not None:
+                    self._apply(timeline, res, day, delta)
+                    self._updates += 1
+
+    def invalidate_all(self) -> None:
+        with self._lock:
+            self._timelines.clear()
+
+    # --- 参照 ---
+
+    def free_intervals(
+        self, room_id: str, day: date, now: Optional[datetime] = None
+    ) -> List[dict]:
+        """
+        day の空き時間を [{"start", "end", "max_minutes"}] で返す。
+        now より前と、min_minutes に満たない隙間は含めない。
+        max_minutes はその隙間で取れる最長の予約時間（MAX_RESERVE_MINUTES で頭打ち）。
+        """
+        if now is None:
+            now = now_jst()
+        now = to_jst(now)
+        day_start = self._day_start(day)
+        if day_start + timedelta(days=1) <= now:
+            return []
+        with self._lock:
+            counts = bytes(self._timeline(room_id, day).counts)
+
+        first = max(0, -((day_start - now) // _MINUTE))  # now を切り上げた分
+        result = []
+        for run in _FREE_RUN.finditer(counts, first):
+            length = run.end() - run.start()
+            if length < self.min_minutes:
+                continue
+            result.append(
+                {
+                    "start": day_start + run.start() * _MINUTE,
+                    "end": day_start + run.end() * _MINUTE,
+                    "max_minutes": min(length, self.max_minutes),
+                }
+            )
+        return result
+
+    def is_free(self, room_id: str, start: datetime, end: datetime) -> bool:
+        """
+        [start, end) に予約を入れてもバッファ込みで既存予約と重ならないか。
+        """
+        start = to_jst(start)
+        end = to_jst(end)
+        with self._lock:
+            day = start.date()
+            while self._day_start(day) < end:
+                day_start = self._day_start(day)
+                lo = max(0, (start - day_start) // _MINUTE)
+                hi = min(MINUTES_PER_DAY, -((day_start - end) // _MINUTE))
+                if any(self._timeline(room_id, day).counts[lo:hi]):
+                    return False
+                day += timedelta(days=1)
+        return True
+
+    def free_rooms(self, room_ids: Iterable[str], start: datetime, end: datetime) -> List[str]:
+        """
+        [start, end) に予約を入れられる部屋の room_id を、渡された順で返す。
+        """
+        return [room_id for room_id in room_ids if self.is_free(room_id, start, end)]
+
+    def stats(self) -> dict:
+        return {
+            "timelines": len(self._timelines),
+            "builds": self._builds,
+            "updates": self._updates,
+        }
@@ -0,0 +1,435 @@
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from Domain.reservation import Reservation, ReservationStatus
+from Domain.room import STATE_PARAM_NAMES, Room
+from Services.occupancy_provider import OccupancyProvider
+from Services.penalty_service import PenaltyService
+from Services.room_state_manager import RoomState, RoomStateManager
+from Services.target_index import TargetReservationIndex
+from time_utils import format_jst_iso, now_jst, to_epoch_us
+
+_IDLE = RoomState.IDLE.value
+_RESERVED_NOT_USED = RoomState.RESERVED_NOT_USED.value
+_IN_USE = RoomState.IN_USE.value
+_FINISHED = RoomState.FINISHED.value
+
+# 判定パラメータの既定値は RoomStateManager に合わせる
+_DEFAULT_PARAMS = {
+    name: getattr(RoomStateManager("", None, None), name) for name in STATE_PARAM_NAMES
+}
+
+
+class _RoomView:
+    """
+    get_manager() が返す、部屋1つ分の判定パラメータ・状態のビュー。
+    /debug/state_params から RoomStateManager と同じ属性名で読み書きできるようにする。
+    """
+
+    def __init__(self, engine: "BatchStateEngine", room_id: str) -> None:
+        object.__setattr__(self, "_engine", engine)
+        object.__setattr__(self, "room_id", room_id)
+
+    def __getattr__(self, name: str) -> Any:
+        if name in STATE_PARAM_NAMES:
+            return self._engine.get_params(self.room_id)[name]
+        if name == "current_state":
+            return RoomState[self._engine.get_status(self.room_id)["room_state"]]
+        if name == "current_reservation_id":
+            return self._engine.get_status(self.room_id)["reservation_id"]
+        raise AttributeError(name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name not in STATE_PARAM_NAMES:
+            raise AttributeError(name)
+        self._engine.set_params(self.room_id, **{name: value})
+
+
+class BatchStateEngine:
+    """
+    全部屋の状態機械を NumPy 配列でまとめて1ステップ進める監視エンジン（MonitoringEngine の代替）。
+
+    - 部屋ごとの状態・対象予約の開始/終了時刻・判定パラメータを配列で持ち、
+      IDLE → RESERVED_NOT_USED → IN_USE / FINISHED の遷移を全部屋まとめて計算する
+    - Python で回すのは「対象予約の取り直しが必要な部屋」と「状態が変わった部屋」の副作用
+      （mark_used / mark_no_show / add_penalty）だけ
+    - 判定規則は RoomStateManager.update_state と同じ（Simulator/bench_batch_engine で差分検証）。
+      対象予約の取り直しも同じ TargetReservationIndex を使う。
+      ただし予約の作成・キャンセルは reservation_repo.add_listener の通知で知るので、
+      通知しない経路で予約を書き換えた場合は mark_dirty / mark_all_dirty を呼ぶこと
+    """
+
+    # 部屋ごとの配列: (名前, dtype, 初期値)。判定パラメータはマイクロ秒で持つ
+    _COLUMNS = (
+        ("state", np.int8, _IDLE),
+        ("has_res", np.bool_, False),
+        ("res_active", np.bool_, False),  # 対象予約が ACTIVE か（ノーショー判定用）
+        ("start_us", np.int64, 0),
+        ("end_us", np.int64, 0),
+        ("occupied", np.bool_, False),
+        ("alert", np.bool_, False),
+    ) + tuple((name, np.int64, 0) for name in STATE_PARAM_NAMES)
+
+    def __init__(
+        self,
+        reservation_repo: Any,
+        penalty_service: PenaltyService,
+        provider_factory: Callable[[Room], OccupancyProvider],
+        capacity: int = 64,
+    ) -> None:
+        self._reservation_repo = reservation_repo
+        self._penalty_service = penalty_service
+        self._provider_factory = provider_factory
+        self._target_index = TargetReservationIndex.shared(reservation_repo)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        self._n = 0
+        self._index: Dict[str, int] = {}
+        self._room_ids: List[str] = []
+        self._providers: List[OccupancyProvider] = []
+        self._reservation_ids: List[Optional[str]] = []
+        self._user_ids: List[Optional[str]] = []
+        self._alloc(max(1, capacity))
+
+        # 予約変更の通知は別スレッドから来るので、配列ではなく集合で受けて step で取り出す
+        self._dirty: Set[str] = set()
+        self._dirty_lock = threading.Lock()
+
+        if hasattr(reservation_repo, "add_listener"):
+            reservation_repo.add_listener(self.mark_dirty)
+
+        self._last_time: Optional[datetime] = None
+
+        # 統計（tick を回すスレッドからしか書かない）
+        self._ticks = 0
+        self._last_tick_sec = 0.0
+        self._max_tick_sec = 0.0
+        self._last_step_sec = 0.0
+        self._last_changed = 0
+        self._total_changed = 0
+        self._total_retargeted = 0
+
+    def _alloc(self, capacity: int) -> None:
+        """
+        配列を capacity 部屋分確保する（既存の値はコピーする）。
+        """
+        old = getattr(self, "_cols", {})
+        cols = {}
+        for name, dtype, fill in self._COLUMNS:
+            cols[name] = np.full(capacity, fill, dtype=dtype)
+            if name in old:
+                cols[name][: self._n] = old[name][: self._n]
+        self._cols = cols
+        self._capacity = capacity
+
+    # --- 部屋の登録 ---
+
+    def add_room(self, room: Room) -> None:
+        """
+        部屋を登録する（登録済みなら判定パラメータ・プロバイダを作り直し、状態は IDLE から）。
+        """
+        provider = self._provider_factory(room)
+        params = {**_DEFAULT_PARAMS, **room.state_params()}
+        with self._lock:
+            i = self._index.get(room.room_id)
+            if i is None:
+                if self._n == self._capacity:
+                    self._alloc(self._capacity * 2)
+                i = self._n
+                self._n += 1
+                self._index[room.room_id] = i
+                self._room_ids.append(room.room_id)
+                self._providers.append(provider)
+                self._reservation_ids.append(None)
+                self._user_ids.append(None)
+            else:
+                self._providers[i] = provider
+            self._set_target(i, None)
+            self._cols["occupied"][i] = False
+            self._cols["alert"][i] = False
+            for name, value in params.items():
+                self._cols[name][i] = int(value) * 1_000_000
+        self.mark_dirty(room.room_id)
+
+    def add_rooms(self, rooms: Iterable[Room]) -> None:
+        for room in rooms:
+            self.add_room(room)
+
+    def remove_room(self, room_id: str) -> bool:
+        """
+        部屋を外す。末尾の部屋をその位置に移して配列を詰める。
+        """
+        with self._lock:
+            i = self._index.pop(room_id, None)
+            if i is None:
+                return False
+            last = self._n - 1
+            if i != last:
+                moved = self._room_ids[last]
+                self._index[moved] = i
+                for seq in (self._room_ids, self._providers, self._reservation_ids, self._user_ids):
+                    seq[i] = seq[last]
+                for arr in self._cols.values():
+                    arr[i] = arr[last]
+            for seq in (self._room_ids, self._providers, self._reservation_ids, self._user_ids):
+                seq.pop()
+            self._n = last
+            return True
+
+    @property
+    def room_ids(self) -> List[str]:
+        return list(self._room_ids)
+
+    def get_manager(self, room_id: str) -> Optional[_RoomView]:
+        return _RoomView(self, room_id) if room_id in self._index else None
+
+    def get_provider(self, room_id: str) -> Optional[OccupancyProvider]:
+        i = self._index.get(room_id)
+        return self._providers[i] if i is not None else None
+
+    def get_params(self, room_id: str) -> dict[str, int]:
+        i = self._index[room_id]
+        return {
+            name: int(self._cols[name][i]) // 1_000_000
+            for name in STATE_PARAM_NAMES
+        }
+
+    def set_params(self, room_id: str, **params: int) -> None:
+        unknown = set(params) - set(STATE_PARAM_NAMES)
+        if unknown:
+            raise ValueError(f"unknown state params: {sorted(unknown)}")
+        with self._lock:
+            i = self._index[room_id]
+            for name, value in params.items():
+                self._cols[name][i] = int(value) * 1_000_000
+
+    # --- 通知 ---
+
+    def mark_dirty(self, room_id: str) -> None:
+        """
+        次の step で room_id の対象予約を読み直させる（予約の作成・キャンセルなど）。
+        """
+        with self._dirty_lock:
+            self._dirty.add(room_id)
+
+    def mark_all_dirty(self) -> None:
+        with self._dirty_lock:
+            self._dirty.update(self._room_ids)
+
+    # --- 実行 ---
+
+    def _set_target(self, i: int, res: Optional[Reservation]) -> None:
+        self._cols["state"][i] = _IDLE
+        if res is None:
+            self._cols["has_res"][i] = False
+            self._cols["res_active"][i] = False
+            self._reservation_ids[i] = None
+            self._user_ids[i] = None
+            return
+        self._cols["has_res"][i] = True
+        self._cols["res_active"][i] = res.status == ReservationStatus.ACTIVE
+        self._cols["start_us"][i] = to_epoch_us(res.start_time)
+        self._cols["end_us"][i] = to_epoch_us(res.end_time)
+        self._reservation_ids[i] = res.reservation_id
+        self._user_ids[i] = res.user_id
+
+    def _retarget(self, i: int, current_time: datetime) -> None:
+        cleanup_sec = int(self._cols["cleanup_margin_sec"][i]) // 1_000_000
+        self._set_target(
+            i, self._target_index.select(self._room_ids[i], current_time, cleanup_sec)
+        )
+
+    def _refresh_dirty(self) -> np.ndarray:
+        """
+        予約変更の通知があった部屋の対象予約を読み直す。
+        対象予約が消えた / CANCELLED / 対象予約がない部屋は取り直しが必要なので、
+        その部屋の index を返す。
+        """
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+
+        need = []
+        for room_id in dirty:
+            i = self._index.get(room_id)
+            if i is None:
+                continue
+            res_id = self._reservation_ids[i]
+            res = (
+                self._reservation_repo.get_reservation_by_id(res_id)
+                if res_id is not None
+                else None
+            )
+            if res is None or res.status == ReservationStatus.CANCELLED:
+                need.append(i)
+            else:
+                self._cols["res_active"][i] = res.status == ReservationStatus.ACTIVE
+        return np.asarray(need, dtype=np.intp)
+
+    def step(self, occupied: np.ndarray, current_time: datetime) -> np.ndarray:
+        """
+        全部屋の状態機械を current_time まで1ステップ進める。
+        occupied は部屋の登録順（room_ids 順）の占有状態。
+        状態・対象予約・アラートのいずれかが変わった部屋の index を返す。
+        """
+        with self._lock:
+            n = self._n
+            occ = np.asarray(occupied, dtype=np.bool_)
+            if occ.shape != (n,):
+                raise ValueError(f"occupied must have shape ({n},), got {occ.shape}")
+            now_us = to_epoch_us(current_time)
+            p = {name: self._cols[name][:n] for name in STATE_PARAM_NAMES}
+            state = self._cols["state"][:n]
+            has_res = self._cols["has_res"][:n]
+            start_us = self._cols["start_us"][:n]
+            end_us = self._cols["end_us"][:n]
+
+            prev_state = state.copy()
+            prev_alert = self._cols["alert"][:n].copy()
+
+            # 1. 対象予約が消えた / CANCELLED / 完全に過去 / 未設定 の部屋だけ取り直す
+            expired = has_res & (now_us > end_us + p["cleanup_margin_sec"])
+            retarget = np.union1d(self._refresh_dirty(), np.flatnonzero(expired))
+            prev_res = {int(i): self._reservation_ids[i] for i in retarget}
+            for i in prev_res:
+                self._retarget(i, current_time)
+            self._total_retargeted += len(retarget)
+
+            # ここから先はベクトル演算（update_state の 2〜4 と同じ順に評価する）
+            started = time.perf_counter()
+            # 2. IDLE -> RESERVED_NOT_USED
+            arrived = now_us >= start_us - p["arrival_window_before_sec"]
+            state[has_res & (state == _IDLE) & arrived] = _RESERVED_NOT_USED
+
+            # 3. RESERVED_NOT_USED -> IN_USE / FINISHED (ノーショー)
+            waiting = has_res & (state == _RESERVED_NOT_USED)
+            check_in = waiting & occ
+            late = waiting & ~occ & (now_us > start_us + p["arrival_window_after_sec"])
+            no_show = late & self._cols["res_active"][:n]
+            state[check_in] = _IN_USE
+            state[late] = _FINISHED
+
+            # 4. IN_USE -> FINISHED (終了 or OVERSTAY)
+            over = has_res & (state == _IN_USE) & (now_us > end_us + p["grace_period_sec"])
+            alert = over & occ
+            finished = over & ~occ
+            state[finished] = _FINISHED
+            self._cols["alert"][:n] = alert
+            self._cols["occupied"][:n] = occ
+
+            changed = np.flatnonzero((state != prev_state) | (alert != prev_alert))
+            self._last_step_sec = time.perf_counter() - started
+
+            # 副作用は状態が変わった部屋だけ Python で実行する
+            for i in np.flatnonzero(check_in):
+                self._reservation_repo.mark_used(self._reservation_ids[i])
+                self._cols["res_active"][i] = False
+                self._log(
+                    i,
+                    f"Check-in detected (res_id={self._reservation_ids[i]}, user={self._user_ids[i]})",
+                )
+            for i in np.flatnonzero(no_show):
+                self._reservation_repo.mark_no_show(self._reservation_ids[i])
+                self._penalty_service.add_penalty(self._user_ids[i], reason="NO_SHOW")
+                self._cols["res_active"][i] = False
+                self._log(
+                    i,
+                    f"No-show detected (res_id={self._reservation_ids[i]}, user={self._user_ids[i]})",
+                )
+            for i in np.flatnonzero(alert & ~prev_alert):
+                self._log(i, f"Overstay detected (res_id={self._reservation_ids[i]})")
+            for i in np.flatnonzero(finished):
+                self._log(i, f"Session finished (res_id={self._reservation_ids[i]})")
+
+            moved = [i for i, res_id in prev_res.items() if self._reservation_ids[i] != res_id]
+            if moved:
+                changed = np.union1d(changed, np.asarray(moved, dtype=np.intp))
+
+            self._last_time = current_time
+            return changed
+
+    def _read_occupancy(self, current_time: datetime) -> np.ndarray:
+        occupied = self._cols["occupied"][: self._n].copy()
+        for i, provider in enumerate(list(self._providers)):
+            try:
+                occupied[i] = provider.get_is_occupied(current_time)
+            except Exception as e:
+                # 取れなかった部屋は前回の占有状態のまま評価する
+                print(f"[BatchStateEngine] occupancy failed (room={self._room_ids[i]}): {e}")
+        return occupied
+
+    def tick(self, current_time: Optional[datetime] = None) -> dict:
+        """
+        全部屋の占有状態を読んで1ステップ進める。戻り値はこの tick の統計。
+        """
+        current_time = current_time or now_jst()
+        started = time.perf_counter()
+        changed = self.step(self._read_occupancy(current_time), current_time)
+        elapsed = time.perf_counter() - started
+
+        self._ticks += 1
+        self._last_tick_sec = elapsed
+        self._max_tick_sec = max(self._max_tick_sec, elapsed)
+        self._last_changed = len(changed)
+        self._total_changed += len(changed)
+        return {"rooms": self._n, "changed": len(changed), "tick_sec": elapsed}
+
+    def run_forever(self, interval_sec: float = 5.0) -> None:
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"[BatchStateEngine] tick failed: {e}")
+            self._stop.wait(max(0.0, interval_sec - (time.monotonic() - started)))
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # --- 参照 ---
+
+    def _status(self, i: int) -> dict:
+        occupied = bool(self._cols["occupied"][i])
+        return {
+            "timestamp": format_jst_iso(self._last_time) if self._last_time else None,
+            "room_id": self._room_ids[i],
+            # Stub: 占有中なら 1, 空なら 0 として人数を入れておく
+            "people_count": 1 if occupied else 0,
+            "is_used": occupied,
+            "room_state": RoomState(int(self._cols["state"][i])).name,
+            "reservation_id": self._reservation_ids[i],
+            "alert": "OVERSTAY" if self._cols["alert"][i] else None,
+        }
+
+    def get_status(self, room_id: str) -> Optional[dict]:
+        i = self._index.get(room_id)
+        return self._status(i) if i is not None else None
+
+    def get_statuses(self, room_ids: Optional[Iterable[str]] = None) -> List[dict]:
+        """
+        指定部屋（None なら全部屋）の最新状態を返す。未登録の room_id は無視する。
+        """
+        if room_ids is None:
+            return [self._status(i) for i in range(self._n)]
+        return [self._status(self._index[r]) for r in room_ids if r in self._index]
+
+    def stats(self) -> dict:
+        return {
+            "rooms": self._n,
+            "ticks": self._ticks,
+            "last_tick_sec": round(self._last_tick_sec, 4),
+            "max_tick_sec": round(self._max_tick_sec, 4),
+            "last_step_sec": round(self._last_step_sec, 6),
+            "last_changed": self._last_changed,
+            "total_changed": self._total_changed,
+            "total_retargeted": self._total_retargeted,
+        }
+
+    def _log(self, i: int, msg: str) -> None:
+        print(f"[BatchStateEngine][{self._room_ids[i]}] {msg}")
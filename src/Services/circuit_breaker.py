@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable
+
+
+class CircuitBreaker:
+    """
+    カメラ取得などの外部呼び出しを守るサーキットブレーカー。
+
+    - CLOSED   : 通常どおり呼び出す。連続 failure_threshold 回失敗したら OPEN へ
+    - OPEN     : reset_timeout_sec の間は呼び出さずに即失敗させる
+    - HALF_OPEN: reset_timeout_sec 経過後、1件だけ試しに通す（プローブ）。
+                 成功すれば CLOSED、失敗すれば再び OPEN
+
+    使い方:
+        if breaker.allow_request():
+            ok = do_call()
+            breaker.record_success() if ok else breaker.record_failure()
+    """
+
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        reset_timeout_sec: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be >= 1")
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_sec = reset_timeout_sec
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+        # 統計
+        self._successes = 0
+        self._failures = 0
+        self._short_circuited = 0
+        self._opens = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        # OPEN のまま reset_timeout_sec が経ったら HALF_OPEN とみなす
+        if (
+            self._state == self.OPEN
+            and self._clock() - self._opened_at >= self.reset_timeout_sec
+        ):
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow_request(self) -> bool:
+        """
+        呼び出してよければ True。False の場合は呼び出さずに失敗扱いにすること。
+        HALF_OPEN では同時に1件（プローブ）だけ True を返す。
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._short_circuited += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._successes += 1
+            self._consecutive_failures = 0
+            self._state = self.CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._consecutive_failures += 1
+            state = self._current_state()
+            if (
+                state == self.HALF_OPEN
+                or self._consecutive_failures >= self.failure_threshold
+            ):
+                if state != self.OPEN:
+                    self._opens += 1
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            state = self._current_state()
+            stats = {
+                "state": state,
+                "consecutive_failures": self._consecutive_failures,
+                "successes": self._successes,
+                "failures": self._failures,
+                "short_circuited": self._short_circuited,
+                "opens": self._opens,
+            }
+            if state == self.OPEN:
+                stats["retry_in_sec"] = round(
+                    max(0.0, self.reset_timeout_sec - (self._clock() - self._opened_at)),
+                    1,
+                )
+            return stats
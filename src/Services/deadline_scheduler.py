@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from time_utils import now_jst, real_seconds_until
+
+
+class DeadlineScheduler:
+    """
+    部屋ごとの「次に遷移が起こりうる時刻」だけ評価するスケジューラ。
+
+    - evaluate(room_id, current_time) で部屋を評価し、次の期限（なければ None）を受け取る
+      （RoomStateManager.update_state + next_deadline を呼ぶ関数を渡す想定）
+    - 期限は min-heap で管理し、一番近い期限まで Condition で眠る
+    - 新しい占有サンプルや予約の変更があったら mark_dirty(room_id) で起こす
+    - 期限がどれだけ先でも max_sleep_sec ごとには全部屋を評価し直す（取りこぼしの保険）
+    """
+
+    def __init__(
+        self,
+        evaluate: Callable[[str, datetime], Optional[datetime]],
+        room_ids: Iterable[str] = (),
+        max_sleep_sec: float = 60.0,
+        clock: Callable[[], datetime] = now_jst,
+    ) -> None:
+        self._evaluate = evaluate
+        self._max_sleep_sec = max_sleep_sec
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._stop = False
+
+        self._room_ids: Set[str] = set(room_ids)
+        # 最初は全部屋を評価して期限を求める
+        self._dirty: Set[str] = set(self._room_ids)
+        # (deadline, seq, room_id)。_deadlines と食い違うエントリは古いので読み飛ばす
+        self._heap: List[tuple] = []
+        self._deadlines: Dict[str, datetime] = {}
+        self._seq = itertools.count()
+
+        # 統計
+        self._evaluations = 0
+        self._deadline_wakeups = 0
+        self._event_wakeups = 0
+        self._timeout_wakeups = 0
+
+    # --- 外部からの通知 ---
+
+    def add_room(self, room_id: str) -> None:
+        with self._cond:
+            self._room_ids.add(room_id)
+            self._dirty.add(room_id)
+            self._cond.notify()
+
+    def mark_dirty(self, room_id: str) -> None:
+        """
+        room_id を次のループで評価させる（占有サンプル・予約変更の通知用）。
+        """
+        with self._cond:
+            if room_id in self._room_ids:
+                self._dirty.add(room_id)
+                self._event_wakeups += 1
+                self._cond.notify()
+
+    def mark_all_dirty(self) -> None:
+        """
+        全部屋を評価し直させる（仮想時計や判定パラメータを変えたとき用）。
+        """
+        with self._cond:
+            self._dirty.update(self._room_ids)
+            self._event_wakeups += 1
+            self._cond.notify()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+
+    # --- 本体 ---
+
+    def _pop_due(self, current_time: datetime) -> Set[str]:
+        due = set(self._dirty)
+        self._dirty.clear()
+        while self._heap and self._heap[0][0] <= current_time:
+            deadline, _, room_id = heapq.heappop(self._heap)
+            if self._deadlines.get(room_id) == deadline:
+                del self._deadlines[room_id]
+                due.add(room_id)
+        return due
+
+    def run_pending(self) -> int:
+        """
+        dirty な部屋と期限を過ぎた部屋を評価し、次の期限を積み直す。評価した部屋数を返す。
+        """
+        current_time = self._clock()
+        with self._cond:
+            due = self._pop_due(current_time)
+
+        deadlines = {}
+        for room_id in due:
+            try:
+                deadlines[room_id] = self._evaluate(room_id, current_time)
+            except Exception as e:
+                print(f"[DeadlineScheduler] evaluate failed (room={room_id}): {e}")
+                deadlines[room_id] = None
+
+        with self._cond:
+            self._evaluations += len(due)
+            for room_id, deadline in deadlines.items():
+                if deadline is None:
+                    self._deadlines.pop(room_id, None)
+                    continue
+                self._deadlines[room_id] = deadline
+                heapq.heappush(self._heap, (deadline, next(self._seq), room_id))
+        return len(due)
+
+    def next_deadline(self) -> Optional[datetime]:
+        with self._cond:
+            return self._next_deadline_locked()
+
+    def _next_deadline_locked(self) -> Optional[datetime]:
+        while self._heap and self._deadlines.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def _wait(self) -> None:
+        """
+        dirty な部屋ができるか、一番近い期限が来るか、max_sleep_sec 経つまで眠る。
+        """
+        with self._cond:
+            if self._dirty or self._stop:
+                return
+            deadline = self._next_deadline_locked()
+            timeout = self._max_sleep_sec
+            if deadline is not None:
+                timeout = min(timeout, max(0.0, real_seconds_until(deadline)))
+            notified = self._cond.wait(timeout)
+            if notified or self._dirty:
+                return
+            if deadline is not None and timeout < self._max_sleep_sec:
+                self._deadline_wakeups += 1
+            else:
+                # 期限がなくても定期的に全部屋を見直す
+                self._timeout_wakeups += 1
+                self._dirty.update(self._room_ids)
+
+    def run_forever(self) -> None:
+        while True:
+            self._wait()
+            with self._cond:
+                if self._stop:
+                    return
+            self.run_pending()
+
+    def stats(self) -> dict:
+        with self._cond:
+            deadline = self._next_deadline_locked()
+            return {
+                "rooms": len(self._room_ids),
+                "evaluations": self._evaluations,
+                "deadline_wakeups": self._deadline_wakeups,
+                "event_wakeups": self._event_wakeups,
+                "timeout_wakeups": self._timeout_wakeups,
+                "scheduled": len(self._deadlines),
+                "next_deadline": deadline.isoformat() if deadline else None,
+            }
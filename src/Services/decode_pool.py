@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import threading
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from typing import Callable, Dict, Set
+
+from Repository.detection_decoder import decode_class_counts
+
+# (device_id, {class_id: count}) を受け取るコールバック
+DecodeCallback = Callable[[str, dict], None]
+
+
+class DecodePool:
+    """
+    推論ペイロード (Base64 + FlatBuffers) のデコードを、ポーリングスレッドから切り離すワーカープール。
+
+    - kind="process" なら ProcessPoolExecutor を使い、GIL の外でデコードする
+    - kind="thread" なら ThreadPoolExecutor（NumPy 部分は GIL を離すので軽い負荷ならこちらで十分）
+    - submit() はキューに積むだけで待たないので、I/O 側のスレッドがデコード待ちになることはない
+    - 同じデバイスのデコードが実行中に新しいペイロードが来たら、古い未着手分は捨てて最新だけを残す
+      （占有判定に必要なのは最新フレームだけなので、遅いデコードで待ち行列が伸び続けないようにする）
+    """
+
+    KINDS = ("thread", "process")
+
+    def __init__(
+        self,
+        workers: int = 2,
+        kind: str = "thread",
+        prefer_area_count: bool = True,
+    ) -> None:
+        if kind not in self.KINDS:
+            raise ValueError(f"kind must be one of {self.KINDS}")
+        self.kind = kind
+        self.workers = workers
+        self._prefer_area_count = prefer_area_count
+        self._executor: Executor = (
+            ProcessPoolExecutor(max_workers=workers)
+            if kind == "process"
+            else ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decode")
+        )
+
+        self._lock = threading.Lock()
+        # デコード実行中の device_id と、その後に実行する最新ペイロード
+        self._in_flight: Set[str] = set()
+        self._pending: Dict[str, tuple[str, DecodeCallback]] = {}
+
+        # 統計
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._superseded = 0
+
+    def submit(self, device_id: str, payload: str, callback: DecodeCallback) -> None:
+        """
+        payload ('O' の Base64 文字列) のデコードを依頼する。結果は callback に渡される。
+        callback はワーカー側の完了通知スレッドから呼ばれる。
+        """
+        with self._lock:
+            self._submitted += 1
+            if device_id in self._in_flight:
+                if device_id in self._pending:
+                    self._superseded += 1
+                self._pending[device_id] = (payload, callback)
+                return
+            self._in_flight.add(device_id)
+        self._start(device_id, payload, callback)
+
+    def _start(self, device_id: str, payload: str, callback: DecodeCallback) -> None:
+        # 完了済み Future への add_done_callback はその場で呼ばれるので、ロックの外で行う
+        future = self._executor.submit(
+            decode_class_counts, payload, self._prefer_area_count
+        )
+        future.add_done_callback(lambda f: self._on_done(device_id, f, callback))
+
+    def _on_done(self, device_id: str, future: Future, callback: DecodeCallback) -> None:
+        try:
+            counts = future.result()
+        except Exception as e:
+            print(f"[DecodePool] decode failed (device={device_id}): {e}")
+            counts = None
+
+        with self._lock:
+            if counts is None:
+                self._failed += 1
+            else:
+                self._completed += 1
+            pending = self._pending.pop(device_id, None)
+            if pending is None:
+                self._in_flight.discard(device_id)
+
+        # 古い結果を先に配ってから次を始める（新しい結果が古い結果で上書きされないように）
+        if counts is not None:
+            callback(device_id, counts)
+        if pending is not None:
+            self._start(device_id, *pending)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "workers": self.workers,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "superseded": self._superseded,
+                "in_flight": len(self._in_flight),
+                "pending": len(self._pending),
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
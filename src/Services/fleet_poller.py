@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+from Repository.ai_camera_repository import AiCameraRepository
+from Services.circuit_breaker import CircuitBreaker
+from Services.decode_pool import DecodePool
+from Services.occupancy_provider import FleetOccupancyProvider
+
+
+class FleetPoller:
+    """
+    複数カメラ (device_id) の推論結果をまとめて取得するポーラー。
+
+    - 1 tick 分の取得をスレッドプールで並行に行うので、
+      tick 全体の所要時間は「各デバイスの合計」ではなく「一番遅いデバイス」程度になる
+    - max_workers で同時リクエスト数を抑える
+    - AiCameraRepository を共有するので、トークンキャッシュとコネクションプールも共有される
+    - 取得結果は device_id ごとに、登録されたプロバイダへ配る
+    - decode_pool を渡した場合、デコードはプール側で行われ、完了した順にプロバイダへ配られる
+    - breaker_factory を渡した場合、デバイスごとにサーキットブレーカーを持ち、
+      ブレーカーが開いているデバイスには問い合わせずに失敗扱いにする
+    """
+
+    def __init__(
+        self,
+        ai_repo: AiCameraRepository,
+        max_workers: int = 8,
+        prefer_area_count: bool = True,
+        decode_pool: Optional[DecodePool] = None,
+        breaker_factory: Optional[Callable[[], CircuitBreaker]] = None,
+    ) -> None:
+        self._repo = ai_repo
+        self._prefer_area_count = prefer_area_count
+        # 指定されていれば、I/O スレッドでは生ペイロードの取得だけを行い、デコードはプールに任せる
+        self._decode_pool = decode_pool
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="fleet-poller"
+        )
+        # device_id -> 配信先プロバイダ
+        self._subscribers: Dict[str, List[FleetOccupancyProvider]] = {}
+        self._breaker_factory = breaker_factory
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+        # 統計
+        self._ticks = 0
+        self._errors = 0
+        self._last_tick_sec = 0.0
+        self._last_sum_fetch_sec = 0.0
+        self._last_fetch_sec: Dict[str, float] = {}
+
+    def register(self, provider: FleetOccupancyProvider) -> None:
+        """
+        provider が見ている全 device_id の結果を provider に配るよう登録する。
+        """
+        with self._lock:
+            for device_id in provider.device_ids:
+                self._subscribers.setdefault(device_id, []).append(provider)
+                if self._breaker_factory is not None and device_id not in self._breakers:
+                    self._breakers[device_id] = self._breaker_factory()
+
+    @property
+    def device_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._subscribers)
+
+    def poll_once(self) -> Dict[str, bool]:
+        """
+        登録済みの全デバイスについて推論結果を並行取得し、プロバイダに配る。
+        戻り値は device_id -> 取得に成功したか。
+        """
+        with self._lock:
+            subscribers = {d: list(ps) for d, ps in self._subscribers.items()}
+
+        started = time.perf_counter()
+        futures = {
+            self._executor.submit(self._fetch, device_id, providers): device_id
+            for device_id, providers in subscribers.items()
+        }
+        wait(futures)
+
+        results: Dict[str, bool] = {}
+        fetch_secs: Dict[str, float] = {}
+        for future, device_id in futures.items():
+            ok, elapsed = future.result()
+            results[device_id] = ok
+            fetch_secs[device_id] = elapsed
+
+        with self._lock:
+            self._ticks += 1
+            self._errors += sum(1 for ok in results.values() if not ok)
+            self._last_tick_sec = time.perf_counter() - started
+            self._last_sum_fetch_sec = sum(fetch_secs.values())
+            self._last_fetch_sec = fetch_secs
+        return results
+
+    def _fetch(
+        self, device_id: str, providers: List[FleetOccupancyProvider]
+    ) -> tuple[bool, float]:
+        started = time.perf_counter()
+        breaker = self._breakers.get(device_id)
+        if breaker is not None and not breaker.allow_request():
+            # ブレーカーが開いている間は待たずに失敗扱い（プロバイダ側で前回値を使う）
+            self._deliver(providers, device_id, None)
+            return False, time.perf_counter() - started
+
+        try:
+            if self._decode_pool is not None:
+                payloads = self._repo.fetch_new_payloads(device_id)
+                if payloads:
+                    # 最新フレームだけデコードに回し、ここでは待たない
+                    self._decode_pool.submit(
+                        device_id,
+                        payloads[-1],
+                        lambda d, counts: self._deliver(providers, d, counts),
+                    )
+                ok = payloads is not None
+            else:
+                counts = self._repo.fetch_class_counts(
+                    device_id, prefer_area_count=self._prefer_area_count
+                )
+                ok = counts is not None
+        except Exception as e:
+            print(f"[FleetPoller] fetch failed (device={device_id}): {e}")
+            ok = False
+
+        if breaker is not None:
+            if ok:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+        if not ok:
+            self._deliver(providers, device_id, None)
+        elif self._decode_pool is None:
+            self._deliver(providers, device_id, counts)
+        return ok, time.perf_counter() - started
+
+    @staticmethod
+    def _deliver(
+        providers: List[FleetOccupancyProvider],
+        device_id: str,
+        counts: Optional[dict],
+    ) -> None:
+        for provider in providers:
+            provider.on_class_counts(device_id, counts)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "devices": len(self._subscribers),
+                "ticks": self._ticks,
+                "errors": self._errors,
+                "last_tick_sec": round(self._last_tick_sec, 4),
+                # 逐次取得していた場合にかかっていたはずの時間
+                "last_sum_fetch_sec": round(self._last_sum_fetch_sec, 4),
+                "last_fetch_sec": {
+                    d: round(t, 4) for d, t in self._last_fetch_sec.items()
+                },
+            }
+            breakers = dict(self._breakers)
+        if breakers:
+            stats["breakers"] = {d: b.stats() for d, b in breakers.items()}
+        if self._decode_pool is not None:
+            stats["decode_pool"] = self._decode_pool.stats()
+        return stats
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from Domain.room import Room
+from Services.occupancy_provider import OccupancyProvider
+from Services.penalty_service import PenaltyService
+from Services.room_state_manager import RoomStateManager
+from time_utils import format_jst_iso, now_jst
+
+
+class _RoomSlot:
+    """
+    エンジン内での部屋1つ分の状態。書き込むのは担当シャードのワーカーだけ
+    （dirty だけは予約変更の通知スレッドからも立てる）。
+    """
+
+    __slots__ = ("room", "manager", "provider", "last_occupied", "deadline", "dirty", "status")
+
+    def __init__(self, room: Room, manager: RoomStateManager, provider: OccupancyProvider):
+        self.room = room
+        self.manager = manager
+        self.provider = provider
+        self.last_occupied: Optional[bool] = None
+        self.deadline: Optional[datetime] = None
+        self.dirty = True
+        self.status: dict = {
+            "timestamp": None,
+            "room_id": room.room_id,
+            "room_state": "IDLE",
+            "people_count": 0,
+            "is_used": False,
+            "reservation_id": None,
+            "alert": None,
+        }
+
+
+class _Shard:
+    def __init__(self) -> None:
+        self.slots: Dict[str, _RoomSlot] = {}
+        self.lock = threading.Lock()
+
+    def run(self, current_time: datetime) -> tuple[int, int]:
+        """
+        担当する全部屋の占有状態を確認し、評価が必要な部屋だけ update_state する。
+        戻り値は (確認した部屋数, 評価した部屋数)。
+        """
+        with self.lock:
+            slots = list(self.slots.values())
+
+        evaluated = 0
+        for slot in slots:
+            try:
+                is_occupied = slot.provider.get_is_occupied(current_time)
+                # 占有状態が変わらず、期限も来ておらず、予約変更もなければ評価しない
+                if (
+                    not slot.dirty
+                    and is_occupied == slot.last_occupied
+                    and (slot.deadline is None or current_time < slot.deadline)
+                ):
+                    continue
+                slot.dirty = False
+                slot.last_occupied = is_occupied
+
+                state_info = slot.manager.update_state(is_occupied, current_time)
+                slot.deadline = slot.manager.next_deadline(current_time)
+                slot.status = {
+                    "timestamp": format_jst_iso(current_time),
+                    "room_id": slot.room.room_id,
+                    # Stub: 占有中なら 1, 空なら 0 として人数を入れておく
+                    "people_count": 1 if is_occupied else 0,
+                    "is_used": is_occupied,
+                    "room_state": state_info["state"],
+                    "reservation_id": state_info["reservation_id"],
+                    "alert": state_info["alert"],
+                }
+                evaluated += 1
+            except Exception as e:
+                print(f"[MonitoringEngine] evaluate failed (room={slot.room.room_id}): {e}")
+        return len(slots), evaluated
+
+
+class MonitoringEngine:
+    """
+    多数の部屋の RoomStateManager をまとめて駆動する監視エンジン。
+
+    - 部屋は room_id のハッシュで workers 個のシャードに振り分け、tick ごとに各シャードを
+      ワーカープールで並行に処理する（1部屋はいつも同じシャード = 同じワーカーが触る）
+    - 各 tick で全部屋の占有状態（通信しないプロバイダ前提）を確認するが、update_state を
+      呼ぶのは「占有状態が変わった / 遷移期限が来た / 予約が変わった」部屋だけ。
+      tick の所要時間は部屋数ではなく、その tick で起きたイベント数でほぼ決まる
+    - 予約変更は reservation_repo.add_listener 経由で mark_dirty が呼ばれる
+    """
+
+    def __init__(
+        self,
+        reservation_repo: Any,
+        penalty_service: PenaltyService,
+        provider_factory: Callable[[Room], OccupancyProvider],
+        workers: int = 4,
+    ) -> None:
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        self._reservation_repo = reservation_repo
+        self._penalty_service = penalty_service
+        self._provider_factory = provider_factory
+        self._shards = [_Shard() for _ in range(workers)]
+        self._slots: Dict[str, _RoomSlot] = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="monitoring-engine"
+        )
+        self._stop = threading.Event()
+
+        if hasattr(reservation_repo, "add_listener"):
+            reservation_repo.add_listener(self.mark_dirty)
+
+        # 統計（tick を回すスレッドからしか書かない）
+        self._ticks = 0
+        self._last_tick_sec = 0.0
+        self._max_tick_sec = 0.0
+        self._last_evaluated = 0
+        self._total_evaluated = 0
+
+    # --- 部屋の登録 ---
+
+    def _shard_for(self, room_id: str) -> _Shard:
+        return self._shards[zlib.crc32(room_id.encode()) % len(self._shards)]
+
+    def add_room(self, room: Room) -> None:
+        """
+        部屋を登録する（登録済みなら判定パラメータ・プロバイダを作り直す）。
+        """
+        manager = RoomStateManager(
+            room_id=room.room_id,
+            reservation_repo=self._reservation_repo,
+            penalty_service=self._penalty_service,
+        )
+        for name, value in room.state_params().items():
+            setattr(manager, name, value)
+        slot = _RoomSlot(room, manager, self._provider_factory(room))
+
+        shard = self._shard_for(room.room_id)
+        with shard.lock:
+            shard.slots[room.room_id] = slot
+        self._slots[room.room_id] = slot
+
+    def add_rooms(self, rooms: Iterable[Room]) -> None:
+        for room in rooms:
+            self.add_room(room)
+
+    def remove_room(self, room_id: str) -> bool:
+        shard = self._shard_for(room_id)
+        with shard.lock:
+            shard.slots.pop(room_id, None)
+        return self._slots.pop(room_id, None) is not None
+
+    @property
+    def room_ids(self) -> List[str]:
+        return list(self._slots)
+
+    def get_manager(self, room_id: str) -> Optional[RoomStateManager]:
+        slot = self._slots.get(room_id)
+        return slot.manager if slot is not None else None
+
+    def get_provider(self, room_id: str) -> Optional[OccupancyProvider]:
+        slot = self._slots.get(room_id)
+        return slot.provider if slot is not None else None
+
+    # --- 通知 ---
+
+    def mark_dirty(self, room_id: str) -> None:
+        """
+        次の tick で room_id を必ず評価させる（予約変更・判定パラメータ変更など）。
+        """
+        slot = self._slots.get(room_id)
+        if slot is not None:
+            slot.dirty = True
+
+    def mark_all_dirty(self) -> None:
+        for slot in list(self._slots.values()):
+            slot.dirty = True
+
+    # --- 実行 ---
+
+    def tick(self, current_time: Optional[datetime] = None) -> dict:
+        """
+        全シャードを1回ずつ並行に処理する。戻り値はこの tick の統計。
+        """
+        current_time = current_time or now_jst()
+        started = time.perf_counter()
+        results = list(
+            self._executor.map(lambda shard: shard.run(current_time), self._shards)
+        )
+        elapsed = time.perf_counter() - started
+
+        checked = sum(c for c, _ in results)
+        evaluated = sum(e for _, e in results)
+        self._ticks += 1
+        self._last_tick_sec = elapsed
+        self._max_tick_sec = max(self._max_tick_sec, elapsed)
+        self._last_evaluated = evaluated
+        self._total_evaluated += evaluated
+        return {"rooms": checked, "evaluated": evaluated, "tick_sec": elapsed}
+
+    def run_forever(self, interval_sec: float = 5.0) -> None:
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"[MonitoringEngine] tick failed: {e}")
+            self._stop.wait(max(0.0, interval_sec - (time.monotonic() - started)))
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._executor.shutdown(wait=False)
+
+    # --- 参照 ---
+
+    def get_status(self, room_id: str) -> Optional[dict]:
+        slot = self._slots.get(room_id)
+        return slot.status if slot is not None else None
+
+    def get_statuses(self, room_ids: Optional[Iterable[str]] = None) -> List[dict]:
+        """
+        指定部屋（None なら全部屋）の最新状態を返す。未登録の room_id は無視する。
+        """
+        if room_ids is None:
+            return [slot.status for slot in list(self._slots.values())]
+        return [
+            self._slots[r].status for r in room_ids if r in self._slots
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "rooms": len(self._slots),
+            "shards": [len(shard.slots) for shard in self._shards],
+            "ticks": self._ticks,
+            "last_tick_sec": round(self._last_tick_sec, 4),
+            "max_tick_sec": round(self._max_tick_sec, 4),
+            "last_evaluated": self._last_evaluated,
+            "total_evaluated": self._total_evaluated,
+        }
@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from Services.fleet_poller import FleetPoller
+from Services.occupancy_provider import OccupancyProvider
+from time_utils import now_jst, real_seconds_until
+
+
+@dataclass(frozen=True)
+class OccupancySample:
+    """
+    フェッチャーが取得した占有状態1件。
+    """
+
+    is_occupied: bool
+    people_count: Optional[int]
+    # 取得した時点の時刻（仮想時計を含む now_jst）
+    timestamp: datetime
+    # 取得にかかった秒数
+    fetch_sec: float
+    # 鮮度判定用の単調時計
+    captured_at: float
+
+
+class LatestValueChannel:
+    """
+    最新値優先の有界チャネル。
+
+    - publish は決してブロックしない。容量 (maxsize) を超えたら一番古いサンプルを捨てる
+    - latest() は消費せずに最新のサンプルを返す（評価側はいつでも最新値だけを見ればよい）
+    - subscribe(callback) で、publish のたびに callback(sample) を呼ばせられる（評価側を起こす用）
+    - 統計:
+      - dropped    : 一度も読まれずに捨てられたサンプル数（評価側が取得側より遅い = 背圧）
+      - overwrites : 未読のサンプルがある状態で publish された回数
+      - repeats    : 前回と同じサンプルを読んだ回数（取得側が評価側より遅い）
+    """
+
+    def __init__(self, maxsize: int = 1) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        self._buffer: deque = deque(maxlen=maxsize)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._read_seq = 0
+        self._subscribers: list = []
+
+        # 統計
+        self._published = 0
+        self._dropped = 0
+        self._overwrites = 0
+        self._reads = 0
+        self._repeats = 0
+        self._empty_reads = 0
+
+    def publish(self, sample: OccupancySample) -> None:
+        with self._lock:
+            self._published += 1
+            self._seq += 1
+            if self._seq - 1 > self._read_seq:
+                self._overwrites += 1
+            if len(self._buffer) == self._buffer.maxlen:
+                _, oldest = self._buffer[0]
+                if oldest > self._read_seq:
+                    self._dropped += 1
+            self._buffer.append((sample, self._seq))
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(sample)
+
+    def subscribe(self, callback: Callable[[OccupancySample], None]) -> None:
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def latest(self) -> Optional[OccupancySample]:
+        with self._lock:
+            self._reads += 1
+            if not self._buffer:
+                self._empty_reads += 1
+                return None
+            sample, seq = self._buffer[-1]
+            if seq == self._read_seq:
+                self._repeats += 1
+            self._read_seq = seq
+            return sample
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "maxsize": self._buffer.maxlen,
+                "buffered": len(self._buffer),
+                "published": self._published,
+                "dropped": self._dropped,
+                "overwrites": self._overwrites,
+                "reads": self._reads,
+                "repeats": self._repeats,
+                "empty_reads": self._empty_reads,
+            }
+
+
+class OccupancyFetcher:
+    """
+    占有状態の取得を評価ループから切り離して、専用スレッドで回すフェッチャー。
+
+    - interval_sec ごとに provider から占有状態を取り、channel に publish する
+    - poller を渡した場合は、取得前に poller.poll_once() で全カメラ分を取りに行く
+    - 取得が interval_sec より遅い場合は、待たずに次の取得を始める
+    - next_interval を渡した場合は、取得のたびに next_interval(取得時刻) で次の間隔を決める
+      （AdaptivePollingPolicy.next_interval など。秒数は仮想時計基準）
+    - wake() で待ちを打ち切って、すぐに次の取得を始めさせられる
+    - next_fetch_at() で次の取得予定（clock の時刻）を返す（ChannelOccupancyProvider の鮮度判定用）
+    """
+
+    def __init__(
+        self,
+        provider: OccupancyProvider,
+        channel: LatestValueChannel,
+        interval_sec: float = 5.0,
+        poller: Optional[FleetPoller] = None,
+        next_interval: Optional[Callable[[datetime], float]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.provider = provider
+        self.channel = channel
+        self.interval_sec = interval_sec
+        self._poller = poller
+        self._next_interval = next_interval
+        self._clock = clock
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # 次の取得予定（clock の時刻）。待ちに入るまでは None
+        self._next_fetch_at: Optional[float] = None
+
+        # 統計（このスレッドからしか書かないのでロックは不要）
+        self._fetches = 0
+        self._errors = 0
+        self._last_fetch_sec = 0.0
+        self._max_fetch_sec = 0.0
+        self._overruns = 0
+
+    def start(self) -> "OccupancyFetcher":
+        self._thread = threading.Thread(
+            target=self._run, name="occupancy-fetcher", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def fetch_once(self) -> Optional[OccupancySample]:
+        """
+        1回取得して publish する。取得中に例外が出た場合は何も publish せず None を返す。
+        """
+        started = self._clock()
+        try:
+            if self._poller is not None:
+                self._poller.poll_once()
+            current_time = now_jst()
+            # 人数が取れるプロバイダなら、1回の取得で人数と占有状態の両方を得る
+            get_count = getattr(self.provider, "get_people_count", None)
+            if get_count is not None:
+                people_count = get_count()
+                is_occupied = (people_count or 0) > 0
+            else:
+                people_count = None
+                is_occupied = self.provider.get_is_occupied(current_time)
+        except Exception as e:
+            print(f"[OccupancyFetcher] fetch failed: {e}")
+            self._errors += 1
+            return None
+
+        fetch_sec = self._clock() - started
+        sample = OccupancySample(
+            is_occupied=is_occupied,
+            people_count=people_count,
+            timestamp=current_time,
+            fetch_sec=fetch_sec,
+            captured_at=self._clock(),
+        )
+        self.channel.publish(sample)
+        self._fetches += 1
+        self._last_fetch_sec = fetch_sec
+        self._max_fetch_sec = max(self._max_fetch_sec, fetch_sec)
+        return sample
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def next_fetch_at(self) -> Optional[float]:
+        """
+        次に取得する予定の時刻（clock の値）。バックオフ中はこれが先に延びる。
+        """
+        return self._next_fetch_at
+
+    def _wait_sec(self, fetched_at: datetime, elapsed: float) -> float:
+        """
+        次の取得まで実時間で何秒待つか。
+        """
+        if self._next_interval is None:
+            remaining = self.interval_sec - elapsed
+        else:
+            # 仮想時計が倍速で動いていても、仮想時刻で next_interval 秒後に起きる
+            remaining = real_seconds_until(
+                fetched_at + timedelta(seconds=self._next_interval(fetched_at))
+            )
+        if remaining < 0:
+            self._overruns += 1
+        return max(0.0, remaining)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            started = self._clock()
+            fetched_at = now_jst()
+            self.fetch_once()
+            elapsed = self._clock() - started
+            wait = self._wait_sec(fetched_at, elapsed)
+            self._next_fetch_at = self._clock() + wait
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def stats(self) -> dict:
+        stats = {
+            "fetches": self._fetches,
+            "errors": self._errors,
+            "overruns": self._overruns,
+            "last_fetch_sec": round(self._last_fetch_sec, 4),
+            "max_fetch_sec": round(self._max_fetch_sec, 4),
+            "next_fetch_in_sec": (
+                round(self._next_fetch_at - self._clock(), 1)
+                if self._next_fetch_at is not None
+                else None
+            ),
+            "channel": self.channel.stats(),
+        }
+        if hasattr(self.provider, "stats"):
+            stats["provider"] = self.provider.stats()
+        return stats
+
+
+class ChannelOccupancyProvider(OccupancyProvider):
+    """
+    LatestValueChannel の最新サンプルで占有状態を返すプロバイダ。通信はしない。
+
+    サンプルが一度も届いていない、または max_sample_age_sec より古い場合は
+    stale_default を返す（フェッチャーがハングしていても評価ループは止まらない）。
+
+    next_fetch_at（OccupancyFetcher.next_fetch_at など）を渡した場合は、
+    次の取得予定を max_sample_age_sec 過ぎても新しいサンプルが来ないときに古いとみなす。
+    バックオフで取得間隔が延びている間は、最後のサンプルをそのまま使う。
+    """
+
+    def __init__(
+        self,
+        channel: LatestValueChannel,
+        max_sample_age_sec: float = 60.0,
+        stale_default: bool = False,
+        clock: Callable[[], float] = time.monotonic,
+        next_fetch_at: Optional[Callable[[], Optional[float]]] = None,
+    ) -> None:
+        self._channel = channel
+        self._max_sample_age_sec = max_sample_age_sec
+        self._stale_default = stale_default
+        self._clock = clock
+        self._next_fetch_at = next_fetch_at
+        self.stale_samples = 0
+
+    def latest_sample(self) -> Optional[OccupancySample]:
+        sample = self._channel.latest()
+        if sample is None:
+            return None
+        deadline = sample.captured_at + self._max_sample_age_sec
+        if self._next_fetch_at is not None:
+            next_fetch = self._next_fetch_at()
+            # このサンプルの後に決まった予定だけを見る（publish 直後はまだ前回の予定が残っている）
+            if next_fetch is not None and next_fetch > sample.captured_at:
+                deadline = max(deadline, next_fetch + self._max_sample_age_sec)
+        if self._clock() > deadline:
+            self.stale_samples += 1
+            return None
+        return sample
+
+    def get_is_occupied(self, current_time: datetime) -> bool:
+        sample = self.latest_sample()
+        return sample.is_occupied if sample is not None else self._stale_default
@@ -1,9 +1,24 @@
 from __future__ import annotations
 
+import threading
+import time
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import Protocol
+from typing import Callable, Iterable, Optional
 from Repository.ai_camera_repository import AiCameraRepository
+from Repository.detection_decoder import count_classes
+from Repository.inference_log import InferenceLogReader, InferenceRecord
+from Services.circuit_breaker import CircuitBreaker
+
+
+def count_persons(counts: dict, person_class_ids: Optional[frozenset] = None) -> int:
+    """
+    {class_id: count} から「人」とみなすオブジェクト数を数える。
+    person_class_ids が None なら全クラスを数える。
+    """
+    if person_class_ids is None:
+        return sum(counts.values())
+    return sum(n for c, n in counts.items() if c in person_class_ids)
 
 
 class OccupancyProvider(ABC):
@@ -22,34 +37,282 @@ class OccupancyProvider(ABC):
 class CameraOccupancyProvider(OccupancyProvider):
     """
     実機AIカメラの推論結果から占有状態を判定するプロバイダ。
+
+    count_mode:
+    - "area_count": ペイロードの AreaCount ベクタ (CountData) からクラス別人数を読む。
+                    AreaCount が付いていないペイロードでは検出リストをデコードして数える。
+    - "bbox"      : 従来どおり検出リストを全件デコードした dict から数える。
+    person_class_ids を指定した場合は、そのクラスだけを「人」として数える（None なら全クラス）。
     """
 
-    def __init__(self, ai_repo: AiCameraRepository):
+    COUNT_MODES = ("area_count", "bbox")
+
+    def __init__(
+        self,
+        ai_repo: AiCameraRepository,
+        count_mode: str = "area_count",
+        person_class_ids: Optional[Iterable[int]] = None,
+    ):
+        if count_mode not in self.COUNT_MODES:
+            raise ValueError(f"count_mode must be one of {self.COUNT_MODES}")
         self._repo = ai_repo
+        self._count_mode = count_mode
+        self._person_class_ids = (
+            frozenset(person_class_ids) if person_class_ids is not None else None
+        )
 
     def get_is_occupied(self, current_time: datetime) -> bool:
         """
-        - ai_repo.fetch_inference_result() 等を呼び、
+        - ai_repo から最新の推論結果を取り、
         - 推論結果から「人が1人以上いるか」を判定して True/False を返す。
+        取得に失敗した場合は未使用 (False) とみなす。
         """
-        # ここは実装時に詰めるが、イメージとしては：
-        result = self._repo.fetch_inference_result()
-        if not result:
-            return False
+        return (self.get_people_count() or 0) > 0
 
-        # 例えば "person" クラスの検出数を数える等
-        # len(result) や特定キーを見る形でもよい
-        detected_count = self._count_person_objects(result)
-        return detected_count > 0
+    def get_people_count(self) -> Optional[int]:
+        """
+        最新の推論結果から「人」とみなすオブジェクト数を返す。
+        取得に失敗した場合は None（0人と区別するため）。
+        """
+        if self._count_mode == "area_count":
+            counts = self._repo.fetch_class_counts(prefer_area_count=True)
+            if counts is None:
+                return None
+            return count_persons(counts, self._person_class_ids)
+
+        result = self._repo.fetch_inference_result()
+        if "message" in result:
+            return None
+        return self._count_person_objects(result)
 
     def _count_person_objects(self, result: dict) -> int:
         """
-        推論結果から「人」とみなすオブジェクト数を数えるヘルパー。
-        実際にはクラスIDやラベルに応じて調整する。
+        推論結果 dict から「人」とみなすオブジェクト数を数えるヘルパー。
+        """
+        return sum(
+            1
+            for k, v in result.items()
+            if k.isdigit()
+            and (self._person_class_ids is None or v["C"] in self._person_class_ids)
+        )
+
+
+class ResilientOccupancyProvider(OccupancyProvider):
+    """
+    CameraOccupancyProvider をサーキットブレーカーで包み、障害時は最後に取れた値で代替するプロバイダ。
+
+    - 取得失敗（None または例外）が続くとブレーカーが開き、以後はカメラに問い合わせずに即座に返す
+      （監視ループの tick がタイムアウト待ちで伸びないように）
+    - ブレーカーが開いている間・取得に失敗したときは、最後に取れた人数が
+      max_stale_sec 以内のものならそれを使う
+    - それより古い（または一度も取れていない）場合は stale_default を返す
+    """
+
+    def __init__(
+        self,
+        provider: CameraOccupancyProvider,
+        breaker: Optional[CircuitBreaker] = None,
+        max_stale_sec: float = 60.0,
+        stale_default: bool = False,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._provider = provider
+        self.breaker = breaker or CircuitBreaker()
+        self._max_stale_sec = max_stale_sec
+        self._stale_default = stale_default
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        self._last_count: Optional[int] = None
+        self._last_success_at: Optional[float] = None
+
+        # 統計
+        self._fresh = 0
+        self._fallback_stale = 0
+        self._fallback_default = 0
+
+    def get_is_occupied(self, current_time: datetime) -> bool:
+        count = self.get_people_count()
+        return count > 0 if count is not None else self._stale_default
+
+    def get_people_count(self) -> Optional[int]:
+        """
+        新しく取れた人数、または staleness 予算内の前回値を返す。どちらもなければ None。
         """
-        # 今は「とりあえず全部のオブジェクト数を数える」でスタブしておいても良い
-        # 後で class_id を見て精緻化する。
-        return sum(1 for k in result.keys() if k.isdigit())
+        if self.breaker.allow_request():
+            try:
+                count = self._provider.get_people_count()
+            except Exception as e:
+                print(f"[ResilientOccupancyProvider] fetch failed: {e}")
+                count = None
+
+            if count is not None:
+                self.breaker.record_success()
+                with self._lock:
+                    self._last_count = count
+                    self._last_success_at = self._clock()
+                    self._fresh += 1
+                return count
+            self.breaker.record_failure()
+
+        with self._lock:
+            if (
+                self._last_success_at is not None
+                and self._clock() - self._last_success_at <= self._max_stale_sec
+            ):
+                self._fallback_stale += 1
+                return self._last_count
+            self._fallback_default += 1
+            return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            age = (
+                round(self._clock() - self._last_success_at, 1)
+                if self._last_success_at is not None
+                else None
+            )
+            stats = {
+                "fresh": self._fresh,
+                "fallback_stale": self._fallback_stale,
+                "fallback_default": self._fallback_default,
+                "last_count": self._last_count,
+                "last_success_age_sec": age,
+                "max_stale_sec": self._max_stale_sec,
+            }
+        stats["breaker"] = self.breaker.stats()
+        return stats
+
+
+class FleetOccupancyProvider(OccupancyProvider):
+    """
+    FleetPoller から配られたクラス別人数で占有状態を判定するプロバイダ。
+
+    - 1部屋に複数カメラがある場合は、どれか1台でも人を検出していれば占有とみなす
+    - get_is_occupied 自体は通信せず、最後に配られた値を見るだけ
+    - max_stale_sec を指定すると、取得に失敗したデバイスは最後に取れた値を
+      その秒数までは使い続ける（None なら失敗した時点で未検出扱い）
+    """
+
+    def __init__(
+        self,
+        device_ids: Iterable[str],
+        person_class_ids: Optional[Iterable[int]] = None,
+        max_stale_sec: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.device_ids = tuple(device_ids)
+        self._person_class_ids = (
+            frozenset(person_class_ids) if person_class_ids is not None else None
+        )
+        self._max_stale_sec = max_stale_sec
+        self._clock = clock
+        self._counts: dict[str, dict] = {d: {} for d in self.device_ids}
+        self._updated_at: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        # 統計
+        self._fallback_stale = 0
+        self._fallback_default = 0
+
+    def on_class_counts(self, device_id: str, counts: Optional[dict]) -> None:
+        """
+        FleetPoller から呼ばれる。取得に失敗した (counts=None) デバイスは、
+        staleness 予算内なら前回値を残し、そうでなければ未検出扱いにする。
+        """
+        with self._lock:
+            if counts is not None:
+                self._counts[device_id] = counts
+                self._updated_at[device_id] = self._clock()
+                return
+
+            updated_at = self._updated_at.get(device_id)
+            if (
+                self._max_stale_sec is not None
+                and updated_at is not None
+                and self._clock() - updated_at <= self._max_stale_sec
+            ):
+                self._fallback_stale += 1
+                return
+            self._fallback_default += 1
+            self._counts[device_id] = {}
+
+    def get_people_count(self) -> int:
+        with self._lock:
+            return sum(
+                count_persons(c, self._person_class_ids) for c in self._counts.values()
+            )
+
+    def get_is_occupied(self, current_time: datetime) -> bool:
+        return self.get_people_count() > 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = self._clock()
+            return {
+                "fallback_stale": self._fallback_stale,
+                "fallback_default": self._fallback_default,
+                "max_stale_sec": self._max_stale_sec,
+                "age_sec": {
+                    d: round(now - t, 1) for d, t in self._updated_at.items()
+                },
+            }
+
+
+class ReplayOccupancyProvider(OccupancyProvider):
+    """
+    InferenceLogWriter で記録したログを再生するプロバイダ。
+
+    get_is_occupied(current_time) のたびに、current_time までに記録されたレコードを
+    ログから遅延で読み進め、各デバイスの最新フレームで占有状態を判定する。
+    時刻は呼び出し側（Services.replay.replay_inference_log など）が進める。
+    """
+
+    def __init__(
+        self,
+        reader: InferenceLogReader,
+        device_ids: Optional[Iterable[str]] = None,
+        person_class_ids: Optional[Iterable[int]] = None,
+        prefer_area_count: bool = True,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ):
+        self._records = reader.iter_records(
+            since=since,
+            until=until,
+            device_ids=set(device_ids) if device_ids is not None else None,
+        )
+        self._person_class_ids = (
+            frozenset(person_class_ids) if person_class_ids is not None else None
+        )
+        self._prefer_area_count = prefer_area_count
+        self._next: Optional[InferenceRecord] = next(self._records, None)
+        self._counts: dict[str, dict] = {}
+        self.records_replayed = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self._next is None
+
+    def next_timestamp(self) -> Optional[datetime]:
+        """
+        次に再生されるレコードの時刻。ログを読み切っていれば None。
+        """
+        return self._next.timestamp if self._next is not None else None
+
+    def get_is_occupied(self, current_time: datetime) -> bool:
+        while self._next is not None and self._next.timestamp <= current_time:
+            record = self._next
+            self._counts[record.device_id] = count_classes(
+                record.payload, self._prefer_area_count
+            )
+            self.records_replayed += 1
+            self._next = next(self._records, None)
+
+        return (
+            sum(count_persons(c, self._person_class_ids) for c in self._counts.values())
+            > 0
+        )
 
 
 class DummyOccupancyProvider(OccupancyProvider):
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from Services.occupancy_provider import ReplayOccupancyProvider
+from Services.room_state_manager import RoomStateManager
+from time_utils import clear_simulated_time, format_jst_iso, now_jst, set_simulated_time
+
+
+def replay_inference_log(
+    provider: ReplayOccupancyProvider,
+    room_manager: RoomStateManager,
+    speed: Optional[float] = None,
+    tick_sec: float = 5.0,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> List[dict]:
+    """
+    記録済みの推論ログを RoomStateManager.update_state に流し直し、状態遷移の一覧を返す。
+
+    - 仮想時計 (time_utils) を最初のレコード時刻（または start）に合わせてから再生するので、
+      PenaltyService など now_jst() を使う処理も記録当時の時刻で動く
+    - speed を指定すると、その倍速で実時間に沿って tick_sec ごとに評価する
+    - speed=None なら待ち時間なしで、仮想時刻を tick_sec ずつ進めながら最速で再生する
+    - end を指定しない場合は、ログを読み切った時点で終了する
+    - 終了時に仮想時計は解除される
+
+    予約・ペナルティのリポジトリは room_manager のものがそのまま更新されるので、
+    本番の DB ではなく再現用のコピーを使うこと。
+    """
+    if speed is not None and speed <= 0:
+        raise ValueError("speed must be positive")
+
+    sim_time = start or provider.next_timestamp()
+    if sim_time is None:
+        return []
+
+    transitions: List[dict] = []
+    last: Optional[tuple] = None
+    tick = timedelta(seconds=tick_sec)
+
+    set_simulated_time(sim_time, scale=speed or 1.0)
+    try:
+        while True:
+            if speed is not None:
+                current_time = now_jst()
+            else:
+                set_simulated_time(sim_time)
+                current_time = sim_time
+
+            if end is not None and current_time >= end:
+                break
+            if end is None and provider.exhausted:
+                break
+
+            is_occupied = provider.get_is_occupied(current_time)
+            state_info = room_manager.update_state(is_occupied, current_time)
+
+            key = (state_info["state"], state_info["reservation_id"], state_info["alert"])
+            if key != last:
+                transitions.append(
+                    {
+                        "timestamp": format_jst_iso(current_time),
+                        "is_occupied": is_occupied,
+                        "room_state": state_info["state"],
+                        "reservation_id": state_info["reservation_id"],
+                        "alert": state_info["alert"],
+                    }
+                )
+                last = key
+
+            if speed is not None:
+                time.sleep(tick_sec / speed)
+            else:
+                sim_time = sim_time + tick
+    finally:
+        clear_simulated_time()
+
+    return transitions
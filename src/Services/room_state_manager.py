@@ -1,10 +1,11 @@
 from datetime import datetime, timedelta
 from enum import Enum, auto
-from typing import Optional
+from typing import Callable, Iterable, List, Optional
 
 from Domain.reservation import Reservation, ReservationStatus
 from typing import Any
 from Services.penalty_service import PenaltyService
+from Services.target_index import TargetReservationIndex
 
 
 class RoomState(Enum):
@@ -14,26 +15,80 @@ class RoomState(Enum):
     FINISHED = auto()  # 対象予約のセッション終了（ノーショー含む）
 
 
+def select_target_reservation(
+    reservations: Iterable[Reservation], now: datetime, cleanup_margin_sec: int
+) -> Optional[Reservation]:
+    """
+    部屋の予約一覧から、現在時刻 now に対して「追いかけるべき予約」を1件選ぶ。
+    対象予約選びの規則の定義（実際の選択は TargetReservationIndex が同じ規則で行う）。
+
+    - CANCELLED は無視
+    - end_time + cleanup_margin を過ぎたものは「過去扱い」で無視
+    - 残りから start_time が最も早いものを採用
+    """
+    candidates = []
+    cleanup_margin = timedelta(seconds=cleanup_margin_sec)
+
+    for res in reservations:
+        if res.status == ReservationStatus.CANCELLED:
+            continue
+        if res.end_time + cleanup_margin < now:
+            # 完全に過去の予約
+            continue
+        candidates.append(res)
+
+    if not candidates:
+        return None
+
+    candidates.sort(key=lambda r: r.start_time)
+    return candidates[0]
+
+
 class RoomStateManager:
     def __init__(
         self,
         room_id: str,
         reservation_repo: Any,  # InMemory / Sqlite どちらも受ける
         penalty_service: PenaltyService,
+        target_index: Optional[TargetReservationIndex] = None,
     ):
         self.room_id = room_id
         self.reservation_repo = reservation_repo
         self.penalty_service = penalty_service
+        # 対象予約選び用のインデックス（省略時は reservation_repo ごとに共有するもの）
+        self._target_index = target_index
 
         self.current_state: RoomState = RoomState.IDLE
         self.current_reservation_id: Optional[str] = None
+        # 直近の update_state で追いかけていた予約（next_deadline 用。DB を読み直さないため）
+        self._tracked_reservation: Optional[Reservation] = None
 
         self.grace_period_sec = 10 * 60  # 利用終了後の猶予
         self.arrival_window_before_sec = 10 * 60  # 開始前の「到着してよい」ウィンドウ
         self.arrival_window_after_sec = 15 * 60  # 開始後の「遅刻許容」ウィンドウ
         self.cleanup_margin_sec = 30 * 60  # FINISHED → 次予約に移るまでのマージン
 
+        # 状態が変わったときに (変更前, 変更後) を渡して呼ぶコールバック
+        self._transition_listeners: List[Callable[[RoomState, RoomState], None]] = []
+
+    def add_transition_listener(
+        self, callback: Callable[[RoomState, RoomState], None]
+    ) -> None:
+        """
+        update_state で状態が変わったら callback(変更前, 変更後) を呼ぶ。
+        mark_used / mark_no_show は予約リポジトリの通知を出さないので、その代わりに使う。
+        """
+        self._transition_listeners.append(callback)
+
     def update_state(self, is_occupied: bool, current_time: datetime):
+        prev_state = self.current_state
+        result = self._update_state(is_occupied, current_time)
+        if self.current_state != prev_state:
+            for callback in self._transition_listeners:
+                callback(prev_state, self.current_state)
+        return result
+
+    def _update_state(self, is_occupied: bool, current_time: datetime):
         alert: Optional[str] = None
 
         # 0. 今追いかけている予約を取得
@@ -58,6 +113,8 @@ class RoomStateManager:
             # - 新しい予約を追いかける場合も、必ず IDLE から開始
             self.current_state = RoomState.IDLE
 
+        self._tracked_reservation = res
+
         # ここから先、res が None なら「今は追うべき予約がない」
         if res is None:
             return {
@@ -119,32 +176,53 @@ class RoomStateManager:
             "alert": alert,
         }
 
-    def _select_target_reservation(self, now: datetime) -> Optional[Reservation]:
+    def next_deadline(self, current_time: datetime) -> Optional[datetime]:
         """
-        現在時刻 now に対して「追いかけるべき予約」を1件選ぶ。
-
-        - CANCELLED は無視
-        - end_time + cleanup_margin を過ぎたものは「過去扱い」で無視
-        - 残りから start_time が最も早いものを採用
+        占有状態が変わらなかった場合に、次に update_state で遷移が起こりうる時刻を返す。
+        update_state の直後に呼ぶこと。時間で起きる遷移がなければ None
+        （新しい占有サンプルか予約の変更が来るまで評価しなくてよい）。
+
+        - IDLE               : start - arrival_window_before_sec (RESERVED_NOT_USED へ)
+        - RESERVED_NOT_USED  : start + arrival_window_after_sec 超過 (ノーショー)
+        - IN_USE             : end + grace_period_sec 超過 (終了 / OVERSTAY)
+        - 全状態共通         : end + cleanup_margin_sec 超過 (次の予約へ)
         """
-        candidates = []
-        room_res_list = self.reservation_repo.get_reservations_for_room(self.room_id)
-
-        cleanup_margin = timedelta(seconds=self.cleanup_margin_sec)
+        res = self._tracked_reservation
+        if res is None:
+            return None
 
-        for res in room_res_list:
-            if res.status == ReservationStatus.CANCELLED:
-                continue
-            if res.end_time + cleanup_margin < now:
-                # 完全に過去の予約
-                continue
-            candidates.append(res)
+        # update_state の判定は「超過 (>)」なので、その直後の時刻を期限にする
+        just_after = timedelta(microseconds=1)
+        candidates = [
+            res.end_time + timedelta(seconds=self.cleanup_margin_sec) + just_after
+        ]
+        if self.current_state == RoomState.IDLE:
+            candidates.append(
+                res.start_time - timedelta(seconds=self.arrival_window_before_sec)
+            )
+        elif self.current_state == RoomState.RESERVED_NOT_USED:
+            candidates.append(
+                res.start_time
+                + timedelta(seconds=self.arrival_window_after_sec)
+                + just_after
+            )
+        elif self.current_state == RoomState.IN_USE:
+            candidates.append(
+                res.end_time + timedelta(seconds=self.grace_period_sec) + just_after
+            )
 
-        if not candidates:
-            return None
+        future = [d for d in candidates if d > current_time]
+        return min(future) if future else None
 
-        candidates.sort(key=lambda r: r.start_time)
-        return candidates[0]
+    def _select_target_reservation(self, now: datetime) -> Optional[Reservation]:
+        """
+        現在時刻 now に対して「追いかけるべき予約」を1件選ぶ。
+        規則は select_target_reservation と同じだが、部屋の全予約は読まずに
+        TargetReservationIndex の heap から O(log n) で取る。
+        """
+        if self._target_index is None:
+            self._target_index = TargetReservationIndex.shared(self.reservation_repo)
+        return self._target_index.select(self.room_id, now, self.cleanup_margin_sec)
 
     def _log(self, msg: str) -> None:
         print(f"[RoomStateManager][{self.room_id}] {msg}")
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import weakref
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from Domain.reservation import Reservation, ReservationStatus
+
+
+class _RoomCursor:
+    """
+    部屋1つ分の「これから追いかける可能性のある予約」の min-heap（開始時刻順）。
+    """
+
+    __slots__ = ("heap", "now", "cleanup_margin_sec")
+
+    def __init__(
+        self,
+        heap: List[Tuple[datetime, int, Reservation]],
+        now: datetime,
+        cleanup_margin_sec: int,
+    ) -> None:
+        self.heap = heap
+        self.now = now
+        self.cleanup_margin_sec = cleanup_margin_sec
+
+
+class TargetReservationIndex:
+    """
+    部屋ごとに「まだ終わっていない・キャンセルされていない予約」を開始時刻の min-heap で持ち、
+    RoomStateManager の対象予約選び（select_target_reservation と同じ規則）を O(log n) で行う。
+
+    - heap は部屋ごとに初回の select で repo.get_upcoming_reservations から作る
+      （end_time + cleanup_margin が過去の予約は読まない）
+    - 予約の作成・キャンセルは reservation_repo.add_listener の通知でその部屋の heap を捨て、
+      次の select で読み直す
+    - 時刻が巻き戻った（シミュレーション時刻の変更）/ cleanup_margin_sec が変わった場合も読み直す
+    - 通知を出さないリポジトリでは毎回読み直す（従来どおりの動き）
+    - 読み直し（SQLite ならクエリ）はロックの外で行い、他の部屋・他のスレッドの select を待たせない。
+      読んでいる間にその部屋の通知が来たら、読んだ heap はキャッシュしない
+    """
+
+    _shared: "weakref.WeakKeyDictionary[Any, TargetReservationIndex]" = (
+        weakref.WeakKeyDictionary()
+    )
+    _shared_lock = threading.Lock()
+
+    def __init__(self, reservation_repo: Any) -> None:
+        # リポジトリは弱参照で持つ（_shared のキーをインデックスから生かし続けないように）
+        self._repo_ref = weakref.ref(reservation_repo)
+        self._cursors: Dict[str, _RoomCursor] = {}
+        # 部屋ごとの通知の回数。読み直しの間に通知が来たかを見分ける
+        self._generations: Dict[str, int] = {}
+        self._generation_all = 0
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._listening = hasattr(reservation_repo, "add_listener")
+        if self._listening:
+            reservation_repo.add_listener(self.invalidate)
+
+        # 統計
+        self._selects = 0
+        self._loads = 0
+        self._popped = 0
+
+    @classmethod
+    def shared(cls, reservation_repo: Any) -> "TargetReservationIndex":
+        """
+        reservation_repo ごとに1つのインデックスを共有する
+        （部屋ごとの RoomStateManager がそれぞれリスナーを登録しないように）。
+        """
+        with cls._shared_lock:
+            index = cls._shared.get(reservation_repo)
+            if index is None:
+                index = cls(reservation_repo)
+                cls._shared[reservation_repo] = index
+            return index
+
+    def invalidate(self, room_id: str) -> None:
+        """
+        room_id の heap を捨てる（予約の作成・キャンセル通知から呼ばれる）。
+        """
+        with self._lock:
+            self._cursors.pop(room_id, None)
+            self._generations[room_id] = self._generations.get(room_id, 0) + 1
+
+    def invalidate_all(self) -> None:
+        with self._lock:
+            self._cursors.clear()
+            self._generation_all += 1
+
+    def _generation(self, room_id: str) -> Tuple[int, int]:
+        # self._lock の中で呼ぶこと
+        return self._generation_all, self._generations.get(room_id, 0)
+
+    def _load(self, room_id: str, now: datetime, cleanup_margin_sec: int) -> _RoomCursor:
+        # self._lock の外で呼ぶ
+        repo = self._repo_ref()
+        if repo is None:
+            return _RoomCursor([], now, cleanup_margin_sec)
+        since = now - timedelta(seconds=cleanup_margin_sec)
+        if hasattr(repo, "get_upcoming_reservations"):
+            reservations = repo.get_upcoming_reservations(room_id, since)
+        else:
+            reservations = repo.get_reservations_for_room(room_id)
+        heap = [
+            (res.start_time, next(self._seq), res)
+            for res in reservations
+            if res.status != ReservationStatus.CANCELLED and res.end_time >= since
+        ]
+        heapq.heapify(heap)
+        return _RoomCursor(heap, now, cleanup_margin_sec)
+
+    def select(
+        self, room_id: str, now: datetime, cleanup_margin_sec: int
+    ) -> Optional[Reservation]:
+        """
+        now に対して room_id で追いかけるべき予約を返す（なければ None）。
+        規則は select_target_reservation と同じ:
+        CANCELLED と end_time + cleanup_margin を過ぎたものを除き、start_time が最も早いもの。
+        """
+        with self._lock:
+            self._selects += 1
+            cursor = self._cursors.get(room_id)
+            if (
+                cursor is not None
+                and self._listening
+                and now >= cursor.now
+                and cleanup_margin_sec == cursor.cleanup_margin_sec
+            ):
+                return self._pop_finished(cursor, now, cleanup_margin_sec)
+            generation = self._generation(room_id)
+
+        cursor = self._load(room_id, now, cleanup_margin_sec)
+        with self._lock:
+            self._loads += 1
+            # 読んでいる間に通知が来ていたら、読んだ heap は古いかもしれないのでキャッシュしない
+            # （この呼び出しには読み始めた時点の内容で答える）
+            if self._listening and self._generation(room_id) == generation:
+                current = self._cursors.get(room_id)
+                if current is None or current.now <= now:
+                    self._cursors[room_id] = cursor
+            return self._pop_finished(cursor, now, cleanup_margin_sec)
+
+    def _pop_finished(
+        self, cursor: _RoomCursor, now: datetime, cleanup_margin_sec: int
+    ) -> Optional[Reservation]:
+        # self._lock の中で呼ぶこと
+        cursor.now = now
+
+        # 先頭が過去・キャンセル済みなら捨てる（時刻は進む一方なので戻ってこない）
+        heap = cursor.heap
+        cleanup_margin = timedelta(seconds=cleanup_margin_sec)
+        while heap:
+            res = heap[0][2]
+            if (
+                res.status == ReservationStatus.CANCELLED
+                or res.end_time + cleanup_margin < now
+            ):
+                heapq.heappop(heap)
+                self._popped += 1
+                continue
+            return res
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "rooms": len(self._cursors),
+            "selects": self._selects,
+            "loads": self._loads,
+            "popped": self._popped,
+        }
@@ -0,0 +1,152 @@
+"""
+AdaptivePollingPolicy の1日シミュレーション。
+
+ランダムな予約と入退室のシナリオを作り、固定間隔 (5秒) と適応ポーリングで
+カメラ呼び出し回数・判定結果（利用 / ノーショー）と、
+固定間隔に比べてチェックインの検知がどれだけ遅れたかを比べる。
+時刻は仮想的に進めるだけなので、実時間はほとんどかからない。
+
+    $ cd src && python -m Simulator.bench_adaptive_polling --reservations 12 --seed 1
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from Domain.reservation import ReservationStatus
+from Repository.penalty_repository import InMemoryPenaltyRepository
+from Repository.reservation_repository import InMemoryReservationRepository
+from Services.adaptive_poller import AdaptivePollingPolicy
+from Services.penalty_service import PenaltyService
+from Services.room_state_manager import RoomStateManager
+from time_utils import JST
+
+ROOM_ID = "Room-A"
+
+
+@dataclass
+class Visit:
+    """
+    予約1件に対する実際の在室時間。no-show なら arrive/leave は None。
+    """
+
+    start: datetime
+    end: datetime
+    arrive: Optional[datetime]
+    leave: Optional[datetime]
+
+
+def make_scenario(day: datetime, reservations: int, rng: random.Random) -> List[Visit]:
+    visits = []
+    cursor = day.replace(hour=9)
+    for _ in range(reservations):
+        start = cursor + timedelta(minutes=rng.choice([15, 30, 45, 60, 90]))
+        end = start + timedelta(minutes=rng.choice([30, 60, 90]))
+        cursor = end
+        if rng.random() < 0.2:
+            visits.append(Visit(start, end, None, None))
+            continue
+        arrive = start + timedelta(minutes=rng.uniform(-8, 12))
+        # 1割は延長（OVERSTAY）する
+        overstay = rng.random() < 0.1
+        leave = end + timedelta(minutes=rng.uniform(15, 25) if overstay else -rng.uniform(0, 10))
+        visits.append(Visit(start, end, arrive, leave))
+    return visits
+
+
+def simulate(
+    visits: List[Visit],
+    day: datetime,
+    make_interval: Callable[[InMemoryReservationRepository, RoomStateManager], Callable],
+) -> dict:
+    repo = InMemoryReservationRepository(buffer_minutes=5)
+    room_manager = RoomStateManager(
+        ROOM_ID, repo, PenaltyService(InMemoryPenaltyRepository())
+    )
+    next_interval = make_interval(repo, room_manager)
+    for v in visits:
+        repo.create_reservation(ROOM_ID, "user", v.start, v.end)
+
+    def occupied(t: datetime) -> bool:
+        return any(v.arrive is not None and v.arrive <= t < v.leave for v in visits)
+
+    calls = 0
+    check_in_at = {}
+    t = day
+    end_of_day = day + timedelta(days=1)
+    while t < end_of_day:
+        calls += 1
+        state = room_manager.update_state(occupied(t), t)
+        if state["state"] == "IN_USE" and state["reservation_id"] not in check_in_at:
+            check_in_at[state["reservation_id"]] = t
+        t += timedelta(seconds=next_interval(t))
+
+    return {
+        "calls": calls,
+        "outcomes": [r.status for r in repo.get_reservations_for_room(ROOM_ID)],
+        "check_in_at": check_in_at,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reservations", type=int, default=10)
+    parser.add_argument("--fast", type=float, default=5.0)
+    parser.add_argument("--floor", type=float, default=30.0)
+    parser.add_argument("--ceiling", type=float, default=900.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    day = datetime(2025, 1, 6, tzinfo=JST)
+    visits = make_scenario(day, args.reservations, random.Random(args.seed))
+
+    # 状態遷移・ペナルティのログは出さない
+    with contextlib.redirect_stdout(io.StringIO()):
+        fixed = simulate(visits, day, lambda repo, rm: lambda t: args.fast)
+    policies = []
+
+    def adaptive(repo, rm):
+        policy = AdaptivePollingPolicy(
+            repo,
+            rm,
+            fast_interval_sec=args.fast,
+            floor_sec=args.floor,
+            ceiling_sec=args.ceiling,
+        )
+        policies.append(policy)
+        return policy.next_interval
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = simulate(visits, day, adaptive)
+
+    used = sum(1 for s in fixed["outcomes"] if s == ReservationStatus.USED)
+    print(
+        f"{len(visits)} reservations ({used} used, {len(visits) - used} no-show), "
+        f"fast={args.fast}s floor={args.floor}s ceiling={args.ceiling}s"
+    )
+    saved = fixed["calls"] - result["calls"]
+    print(f"camera calls: fixed={fixed['calls']} adaptive={result['calls']}")
+    print(f"calls saved: {saved} ({saved / fixed['calls'] * 100:.1f}%)")
+    # 固定間隔に対するチェックイン検知の遅れ
+    delays = [
+        (t - fixed["check_in_at"][res_id]).total_seconds()
+        for res_id, t in result["check_in_at"].items()
+        if res_id in fixed["check_in_at"]
+    ]
+    if delays:
+        print(
+            f"extra check-in delay: mean={sum(delays) / len(delays):.1f}s "
+            f"max={max(delays):.1f}s"
+        )
+    print(f"same outcomes: {fixed['outcomes'] == result['outcomes']}")
+    print(f"policy: {policies[0].stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+SQLite バックエンドでの API リクエストの所要時間の計測。
+
+一時 DB (USE_SQLITE=true, DB_PATH=一時ファイル) で main.app を本番と同じ Werkzeug の
+threaded サーバー（リクエストごとに新しいスレッド）で起動し、--clients 本のクライアントスレッドから
+同時に HTTP で叩いて、エンドポイントごとの p50 / p95 を表示する。過去予約 --history 件を先に入れておく。
+接続プールの効果を見るため、SQLITE_POOL_SIZE=0（close のたびに接続を閉じる）と
+既定値のそれぞれで子プロセスを起動して比べる。
+
+あわせて、新しいスレッドで「接続を借りる → 1行読む → 返す」1回の所要時間を、
+get_connection() と素の sqlite3.connect()（プール導入前の get_connection と同じ）で比べる。
+
+    $ cd src && python -m Simulator.bench_api --history 100000 --requests 300 --clients 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, List
+
+POOL_SETTINGS = (("no pool", "0"), ("pool", None))
+
+
+def fresh_thread_connects(count: int) -> Dict[str, List[float]]:
+    """
+    新しいスレッドごとに接続を1回借りて 1 行読む所要時間（サーバーのリクエスト1回分に相当）。
+    """
+    from Repository import db
+
+    def plain() -> None:
+        conn = sqlite3.connect(db.get_db_path())
+        conn.execute("SELECT 1 FROM reservations LIMIT 1").fetchall()
+        conn.close()
+
+    def pooled() -> None:
+        conn = db.get_connection()
+        conn.execute("SELECT 1 FROM reservations LIMIT 1").fetchall()
+        conn.close()
+
+    timings: Dict[str, List[float]] = {}
+    for name, fn in (("connect+query (plain)", plain), ("connect+query (get_connection)", pooled)):
+        for _ in range(count):
+            elapsed: List[float] = []
+
+            def body() -> None:
+                t0 = time.perf_counter()
+                fn()
+                elapsed.append(time.perf_counter() - t0)
+
+            t = threading.Thread(target=body)
+            t.start()
+            t.join()
+            timings.setdefault(name, []).extend(elapsed)
+    return timings
+
+
+def run(history: int, requests: int, clients: int) -> Dict[str, List[float]]:
+    """
+    子プロセス側: main を threaded サーバーで起動し、clients 本のスレッドから
+    各エンドポイントを requests 回ずつ叩いて所要時間を返す。
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main
+        from Repository import db
+        from time_utils import now_jst, to_epoch_us
+    from werkzeug.serving import make_server
+
+    room_id = main.ROOM_ID
+    now = now_jst()
+
+    start = now - timedelta(days=history // 24 + 2)
+    rows = []
+    for n in range(history):
+        s = start + timedelta(hours=n)
+        rows.append(
+            (
+                f"hist-{n}",
+                room_id,
+                f"user-{n % 50}",
+                s.isoformat(),
+                (s + timedelta(minutes=30)).isoformat(),
+                "USED",
+                s.isoformat(),
+                s.isoformat(),
+                to_epoch_us(s),
+                to_epoch_us(s + timedelta(minutes=30)),
+            )
+        )
+    conn = db.get_connection()
+    conn.executemany(
+        "INSERT INTO reservations (reservation_id, room_id, user_id, start_time, end_time,"
+        " status, created_at, updated_at, start_us, end_us)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+
+    timings = fresh_thread_connects(requests)
+
+    server = make_server("127.0.0.1", 0, main.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+    lock = threading.Lock()
+
+    def timed(name: str, method: str, url: str, body=None):
+        t0 = time.perf_counter()
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        conn.request(method, url, body=json.dumps(body) if body is not None else None, headers=headers)
+        resp = conn.getresponse()
+        data = resp.read()
+        conn.close()
+        with lock:
+            timings.setdefault(name, []).append(time.perf_counter() - t0)
+        return resp.status, data
+
+    def post(n: int):
+        # 明日以降の 20 分刻みの枠（15 分の予約 + バッファ 5 分）に予約を入れる
+        day = (now + timedelta(days=1 + n // 72)).date().isoformat()
+        minute = (n % 72) * 20
+        status, data = timed(
+            "POST /api/reservations",
+            "POST",
+            "/api/reservations",
+            {
+                "user_id": f"user-{n % 50}",
+                "room_id": room_id,
+                "date": day,
+                "start_time": f"{minute // 60:02d}:{minute % 60:02d}",
+                "end_time": f"{(minute + 15) // 60:02d}:{(minute + 15) % 60:02d}",
+            },
+        )
+        return json.loads(data)["reservation_id"] if status == 201 else None
+
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(clients) as pool:
+        created = [r for r in pool.map(post, range(requests)) if r is not None]
+        list(pool.map(lambda n: timed("GET /api/penalties", "GET", f"/api/penalties/user-{n % 50}"), range(requests)))
+        list(pool.map(lambda r: timed("DELETE /api/reservations", "DELETE", f"/api/reservations/{r}"), created))
+    server.shutdown()
+
+    timings["created"] = [len(created)]
+    return timings
+
+
+def spawn(history: int, requests: int, clients: int, pool_size: str | None) -> Dict[str, List[float]]:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, USE_SQLITE="true", DB_PATH=os.path.join(tmp, "bench.db"))
+        if pool_size is not None:
+            env["SQLITE_POOL_SIZE"] = pool_size
+        else:
+            env.pop("SQLITE_POOL_SIZE", None)
+        out = subprocess.run(
+            [sys.executable, "-m", "Simulator.bench_api", "--child",
+             "--history", str(history), "--requests", str(requests), "--clients", str(clients)],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--history", type=int, default=100_000, help="先に入れておく過去予約の件数")
+    parser.add_argument("--requests", type=int, default=300, help="エンドポイントごとのリクエスト数")
+    parser.add_argument("--clients", type=int, default=8, help="同時に叩くクライアントスレッドの数")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run(args.history, args.requests, args.clients)))
+        return
+
+    print(f"history={args.history} requests={args.requests} clients={args.clients}")
+    print(f"{'':9} {'endpoint':<32} {'p50':>9} {'p95':>9}")
+    for label, pool_size in POOL_SETTINGS:
+        timings = spawn(args.history, args.requests, args.clients, pool_size)
+        created = timings.pop("created")[0]
+        for name, secs in timings.items():
+            secs.sort()
+            p95 = secs[min(len(secs) - 1, int(len(secs) * 0.95))]
+            print(
+                f"{label:9} {name:<32} {statistics.median(secs) * 1000:>7.2f}ms "
+                f"{p95 * 1000:>7.2f}ms"
+            )
+        print(f"{label:9} created={created}")
+
+
+if __name__ == "__main__":
+    main()
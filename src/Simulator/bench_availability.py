@@ -0,0 +1,172 @@
+"""
+AvailabilityService の差分検証と速度計測。
+
+1. 差分検証: InMemory / SQLite それぞれのリポジトリに、複数の部屋・複数日の予約の作成と
+   キャンセルをランダムに行いながら、
+   - free_intervals が返す空き時間が、各分に1分の予約を入れられるか（全予約を見る重複チェック）
+     から作った空き時間と一致するか
+   - is_free が、全予約を見る重複チェックと一致するか
+   を確かめる。不一致があれば終了コード 1。
+2. 速度計測: 1部屋の過去予約の件数を変えながら、free_intervals（タイムライン作成済み）と
+   部屋の全予約から空き時間を計算する場合（サーバー側で毎回計算する場合）を比べる。
+
+    $ cd src && python -m Simulator.bench_availability --ops 3000 --sizes 1000,100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import List, Tuple
+
+from Domain.reservation import ReservationStatus
+from Repository import db
+from Repository.reservation_repository import (
+    InMemoryReservationRepository,
+    SqliteReservationRepository,
+)
+from Services.availability_service import MINUTES_PER_DAY, AvailabilityService
+from time_utils import JST
+
+DAY = datetime(2025, 1, 6, tzinfo=JST)
+MINUTE = timedelta(minutes=1)
+
+
+def conflicts(res_list, start: datetime, end: datetime, buffer: timedelta) -> bool:
+    return any(
+        r.status != ReservationStatus.CANCELLED
+        and end > r.start_time - buffer
+        and start < r.end_time + buffer
+        for r in res_list
+    )
+
+
+def expected_free(res_list, day: date, buffer: timedelta, min_minutes: int) -> List[Tuple[datetime, datetime]]:
+    day_start = datetime.combine(day, datetime.min.time(), tzinfo=JST)
+    live = [
+        r for r in res_list
+        if r.status != ReservationStatus.CANCELLED
+        and r.end_time + buffer > day_start
+        and r.start_time - buffer < day_start + timedelta(days=1)
+    ]
+    free = [
+        not conflicts(live, day_start + m * MINUTE, day_start + (m + 1) * MINUTE, buffer)
+        for m in range(MINUTES_PER_DAY)
+    ]
+    runs = []
+    m = 0
+    while m < MINUTES_PER_DAY:
+        if not free[m]:
+            m += 1
+            continue
+        start = m
+        while m < MINUTES_PER_DAY and free[m]:
+            m += 1
+        if m - start >= min_minutes:
+            runs.append((day_start + start * MINUTE, day_start + m * MINUTE))
+    return runs
+
+
+def differential(repo, ops: int, seed: int) -> int:
+    rng = random.Random(seed)
+    service = AvailabilityService(repo, buffer_minutes=5, min_minutes=15, max_minutes=120)
+    rooms = ["room-a", "room-b", "room-c"]
+    days = [DAY.date() + timedelta(days=d) for d in range(3)]
+    past = DAY - timedelta(days=30)
+    mismatches = 0
+    for n in range(ops):
+        room_id = rng.choice(rooms)
+        if rng.random() < 0.25:
+            res_list = repo.get_reservations_for_room(room_id)
+            if res_list:
+                repo.cancel_reservation(rng.choice(res_list).reservation_id)
+        else:
+            # 日をまたぐ予約や、分の途中から始まる予約も混ぜる
+            start = DAY + timedelta(minutes=rng.randrange(3 * MINUTES_PER_DAY), seconds=rng.choice([0, 0, 0, 30]))
+            try:
+                repo.create_reservation(
+                    room_id, "user", start, start + timedelta(minutes=rng.choice([15, 30, 60, 90]))
+                )
+            except ValueError:
+                pass
+
+        if n % 20 == 0:
+            room_id = rng.choice(rooms)
+            day = rng.choice(days)
+            res_list = repo.get_reservations_for_room(room_id)
+            got = [(f["start"], f["end"]) for f in service.free_intervals(room_id, day, past)]
+            want = expected_free(res_list, day, service.buffer, service.min_minutes)
+            if got != want:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"  free mismatch {room_id} {day}: {got} != {want}", file=sys.stderr)
+            for _ in range(20):
+                start = DAY + timedelta(minutes=rng.randrange(3 * MINUTES_PER_DAY))
+                end = start + timedelta(minutes=rng.choice([15, 30, 60]))
+                if service.is_free(room_id, start, end) == conflicts(res_list, start, end, service.buffer):
+                    mismatches += 1
+                    if mismatches <= 5:
+                        print(f"  is_free mismatch {room_id} {start}-{end}", file=sys.stderr)
+    print(f"  {type(repo).__name__}: ops={ops} stats={service.stats()} mismatches={mismatches}")
+    return mismatches
+
+
+def bench(total: int, repeat: int = 200) -> dict:
+    repo = InMemoryReservationRepository(buffer_minutes=5)
+    base = DAY - timedelta(hours=total)
+    for n in range(total):
+        start = base + timedelta(hours=n)
+        repo.create_reservation("room", "user", start, start + timedelta(minutes=30))
+    for n in range(10):
+        start = DAY + timedelta(hours=9 + n)
+        repo.create_reservation("room", "user", start, start + timedelta(minutes=30))
+    service = AvailabilityService(repo, buffer_minutes=5, min_minutes=15, max_minutes=120)
+    now = DAY - timedelta(hours=1)
+    service.free_intervals("room", DAY.date(), now)
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        service.free_intervals("room", DAY.date(), now)
+    timeline_sec = (time.perf_counter() - started) / repeat
+
+    started = time.perf_counter()
+    for _ in range(3):
+        expected_free(repo.get_reservations_for_room("room"), DAY.date(), service.buffer, 15)
+    scan_sec = (time.perf_counter() - started) / 3
+    return {"timeline": timeline_sec, "scan": scan_sec}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ops", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sizes", default="1000,100000", help="速度計測の過去予約の件数（空なら計測しない）")
+    args = parser.parse_args()
+
+    print("differential:")
+    mismatches = differential(InMemoryReservationRepository(buffer_minutes=5), args.ops, args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_PATH"] = os.path.join(tmp, "availability.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            db.init_db()
+        mismatches += differential(SqliteReservationRepository(buffer_minutes=5), args.ops, args.seed)
+        del os.environ["DB_PATH"]
+
+    if args.sizes:
+        print(f"{'history':>9} {'timeline':>10} {'scan':>10}")
+        for total in (int(s) for s in args.sizes.split(",")):
+            r = bench(total)
+            print(f"{total:>9} {r['timeline'] * 1e6:>8.1f}us {r['scan'] * 1000:>8.1f}ms")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+BatchStateEngine の差分検証と速度計測。
+
+1. 差分検証: 同じ予約・同じ在室シナリオ（途中のキャンセル・追加予約を含む）を
+   RoomStateManager（部屋ごとに update_state）と BatchStateEngine に与え、
+   毎 tick の (状態, 対象予約, アラート) と、最後の予約ステータス・ペナルティ件数が
+   全部屋で一致することを確かめる。あわせて TargetReservationIndex が選ぶ対象予約が
+   select_target_reservation（全予約を見る規則）と一致することも毎 tick 確かめる。
+   不一致があれば終了コード 1。
+2. 速度計測: 部屋数を変えながら MonitoringEngine と BatchStateEngine の tick を比べる。
+
+    $ cd src && python -m Simulator.bench_batch_engine --rooms 100 --bench-rooms 1000,10000
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import itertools
+import random
+import statistics
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from Domain.room import Room
+from Repository.penalty_repository import InMemoryPenaltyRepository
+from Repository.reservation_repository import InMemoryReservationRepository
+from Services.batch_state_engine import BatchStateEngine
+from Services.monitoring_engine import MonitoringEngine
+from Services.occupancy_provider import DummyOccupancyProvider
+from Services.penalty_service import PenaltyService
+from Services.room_state_manager import RoomStateManager, select_target_reservation
+from Services.target_index import TargetReservationIndex
+from time_utils import JST
+
+DAY = datetime(2025, 1, 6, tzinfo=JST)
+
+# (開始, 終了, 到着, 退室)。no-show なら到着・退室は None
+Visit = Tuple[datetime, datetime, datetime | None, datetime | None]
+
+
+def make_rooms(count: int, rng: random.Random) -> List[Room]:
+    rooms = []
+    for i in range(count):
+        room = Room(room_id=f"room-{i:05d}")
+        # 3割の部屋は判定パラメータを上書きする
+        if rng.random() < 0.3:
+            room.grace_period_sec = rng.choice([0, 60, 300])
+            room.arrival_window_before_sec = rng.choice([0, 300, 900])
+            room.arrival_window_after_sec = rng.choice([60, 300, 600])
+            room.cleanup_margin_sec = rng.choice([0, 600, 1800])
+        rooms.append(room)
+    return rooms
+
+
+def make_visits(rooms: List[Room], per_room: int, rng: random.Random) -> Dict[str, List[Visit]]:
+    visits: Dict[str, List[Visit]] = {}
+    for room in rooms:
+        cursor = DAY.replace(hour=8)
+        visits[room.room_id] = []
+        for _ in range(per_room):
+            start = cursor + timedelta(minutes=rng.choice([10, 15, 30, 60]))
+            end = start + timedelta(minutes=rng.choice([15, 30, 60]))
+            cursor = end
+            if rng.random() < 0.25:
+                visits[room.room_id].append((start, end, None, None))
+                continue
+            arrive = start + timedelta(minutes=rng.randint(-12, 18))
+            leave = end + timedelta(minutes=rng.randint(-10, 20))
+            if leave <= arrive:
+                leave = arrive + timedelta(minutes=5)
+            visits[room.room_id].append((start, end, arrive, leave))
+    return visits
+
+
+def occupied_at(visits: List[Visit], t: datetime) -> bool:
+    return any(a is not None and a <= t < l for _, _, a, l in visits)
+
+
+def differential(rooms_count: int, per_room: int, tick_sec: int, seed: int) -> int:
+    """
+    差分検証を行い、不一致の件数を返す。
+    """
+    rng = random.Random(seed)
+    rooms = make_rooms(rooms_count, rng)
+    visits = make_visits(rooms, per_room, rng)
+    users = [f"user-{i:03d}" for i in range(max(1, rooms_count // 3))]
+
+    scalar_repo = InMemoryReservationRepository(buffer_minutes=5)
+    batch_repo = InMemoryReservationRepository(buffer_minutes=5)
+    scalar_penalty = InMemoryPenaltyRepository()
+    batch_penalty = InMemoryPenaltyRepository()
+
+    managers: Dict[str, RoomStateManager] = {}
+    for room in rooms:
+        manager = RoomStateManager(
+            room.room_id, scalar_repo, PenaltyService(scalar_penalty)
+        )
+        for name, value in room.state_params().items():
+            setattr(manager, name, value)
+        managers[room.room_id] = manager
+    engine = BatchStateEngine(
+        batch_repo,
+        PenaltyService(batch_penalty),
+        lambda room: DummyOccupancyProvider(initial=False),
+    )
+    engine.add_rooms(rooms)
+
+    def both(method: str, *args) -> None:
+        # 両方のリポジトリに同じ操作をする（衝突で失敗するなら両方とも失敗する）
+        for repo in (scalar_repo, batch_repo):
+            try:
+                getattr(repo, method)(*args)
+            except ValueError:
+                pass
+
+    def create(room_id: str, start: datetime, end: datetime) -> None:
+        # 既定の ID (room_id + 開始時刻) はキャンセル後に同じ枠を取り直すと重複するので、連番にする
+        both(
+            "create_reservation",
+            room_id,
+            rng.choice(users),
+            start,
+            end,
+            f"{room_id}-{next(serial)}",
+        )
+
+    target_index = TargetReservationIndex.shared(scalar_repo)
+    serial = itertools.count()
+    for room in rooms:
+        for start, end, _, _ in visits[room.room_id]:
+            create(room.room_id, start, end)
+
+    mismatches = 0
+    t = DAY.replace(hour=7, minute=30)
+    end_of_run = DAY.replace(hour=23)
+    ticks = 0
+    while t < end_of_run:
+        # 途中のキャンセルと追加予約
+        for _ in range(max(1, rooms_count // 100)):
+            room = rng.choice(rooms)
+            if rng.random() < 0.3:
+                res_list = scalar_repo.get_reservations_for_room(room.room_id)
+                if res_list:
+                    both("cancel_reservation", rng.choice(res_list).reservation_id)
+            else:
+                start = t + timedelta(minutes=rng.choice([0, 5, 20, 45]))
+                create(room.room_id, start, start + timedelta(minutes=rng.choice([15, 30])))
+
+        occupied = [occupied_at(visits[room.room_id], t) for room in rooms]
+        expected = []
+        for room, occ in zip(rooms, occupied):
+            info = managers[room.room_id].update_state(occ, t)
+            expected.append((info["state"], info["reservation_id"], info["alert"]))
+        engine.step(occupied, t)
+        actual = [
+            (s["room_state"], s["reservation_id"], s["alert"])
+            for s in engine.get_statuses(r.room_id for r in rooms)
+        ]
+        for room, e, a in zip(rooms, expected, actual):
+            if e != a:
+                mismatches += 1
+                if mismatches <= 10:
+                    print(f"  mismatch at {t} {room.room_id}: scalar={e} batch={a}", file=sys.stderr)
+
+        # 対象予約の heap が、全件を見て選ぶ規則と同じ予約を返すか
+        for room in rooms:
+            cleanup = managers[room.room_id].cleanup_margin_sec
+            e = select_target_reservation(
+                scalar_repo.get_reservations_for_room(room.room_id), t, cleanup
+            )
+            a = target_index.select(room.room_id, t, cleanup)
+            if e is not a:
+                mismatches += 1
+                if mismatches <= 10:
+                    print(f"  target mismatch at {t} {room.room_id}: {e} != {a}", file=sys.stderr)
+
+        ticks += 1
+        # 境界ちょうどの時刻も、その直後の時刻も踏むように刻む
+        t += timedelta(seconds=tick_sec, microseconds=rng.choice([0, 0, 1]))
+
+    for room in rooms:
+        e = [(r.reservation_id, r.status) for r in scalar_repo.get_reservations_for_room(room.room_id)]
+        a = [(r.reservation_id, r.status) for r in batch_repo.get_reservations_for_room(room.room_id)]
+        if e != a:
+            mismatches += 1
+            print(f"  reservation status mismatch {room.room_id}: {e} != {a}", file=sys.stderr)
+    for user in users:
+        if scalar_penalty.get_total_penalty_count(user) != batch_penalty.get_total_penalty_count(user):
+            mismatches += 1
+            print(f"  penalty mismatch {user}", file=sys.stderr)
+
+    statuses = [r.status.name for room in rooms for r in batch_repo.get_reservations_for_room(room.room_id)]
+    summary = {s: statuses.count(s) for s in sorted(set(statuses))}
+    print(
+        f"differential: rooms={rooms_count} ticks={ticks} reservations={summary} "
+        f"mismatches={mismatches}"
+    )
+    return mismatches
+
+
+def bench(rooms_count: int, ticks: int, flip_rate: float, tick_sec: float) -> dict:
+    """
+    同じシナリオで MonitoringEngine / BatchStateEngine の tick 時間を測る。
+    """
+    results = {}
+    for kind in ("engine", "batch"):
+        rng = random.Random(rooms_count)
+        repo = InMemoryReservationRepository(buffer_minutes=5)
+        providers: Dict[str, DummyOccupancyProvider] = {}
+
+        def provider_factory(room: Room) -> DummyOccupancyProvider:
+            providers[room.room_id] = DummyOccupancyProvider(initial=False)
+            return providers[room.room_id]
+
+        penalty_service = PenaltyService(InMemoryPenaltyRepository())
+        if kind == "engine":
+            engine = MonitoringEngine(repo, penalty_service, provider_factory)
+        else:
+            engine = BatchStateEngine(repo, penalty_service, provider_factory)
+        room_ids = [f"room-{i:05d}" for i in range(rooms_count)]
+        engine.add_rooms(Room(room_id=r) for r in room_ids)
+        start = DAY.replace(hour=9)
+        for room_id in room_ids:
+            res_start = start + timedelta(minutes=rng.randint(0, 60))
+            repo.create_reservation(room_id, "user", res_start, res_start + timedelta(minutes=30))
+
+        tick_secs = []
+        step_secs = []
+        current = start
+        for _ in range(ticks):
+            for room_id in rng.sample(room_ids, int(rooms_count * flip_rate)):
+                provider = providers[room_id]
+                provider.set_occupied(not provider.get_is_occupied(current))
+            tick_secs.append(engine.tick(current)["tick_sec"])
+            if kind == "batch":
+                step_secs.append(engine.stats()["last_step_sec"])
+            current += timedelta(seconds=tick_sec)
+        engine.stop()
+
+        # 最初の tick は全部屋の対象予約を選ぶので、定常状態の統計からは外す
+        results[kind] = statistics.median(tick_secs[1:] or tick_secs)
+        if step_secs:
+            results["step"] = statistics.median(step_secs[1:] or step_secs)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rooms", type=int, default=100, help="差分検証の部屋数")
+    parser.add_argument("--per-room", type=int, default=4, help="差分検証の1部屋あたりの予約数")
+    parser.add_argument("--diff-tick-sec", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bench-rooms", default="1000,10000", help="速度計測の部屋数（空なら計測しない）")
+    parser.add_argument("--ticks", type=int, default=30)
+    parser.add_argument("--flip-rate", type=float, default=0.01)
+    parser.add_argument("--tick-sec", type=float, default=60.0)
+    args = parser.parse_args()
+
+    # 状態遷移・ペナルティのログは出さない
+    with contextlib.redirect_stdout(io.StringIO()) as buf:
+        mismatches = differential(args.rooms, args.per_room, args.diff_tick_sec, args.seed)
+    print(next(line for line in buf.getvalue().splitlines() if line.startswith("differential:")))
+
+    if args.bench_rooms:
+        print(f"ticks={args.ticks} flip_rate={args.flip_rate} tick_sec={args.tick_sec}")
+        print(f"{'rooms':>8} {'engine p50':>11} {'batch p50':>10} {'step p50':>9}")
+        for rooms in (int(r) for r in args.bench_rooms.split(",")):
+            with contextlib.redirect_stdout(io.StringIO()):
+                r = bench(rooms, args.ticks, args.flip_rate, args.tick_sec)
+            print(
+                f"{rooms:>8} {r['engine'] * 1000:>9.1f}ms {r['batch'] * 1000:>8.1f}ms "
+                f"{r['step'] * 1000:>7.2f}ms"
+            )
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
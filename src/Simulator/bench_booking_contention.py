@@ -0,0 +1,138 @@
+"""
+SqliteReservationRepository.create_reservation の同時実行の計測と二重予約の検証。
+
+一時 DB に対して --threads 本のスレッドが、少数の部屋・少数の枠に向けて同時に予約を作り続ける
+（どの枠も複数スレッドが同時に取りに行く）。1つのリポジトリを全スレッドで共有する
+（Flask の threaded サーバーと同じ）。最後に CANCELLED 以外の予約をすべて読み、
+バッファ込みで重なる組が1つでもあれば二重予約として終了コード 1。
+
+表示するのは、コミットされた予約数と毎秒の件数、重複で断った件数、
+SQLITE_BUSY のまま諦めた件数、BEGIN IMMEDIATE のやり直し回数。
+
+    $ cd src && python -m Simulator.bench_booking_contention --threads 16 --attempts 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from Domain.reservation import ReservationStatus
+from Repository import db
+from Repository.reservation_repository import SqliteReservationRepository
+from time_utils import JST
+
+DAY = datetime(2025, 1, 6, tzinfo=JST)
+
+
+def overlaps(repo: SqliteReservationRepository, room_ids: List[str]) -> int:
+    """
+    CANCELLED 以外の予約で、バッファ込みで重なる組の数を返す。
+    """
+    B = repo._buffer
+    found = 0
+    for room_id in room_ids:
+        res_list = [
+            r
+            for r in repo.get_reservations_for_room(room_id)
+            if r.status != ReservationStatus.CANCELLED
+        ]
+        for i, a in enumerate(res_list):
+            for b in res_list[i + 1 :]:
+                if b.start_time - B >= a.end_time:
+                    break
+                if a.end_time > b.start_time - B and a.start_time < b.end_time + B:
+                    found += 1
+                    if found <= 10:
+                        print(f"  double booking: {a} / {b}", file=sys.stderr)
+    return found
+
+
+def run(threads: int, attempts: int, rooms: int, slots: int, cancel_rate: float, seed: int) -> Dict:
+    repo = SqliteReservationRepository(buffer_minutes=5)
+    room_ids = [f"room-{i:02d}" for i in range(rooms)]
+    counts: Counter = Counter()
+    counts_lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker(n: int) -> None:
+        rng = random.Random(seed * 1000 + n)
+        local: Counter = Counter()
+        barrier.wait()
+        for _ in range(attempts):
+            room_id = rng.choice(room_ids)
+            # 15 分刻みの開始時刻に 15〜45 分の予約。隣り合う枠ともバッファ込みでぶつかる
+            start = DAY + timedelta(minutes=15 * rng.randrange(slots))
+            end = start + timedelta(minutes=rng.choice([15, 30, 45]))
+            try:
+                res = repo.create_reservation(room_id, f"user-{n}", start, end)
+                local["committed"] += 1
+                if rng.random() < cancel_rate:
+                    repo.cancel_reservation(res.reservation_id)
+                    local["cancelled"] += 1
+            except ValueError:
+                local["conflict"] += 1
+            except sqlite3.OperationalError:
+                local["busy"] += 1
+        with counts_lock:
+            counts.update(local)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "elapsed": elapsed,
+        "counts": counts,
+        "double": overlaps(repo, room_ids),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--attempts", type=int, default=500, help="1スレッドあたりの予約の試行回数")
+    parser.add_argument("--rooms", type=int, default=2)
+    parser.add_argument("--slots", type=int, default=200, help="1部屋あたりの開始時刻の候補数（15 分刻み）")
+    parser.add_argument("--cancel-rate", type=float, default=0.3, help="作った予約をすぐキャンセルする割合")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_PATH"] = os.path.join(tmp, "contention.db")
+        db.init_db()
+        before = db.connection_stats()
+        r = run(args.threads, args.attempts, args.rooms, args.slots, args.cancel_rate, args.seed)
+        after = db.connection_stats()
+        del os.environ["DB_PATH"]
+
+    c = r["counts"]
+    print(
+        f"threads={args.threads} attempts={args.threads * args.attempts} "
+        f"rooms={args.rooms} slots={args.slots} cancel_rate={args.cancel_rate}"
+    )
+    print(
+        f"committed={c['committed']} ({c['committed'] / r['elapsed']:.0f}/s) "
+        f"cancelled={c['cancelled']} conflict={c['conflict']} busy={c['busy']} "
+        f"busy_retries={after['busy_retries'] - before['busy_retries']} "
+        f"elapsed={r['elapsed']:.2f}s"
+    )
+    print(f"double_bookings={r['double']}")
+    sys.exit(1 if r["double"] else 0)
+
+
+if __name__ == "__main__":
+    main()
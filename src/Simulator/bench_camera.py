@@ -0,0 +1,123 @@
+"""
+カメラ経路のエンドツーエンド・ベンチマーク。
+
+FakeConsoleServer を立ち上げ、数百台の仮想デバイスを FleetPoller で取得して
+1 tick あたりのレイテンシ (p50 / p95 / max) とスループットを表示する。
+
+    $ cd src && python -m Simulator.bench_camera --devices 300 --ticks 10 --latency-ms 30
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+
+from Repository.ai_camera_repository import AiCameraRepository
+from Repository.http_client import ConsoleHttpClient
+from Services.decode_pool import DecodePool
+from Services.fleet_poller import FleetPoller
+from Services.occupancy_provider import FleetOccupancyProvider
+from Simulator.console_server import FakeConsoleConfig, FakeConsoleServer
+
+
+def _percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--ticks", type=int, default=10)
+    parser.add_argument("--tick-interval", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=32, help="同時リクエスト数")
+    parser.add_argument("--decode-workers", type=int, default=0)
+    parser.add_argument("--decode-kind", default="thread")
+    parser.add_argument("--max-objects", type=int, default=5)
+    parser.add_argument("--frame-interval", type=float, default=1.0)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--hang-sec", type=float, default=5.0)
+    parser.add_argument("--read-timeout", type=float, default=2.0)
+    parser.add_argument("--no-area-count", action="store_true")
+    args = parser.parse_args()
+
+    server = FakeConsoleServer(
+        FakeConsoleConfig(
+            max_objects=args.max_objects,
+            frame_interval_sec=args.frame_interval,
+            latency_ms=args.latency_ms,
+            latency_jitter_ms=args.latency_jitter_ms,
+            error_rate=args.error_rate,
+            hang_rate=args.hang_rate,
+            hang_sec=args.hang_sec,
+            with_area_count=not args.no_area_count,
+        )
+    ).start()
+
+    http = ConsoleHttpClient(
+        pool_connections=4,
+        pool_maxsize=args.workers,
+        read_timeout=args.read_timeout,
+        total_retries=0,
+    )
+    repo = AiCameraRepository(
+        console_endpoint=server.base_url,
+        auth_endpoint=server.auth_url,
+        client_id="bench",
+        client_secret="bench",
+        device_id="dev-0",
+        http_client=http,
+    )
+    decode_pool = (
+        DecodePool(workers=args.decode_workers, kind=args.decode_kind)
+        if args.decode_workers > 0
+        else None
+    )
+    poller = FleetPoller(repo, max_workers=args.workers, decode_pool=decode_pool)
+    device_ids = [f"dev-{i}" for i in range(args.devices)]
+    # 1部屋1カメラとして登録する
+    for device_id in device_ids:
+        poller.register(FleetOccupancyProvider([device_id]))
+
+    tick_secs = []
+    failures = 0
+    started = time.perf_counter()
+    for _ in range(args.ticks):
+        t0 = time.perf_counter()
+        results = poller.poll_once()
+        tick_secs.append(time.perf_counter() - t0)
+        failures += sum(1 for ok in results.values() if not ok)
+        if args.tick_interval:
+            time.sleep(args.tick_interval)
+    total = time.perf_counter() - started
+
+    fetches = args.devices * args.ticks
+    print(f"devices={args.devices} ticks={args.ticks} workers={args.workers}")
+    print(
+        f"tick latency: p50={statistics.median(tick_secs) * 1000:.1f}ms "
+        f"p95={_percentile(tick_secs, 95) * 1000:.1f}ms "
+        f"max={max(tick_secs) * 1000:.1f}ms"
+    )
+    print(f"throughput: {fetches / total:.0f} device fetches/sec, failures={failures}")
+    stats = repo.get_stats()
+    print(f"token: {stats['token']}")
+    print(
+        f"http: connections_opened={stats['http']['connections_opened']} "
+        f"requests={stats['http']['requests']} reused={stats['http']['reused']}"
+    )
+    print(f"decode: {stats['decode']}")
+    if decode_pool is not None:
+        print(f"decode_pool: {decode_pool.stats()}")
+    print(f"server: {server.stats()}")
+
+    poller.shutdown()
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
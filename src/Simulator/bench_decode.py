@@ -0,0 +1,92 @@
+"""
+ObjectDetectionTop デコードのベンチマーク。
+
+生成コード (SmartCamera.*) のアクセサで1件ずつ辿る従来の方法と、
+Repository.detection_decoder の一括デコード（配列）・配列経由の dict・dict への直接デコード
+（AiCameraRepository の既定の dict 形式）を比較する。
+BoundingBox を持たない検出が混じったペイロードで、dict のキー（元の番号）が一致することも確かめる。
+
+    $ cd src && python -m Simulator.bench_decode
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from Repository.detection_decoder import (
+    decode_detections,
+    decode_detections_dict,
+    detections_to_dict,
+)
+from Simulator.payload_factory import build_object_detection_payload, random_detections
+from SmartCamera import BoundingBox
+from SmartCamera import BoundingBox2d
+from SmartCamera import ObjectDetectionTop
+
+
+def decode_with_accessors(buf: bytes) -> dict:
+    """
+    AiCameraRepository が以前行っていた、生成コードのアクセサによるデコード。
+    """
+    result = {}
+    ppl_out = ObjectDetectionTop.ObjectDetectionTop.GetRootAsObjectDetectionTop(buf, 0)
+    obj_data = ppl_out.Perception()
+    for i in range(obj_data.ObjectDetectionListLength()):
+        obj_list = obj_data.ObjectDetectionList(i)
+        if obj_list.BoundingBoxType() == BoundingBox.BoundingBox.BoundingBox2d:
+            bbox_2d = BoundingBox2d.BoundingBox2d()
+            bbox_2d.Init(obj_list.BoundingBox().Bytes, obj_list.BoundingBox().Pos)
+            result[str(i + 1)] = {
+                "C": obj_list.ClassId(),
+                "P": obj_list.Score(),
+                "X": bbox_2d.Left(),
+                "Y": bbox_2d.Top(),
+                "x": bbox_2d.Right(),
+                "y": bbox_2d.Bottom(),
+            }
+    return result
+
+
+def _time_per_call(fn, buf: bytes, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(buf)
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="1,10,50,200,1000")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{'objects':>8} {'accessors':>12} {'array':>12} {'array+dict':>12} {'dict':>12} {'speedup':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        buf = build_object_detection_payload(random_detections(size, rng))
+
+        # 結果が一致することを確認してから計測する（BoundingBox なしの検出が混じる場合も）
+        mixed = build_object_detection_payload(
+            [d if rng.random() < 0.7 else None for d in random_detections(size + 2, rng)]
+        )
+        for b in (buf, mixed):
+            expected = decode_with_accessors(b)
+            if expected != detections_to_dict(decode_detections(b)) or expected != decode_detections_dict(b):
+                raise SystemExit(f"decoder mismatch for {size} objects")
+
+        t_ref = _time_per_call(decode_with_accessors, buf, args.repeat)
+        t_arr = _time_per_call(decode_detections, buf, args.repeat)
+        t_dict = _time_per_call(
+            lambda b: detections_to_dict(decode_detections(b)), buf, args.repeat
+        )
+        t_direct = _time_per_call(decode_detections_dict, buf, args.repeat)
+        print(
+            f"{size:>8} {t_ref * 1e6:>10.1f}us {t_arr * 1e6:>10.1f}us "
+            f"{t_dict * 1e6:>10.1f}us {t_direct * 1e6:>10.1f}us {t_ref / t_arr:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+DecodePool のスループット計測。
+
+合成ペイロードを大量に投入し、ワーカー数・プール種別ごとの frames/sec を表示する。
+
+    $ cd src && python -m Simulator.bench_decode_pool --frames 2000 --objects 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import random
+import threading
+import time
+
+from Services.decode_pool import DecodePool
+from Simulator.payload_factory import build_object_detection_payload, random_detections
+
+
+def make_payloads(count: int, objects: int, with_area_count: bool) -> list:
+    rng = random.Random(0)
+    payloads = []
+    for _ in range(count):
+        detections = random_detections(objects, rng)
+        area_counts = None
+        if with_area_count:
+            area_counts = {}
+            for d in detections:
+                area_counts[d[0]] = area_counts.get(d[0], 0) + 1
+        buf = build_object_detection_payload(detections, area_counts)
+        payloads.append(base64.b64encode(buf).decode("ascii"))
+    return payloads
+
+
+def run(pool: DecodePool, payloads: list) -> float:
+    """
+    全ペイロードを投入し、全部デコードし終わるまでの frames/sec を返す。
+    デバイスごとの間引きが起きないよう、1フレーム1デバイスとして投入する。
+    """
+    done = threading.Event()
+    remaining = [len(payloads)]
+    lock = threading.Lock()
+
+    def on_done(device_id: str, counts: dict) -> None:
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                done.set()
+
+    started = time.perf_counter()
+    for i, payload in enumerate(payloads):
+        pool.submit(f"dev-{i}", payload, on_done)
+    done.wait()
+    return len(payloads) / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--objects", type=int, default=50)
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--kinds", default="thread,process")
+    parser.add_argument(
+        "--area-count",
+        action="store_true",
+        help="AreaCount 付きペイロードで計測する（bbox デコードを通らない）",
+    )
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.frames, args.objects, args.area_count)
+    print(f"{args.frames} frames x {args.objects} objects, area_count={args.area_count}")
+    print(f"{'kind':>8} {'workers':>8} {'frames/sec':>12}")
+    for kind in args.kinds.split(","):
+        for workers in (int(w) for w in args.workers.split(",")):
+            pool = DecodePool(
+                workers=workers, kind=kind, prefer_area_count=args.area_count
+            )
+            # プロセス起動などのウォームアップ
+            run(pool, payloads[: workers * 2])
+            fps = run(pool, payloads)
+            pool.shutdown()
+            print(f"{kind:>8} {workers:>8} {fps:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
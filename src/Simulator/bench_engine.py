@@ -0,0 +1,107 @@
+"""
+MonitoringEngine のスケール計測。
+
+部屋数を変えながら、部屋ごとに予約を入れ、毎 tick 一定割合の部屋の占有状態を切り替えて
+tick の所要時間 (p50 / p95 / max) と評価した部屋数を表示する。
+仮想時刻を tick ごとに進めるので、予約ウィンドウ・ノーショーなどの期限もその間に発生する。
+
+    $ cd src && python -m Simulator.bench_engine --rooms 1000,5000,10000 --ticks 30
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import random
+import statistics
+from datetime import datetime, timedelta
+
+from Domain.room import Room
+from Repository.penalty_repository import InMemoryPenaltyRepository
+from Repository.reservation_repository import InMemoryReservationRepository
+from Services.monitoring_engine import MonitoringEngine
+from Services.occupancy_provider import DummyOccupancyProvider
+from Services.penalty_service import PenaltyService
+from time_utils import JST
+
+
+def run(rooms: int, ticks: int, workers: int, flip_rate: float, tick_sec: float) -> dict:
+    rng = random.Random(rooms)
+    start = datetime(2025, 1, 6, 9, 0, tzinfo=JST)
+
+    reservation_repo = InMemoryReservationRepository(buffer_minutes=5)
+    providers = {}
+
+    def provider_factory(room: Room) -> DummyOccupancyProvider:
+        providers[room.room_id] = DummyOccupancyProvider(initial=False)
+        return providers[room.room_id]
+
+    engine = MonitoringEngine(
+        reservation_repo,
+        PenaltyService(InMemoryPenaltyRepository()),
+        provider_factory,
+        workers=workers,
+    )
+    room_ids = [f"room-{i:05d}" for i in range(rooms)]
+    engine.add_rooms(Room(room_id=r) for r in room_ids)
+    for room_id in room_ids:
+        res_start = start + timedelta(minutes=rng.randint(0, 60))
+        reservation_repo.create_reservation(
+            room_id, "user", res_start, res_start + timedelta(minutes=30)
+        )
+
+    tick_secs = []
+    evaluated = []
+    current = start
+    for _ in range(ticks):
+        for room_id in rng.sample(room_ids, int(rooms * flip_rate)):
+            provider = providers[room_id]
+            provider.set_occupied(not provider.get_is_occupied(current))
+        stats = engine.tick(current)
+        tick_secs.append(stats["tick_sec"])
+        evaluated.append(stats["evaluated"])
+        current += timedelta(seconds=tick_sec)
+    engine.stop()
+
+    # 最初の tick は全部屋を評価するので、定常状態の統計からは外す
+    steady = sorted(tick_secs[1:]) or tick_secs
+    return {
+        "first_tick": tick_secs[0],
+        "p50": statistics.median(steady),
+        "p95": steady[min(len(steady) - 1, int(len(steady) * 0.95))],
+        "max": steady[-1],
+        "evaluated": statistics.mean(evaluated[1:] or evaluated),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rooms", default="1000,5000,10000")
+    parser.add_argument("--ticks", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--flip-rate", type=float, default=0.01, help="1 tick で占有状態が変わる部屋の割合")
+    parser.add_argument("--tick-sec", type=float, default=60.0, help="1 tick で進める仮想時間")
+    args = parser.parse_args()
+
+    print(
+        f"workers={args.workers} ticks={args.ticks} flip_rate={args.flip_rate} "
+        f"tick_sec={args.tick_sec}"
+    )
+    print(
+        f"{'rooms':>8} {'first':>9} {'p50':>9} {'p95':>9} {'max':>9} "
+        f"{'eval/tick':>10} {'us/room':>8}"
+    )
+    for rooms in (int(r) for r in args.rooms.split(",")):
+        # 状態遷移・ペナルティのログは出さない
+        with contextlib.redirect_stdout(io.StringIO()):
+            r = run(rooms, args.ticks, args.workers, args.flip_rate, args.tick_sec)
+        print(
+            f"{rooms:>8} {r['first_tick'] * 1000:>7.1f}ms {r['p50'] * 1000:>7.1f}ms "
+            f"{r['p95'] * 1000:>7.1f}ms {r['max'] * 1000:>7.1f}ms "
+            f"{r['evaluated']:>10.0f} {r['p50'] / rooms * 1e6:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+ConsoleHttpClient（keep-alive のコネクションプール）と、素の requests.get / requests.post
+（呼び出しごとに新しい接続）の1回あたりの所要時間の比較。
+
+FakeConsoleServer をローカルで起動し、トークン取得 (POST /auth) と推論結果の取得
+(GET /inferenceresults/devices/<id>) をそれぞれ --calls 回ずつ順番に呼んで、
+p50 / p95 と、開いた接続数・再利用した回数を表示する。
+
+    $ cd src && python -m Simulator.bench_http_client --calls 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from typing import Callable, Dict, List
+
+import requests
+
+from Repository.http_client import ConsoleHttpClient
+from Simulator.console_server import FakeConsoleConfig, FakeConsoleServer
+
+AUTH_DATA = {"grant_type": "client_credentials", "scope": "system"}
+
+
+def _time_calls(fn: Callable[[], requests.Response], calls: int) -> List[float]:
+    timings = []
+    for _ in range(calls):
+        t0 = time.perf_counter()
+        resp = fn()
+        resp.content
+        if resp.status_code != 200:
+            raise SystemExit(f"unexpected status {resp.status_code}")
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def run(server: FakeConsoleServer, calls: int, pooled: bool) -> Dict:
+    client = ConsoleHttpClient() if pooled else None
+    get = client.get if pooled else requests.get
+    post = client.post if pooled else requests.post
+
+    token = post(server.auth_url, data=AUTH_DATA, auth=("bench", "bench"), timeout=5).json()[
+        "access_token"
+    ]
+    url = f"{server.base_url}/inferenceresults/devices/dev-0?limit=1&scope=full"
+    headers = {"Authorization": f"Bearer {token}"}
+
+    timings = {
+        "POST /auth": _time_calls(
+            lambda: post(server.auth_url, data=AUTH_DATA, auth=("bench", "bench"), timeout=5),
+            calls,
+        ),
+        "GET /inferenceresults": _time_calls(
+            lambda: get(url, headers=headers, timeout=5), calls
+        ),
+    }
+    if pooled:
+        stats = client.stats()
+        client.close()
+        connections = stats["connections_opened"]
+        reused = stats["reused"]
+    else:
+        # requests.get / post は呼び出しごとに使い捨てのセッションを作るので、毎回新しい接続になる
+        connections = 2 * calls + 1
+        reused = 0
+    return {"timings": timings, "connections_opened": connections, "reused": reused}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=500, help="エンドポイントごとの呼び出し回数")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="サーバー側で足す応答遅延")
+    args = parser.parse_args()
+
+    server = FakeConsoleServer(FakeConsoleConfig(latency_ms=args.latency_ms)).start()
+    try:
+        print(f"calls={args.calls} latency_ms={args.latency_ms}")
+        print(f"{'':9} {'endpoint':<24} {'p50':>9} {'p95':>9}")
+        for label, pooled in (("no pool", False), ("pool", True)):
+            r = run(server, args.calls, pooled)
+            for name, secs in r["timings"].items():
+                secs.sort()
+                p95 = secs[min(len(secs) - 1, int(len(secs) * 0.95))]
+                print(
+                    f"{label:9} {name:<24} {statistics.median(secs) * 1000:>7.2f}ms "
+                    f"{p95 * 1000:>7.2f}ms"
+                )
+            print(
+                f"{label:9} connections_opened={r['connections_opened']} reused={r['reused']}"
+            )
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+InMemoryReservationRepository の同時実行のストレステスト。
+
+部屋数とスレッド数を変えながら、各スレッドが予約の作成・キャンセル・mark_used・
+get_reservations_for_room をランダムに混ぜて呼び続け、毎秒の操作数を測る。
+ロックを 1 本にした場合（lock_stripes=1、部屋をまたいで全部の書き込みが直列になる）と、
+既定の部屋ごとのロックを比べる。
+
+各組み合わせの後に整合性を確かめ、崩れていれば終了コード 1:
+- CANCELLED 以外の予約がバッファ込みで重なっていない
+- 区間索引の件数が CANCELLED 以外の予約数と一致する
+- 予約リスト・ID 索引・部屋ごとの ID 集合の件数が一致する
+- 想定外の例外（ValueError 以外）が出ていない
+
+    $ cd src && python -m Simulator.bench_reservation_concurrency --rooms 1,16,256 --threads 1,4,16
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from Domain.reservation import ReservationStatus
+from Repository.reservation_repository import InMemoryReservationRepository
+from time_utils import JST
+
+DAY = datetime(2025, 1, 6, tzinfo=JST)
+
+
+def check(repo: InMemoryReservationRepository, room_ids: List[str]) -> List[str]:
+    """
+    整合性の崩れを文字列のリストで返す（空なら問題なし）。
+    """
+    problems = []
+    B = repo._buffer
+    total = 0
+    for room_id in room_ids:
+        res_list = repo.get_reservations_for_room(room_id)
+        total += len(res_list)
+        live = [r for r in res_list if r.status != ReservationStatus.CANCELLED]
+        for a, b in zip(live, live[1:]):
+            if b.start_time < a.end_time + B:
+                problems.append(f"overlap in {room_id}: {a.reservation_id} / {b.reservation_id}")
+        intervals = repo._intervals_by_room.get(room_id)
+        if len(live) != (len(intervals) if intervals is not None else 0):
+            problems.append(f"interval index size mismatch in {room_id}")
+        if {r.reservation_id for r in res_list} != repo.get_reservation_ids_for_room(room_id):
+            problems.append(f"id set mismatch in {room_id}")
+    if total != len(repo._reservations_by_id):
+        problems.append(f"id index size {len(repo._reservations_by_id)} != {total}")
+    return problems
+
+
+def run(rooms: int, threads: int, ops: int, stripes: int, seed: int) -> Dict:
+    repo = InMemoryReservationRepository(buffer_minutes=5, lock_stripes=stripes)
+    room_ids = [f"room-{i:04d}" for i in range(rooms)]
+    errors: List[str] = []
+    barrier = threading.Barrier(threads)
+
+    def worker(n: int) -> None:
+        rng = random.Random(seed * 1000 + n)
+        mine: List[str] = []
+        barrier.wait()
+        for _ in range(ops):
+            op = rng.random()
+            try:
+                if op < 0.5 or not mine:
+                    room_id = rng.choice(room_ids)
+                    start = DAY + timedelta(minutes=15 * rng.randrange(2000))
+                    res = repo.create_reservation(
+                        room_id, f"user-{n}", start, start + timedelta(minutes=rng.choice([15, 30]))
+                    )
+                    mine.append(res.reservation_id)
+                elif op < 0.6:
+                    repo.cancel_reservation(rng.choice(mine))
+                elif op < 0.75:
+                    repo.mark_used(rng.choice(mine))
+                else:
+                    repo.get_reservations_for_room(rng.choice(room_ids))
+            except ValueError:
+                pass
+            except Exception:
+                errors.append(traceback.format_exc())
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "ops_per_sec": threads * ops / elapsed,
+        "problems": check(repo, room_ids) + errors,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rooms", default="1,16,256")
+    parser.add_argument("--threads", default="1,4,16")
+    parser.add_argument("--ops", type=int, default=5000, help="1スレッドあたりの操作数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    failures = 0
+    print(f"ops/thread={args.ops}")
+    print(f"{'rooms':>6} {'threads':>8} {'1 lock':>12} {'per room':>12}")
+    for rooms in (int(r) for r in args.rooms.split(",")):
+        for threads in (int(t) for t in args.threads.split(",")):
+            line = f"{rooms:>6} {threads:>8}"
+            for stripes in (1, 64):
+                r = run(rooms, threads, args.ops, stripes, args.seed)
+                line += f" {r['ops_per_sec']:>10.0f}/s"
+                for problem in r["problems"][:5]:
+                    print(f"  {problem}", file=sys.stderr)
+                failures += len(r["problems"])
+            print(line)
+    print(f"problems={failures}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
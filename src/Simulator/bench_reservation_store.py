@@ -0,0 +1,353 @@
+"""
+InMemoryReservationRepository の計測。
+
+--mode lookup (既定):
+    保存済み予約の件数を変えながら、監視ループ1 tick 分の処理
+    （監視対象の部屋ごとに RoomStateManager.update_state）と get_reservation_by_id の時間を測る。
+    "scan" は索引を使わずに全部屋・全予約を走査した場合（索引導入前の get_reservation_by_id）の参考値。
+--mode insert:
+    1部屋に予約をランダムな順で入れ、1件あたりの作成時間と、重複する予約を作ろうとしたときの
+    重複チェック（ValueError になるまで）の時間を測る。
+    "linear" は部屋の全予約を走査する重複チェック（区間索引導入前）の参考値。
+--mode sqlite:
+    SqliteReservationRepository で、1部屋の過去予約の件数を変えながら
+    create_reservation（成功 / 重複で失敗）の1件あたりの時間を測る。DB は一時ファイルに作る。
+--mode query:
+    1部屋の過去予約（1000人分）の件数を変えながら、1人の利用者のこれからの予約を
+    query_reservations で読む時間を両方のバックエンドで測る。
+    "scan" は部屋の全予約を読んで Python で絞る場合（従来の /api/reservations）の参考値。
+
+    $ cd src && python -m Simulator.bench_reservation_store --sizes 1000,10000,100000,1000000
+    $ cd src && python -m Simulator.bench_reservation_store --mode insert --sizes 100000,1000000
+    $ cd src && python -m Simulator.bench_reservation_store --mode sqlite --sizes 1000,10000,100000
+    $ cd src && python -m Simulator.bench_reservation_store --mode query --sizes 1000,10000,100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from Domain.reservation import Reservation, ReservationStatus
+from Repository.penalty_repository import InMemoryPenaltyRepository
+from Repository.reservation_repository import InMemoryReservationRepository
+from Services.penalty_service import PenaltyService
+from Services.room_state_manager import RoomStateManager
+from time_utils import JST, to_epoch_us
+
+DAY = datetime(2025, 1, 6, tzinfo=JST)
+
+
+def fill(repo: InMemoryReservationRepository, total: int, per_room: int) -> List[str]:
+    """
+    1部屋あたり per_room 件ずつ、合計 total 件の過去予約を入れて room_id の一覧を返す。
+    """
+    room_ids = []
+    for r in range(max(1, total // per_room)):
+        room_id = f"room-{r:05d}"
+        room_ids.append(room_id)
+        start = DAY - timedelta(days=400)
+        for _ in range(per_room):
+            repo.create_reservation(room_id, "user", start, start + timedelta(minutes=30))
+            start += timedelta(hours=1)
+    return room_ids
+
+
+def scan_by_id(repo: InMemoryReservationRepository, reservation_id: str) -> Optional[Reservation]:
+    for room_res_list in repo._reservations_by_room.values():
+        for res in room_res_list:
+            if res.reservation_id == reservation_id:
+                return res
+    return None
+
+
+def run(total: int, per_room: int, monitored: int, ticks: int) -> dict:
+    rng = random.Random(total)
+    repo = InMemoryReservationRepository(buffer_minutes=5)
+    started = time.perf_counter()
+    room_ids = fill(repo, total, per_room)
+    fill_sec = time.perf_counter() - started
+
+    # 監視対象の部屋には今日の予約を1件ずつ入れて、毎 tick その予約を追いかけさせる
+    penalty_service = PenaltyService(InMemoryPenaltyRepository())
+    managers = []
+    for room_id in room_ids[:monitored]:
+        start = DAY.replace(hour=9) + timedelta(minutes=rng.randint(0, 30))
+        repo.create_reservation(room_id, "user", start, start + timedelta(hours=2))
+        managers.append(RoomStateManager(room_id, repo, penalty_service))
+
+    tick_secs = []
+    current = DAY.replace(hour=9)
+    for _ in range(ticks):
+        started = time.perf_counter()
+        for manager in managers:
+            manager.update_state(rng.random() < 0.5, current)
+        tick_secs.append(time.perf_counter() - started)
+        current += timedelta(seconds=5)
+
+    ids = [
+        repo.get_reservations_for_room(room_id)[0].reservation_id
+        for room_id in rng.sample(room_ids, min(10, len(room_ids)))
+    ]
+    started = time.perf_counter()
+    for _ in range(1000):
+        for res_id in ids:
+            repo.get_reservation_by_id(res_id)
+    by_id_sec = (time.perf_counter() - started) / (1000 * len(ids))
+    started = time.perf_counter()
+    for res_id in ids:
+        scan_by_id(repo, res_id)
+    scan_sec = (time.perf_counter() - started) / len(ids)
+
+    return {
+        "fill_sec": fill_sec,
+        "tick": statistics.median(tick_secs[1:] or tick_secs),
+        "monitored": len(managers),
+        "by_id": by_id_sec,
+        "scan": scan_sec,
+    }
+
+
+def linear_conflict(
+    repo: InMemoryReservationRepository, room_id: str, start: datetime, end: datetime
+) -> bool:
+    B = repo._buffer
+    return any(
+        res.status != ReservationStatus.CANCELLED
+        and end > res.start_time - B
+        and start < res.end_time + B
+        for res in repo.get_reservations_for_room(room_id)
+    )
+
+
+def run_insert(total: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    repo = InMemoryReservationRepository(buffer_minutes=5)
+    base = DAY - timedelta(days=total // 24 + 1)
+    # 1時間刻みの枠をランダムな順で埋める（末尾追加だけでなく途中への挿入も起こす）
+    slots = list(range(total))
+    rng.shuffle(slots)
+
+    started = time.perf_counter()
+    last_started = started
+    for n, slot in enumerate(slots):
+        if n == total - min(total, 10_000):
+            last_started = time.perf_counter()
+        start = base + timedelta(hours=slot)
+        repo.create_reservation("room", "user", start, start + timedelta(minutes=30))
+    finished = time.perf_counter()
+    last_count = min(total, 10_000)
+
+    # 既存の枠に重なる予約（バッファ込みで衝突する）を作ろうとして、弾かれるまでの時間
+    probes = [base + timedelta(hours=rng.randrange(total), minutes=40) for _ in range(1000)]
+    started_conflict = time.perf_counter()
+    for start in probes:
+        try:
+            repo.create_reservation("room", "user", start, start + timedelta(minutes=10))
+        except ValueError:
+            pass
+    conflict_sec = (time.perf_counter() - started_conflict) / len(probes)
+
+    linear_probes = probes[:5]
+    started_linear = time.perf_counter()
+    for start in linear_probes:
+        linear_conflict(repo, "room", start, start + timedelta(minutes=10))
+    linear_sec = (time.perf_counter() - started_linear) / len(linear_probes)
+
+    return {
+        "fill_sec": finished - started,
+        "insert": (finished - last_started) / last_count,
+        "conflict": conflict_sec,
+        "linear": linear_sec,
+    }
+
+
+def run_sqlite(total: int, inserts: int = 300) -> dict:
+    """
+    過去予約 total 件を直接 INSERT しておき、その後の create_reservation の時間を測る。
+    """
+    from Repository import db
+    from Repository.reservation_repository import SqliteReservationRepository
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_PATH"] = os.path.join(tmp, "bench.db")
+        db.init_db()
+        base = DAY - timedelta(days=total // 24 + 1)
+        rows = []
+        for n in range(total):
+            start = base + timedelta(hours=n)
+            rows.append(
+                (
+                    f"hist-{n}",
+                    "room",
+                    "user",
+                    start.isoformat(),
+                    (start + timedelta(minutes=30)).isoformat(),
+                    # 1割はキャンセル済み
+                    "CANCELLED" if n % 10 == 0 else "USED",
+                    start.isoformat(),
+                    start.isoformat(),
+                    to_epoch_us(start),
+                    to_epoch_us(start + timedelta(minutes=30)),
+                )
+            )
+        conn = db.get_connection()
+        conn.executemany(
+            "INSERT INTO reservations (reservation_id, room_id, user_id, start_time, end_time,"
+            " status, created_at, updated_at, start_us, end_us)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+        conn.close()
+
+        repo = SqliteReservationRepository(buffer_minutes=5)
+        insert_secs = []
+        conflict_secs = []
+        for n in range(inserts):
+            start = DAY + timedelta(hours=n)
+            t0 = time.perf_counter()
+            repo.create_reservation("room", "user", start, start + timedelta(minutes=30))
+            insert_secs.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            try:
+                repo.create_reservation(
+                    "room", "user", start + timedelta(minutes=10), start + timedelta(minutes=20)
+                )
+            except ValueError:
+                pass
+            conflict_secs.append(time.perf_counter() - t0)
+        del os.environ["DB_PATH"]
+
+    return {
+        "insert": statistics.median(insert_secs),
+        "conflict": statistics.median(conflict_secs),
+    }
+
+
+def run_query(total: int, repeat: int = 200) -> dict:
+    from Repository import db
+    from Repository.reservation_repository import SqliteReservationRepository
+
+    now = DAY.replace(hour=12)
+    base = now - timedelta(hours=total + 1)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_PATH"] = os.path.join(tmp, "bench.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            db.init_db()
+        rows = []
+        memory = InMemoryReservationRepository(buffer_minutes=5)
+        for n in range(total):
+            start = base + timedelta(hours=n)
+            user = f"user-{n % 1000}"
+            memory.create_reservation("room", user, start, start + timedelta(minutes=30))
+            end = start + timedelta(minutes=30)
+            rows.append(
+                (
+                    f"hist-{n}",
+                    "room",
+                    user,
+                    start.isoformat(),
+                    end.isoformat(),
+                    "USED",
+                    start.isoformat(),
+                    start.isoformat(),
+                    to_epoch_us(start),
+                    to_epoch_us(end),
+                )
+            )
+        conn = db.get_connection()
+        conn.executemany(
+            "INSERT INTO reservations (reservation_id, room_id, user_id, start_time, end_time,"
+            " status, created_at, updated_at, start_us, end_us)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+        conn.close()
+        sqlite_repo = SqliteReservationRepository(buffer_minutes=5)
+        # 対象の利用者のこれからの予約を 20 件
+        for n in range(20):
+            start = now + timedelta(hours=n + 1)
+            for repo in (memory, sqlite_repo):
+                repo.create_reservation("room", "target", start, start + timedelta(minutes=30))
+
+        for name, repo in (("memory", memory), ("sqlite", sqlite_repo)):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                page, _ = repo.query_reservations(
+                    room_id="room", user_id="target", start_from=now, limit=20
+                )
+            results[name] = (time.perf_counter() - started) / repeat
+            assert len(page) == 20
+            started = time.perf_counter()
+            for _ in range(5):
+                [
+                    r for r in repo.get_reservations_for_room("room")
+                    if r.user_id == "target" and r.start_time >= now
+                ]
+            results[name + "_scan"] = (time.perf_counter() - started) / 5
+        del os.environ["DB_PATH"]
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mode", choices=("lookup", "insert", "sqlite", "query"), default="lookup")
+    parser.add_argument("--sizes", default=None, help="保存済み予約の件数（insert では1部屋あたり）")
+    parser.add_argument("--per-room", type=int, default=100)
+    parser.add_argument("--monitored", type=int, default=100, help="tick で評価する部屋数")
+    parser.add_argument("--ticks", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.mode == "query":
+        print(f"{'history':>9} {'memory':>9} {'scan':>9} {'sqlite':>9} {'scan':>9}")
+        for total in (int(s) for s in (args.sizes or "1000,10000,100000").split(",")):
+            r = run_query(total)
+            print(
+                f"{total:>9} {r['memory'] * 1e6:>7.1f}us {r['memory_scan'] * 1000:>7.2f}ms "
+                f"{r['sqlite'] * 1e6:>7.1f}us {r['sqlite_scan'] * 1000:>7.2f}ms"
+            )
+        return
+
+    if args.mode == "sqlite":
+        print(f"{'history':>9} {'insert p50':>11} {'conflict p50':>13}")
+        for total in (int(s) for s in (args.sizes or "1000,10000,100000").split(",")):
+            r = run_sqlite(total)
+            print(f"{total:>9} {r['insert'] * 1000:>9.2f}ms {r['conflict'] * 1000:>11.2f}ms")
+        return
+
+    if args.mode == "insert":
+        print(f"{'per_room':>9} {'fill':>8} {'insert':>9} {'conflict':>9} {'linear':>10}")
+        for total in (int(s) for s in (args.sizes or "100000,1000000").split(",")):
+            r = run_insert(total)
+            print(
+                f"{total:>9} {r['fill_sec']:>7.1f}s {r['insert'] * 1e6:>7.1f}us "
+                f"{r['conflict'] * 1e6:>7.1f}us {r['linear'] * 1000:>8.1f}ms"
+            )
+        return
+
+    print(f"per_room={args.per_room} monitored={args.monitored} ticks={args.ticks}")
+    print(f"{'stored':>9} {'fill':>8} {'tick p50':>9} {'us/room':>8} {'by_id':>8} {'scan':>10}")
+    for total in (int(s) for s in (args.sizes or "1000,10000,100000,1000000").split(",")):
+        # 状態遷移・ペナルティのログは出さない
+        with contextlib.redirect_stdout(io.StringIO()):
+            r = run(total, args.per_room, args.monitored, args.ticks)
+        print(
+            f"{total:>9} {r['fill_sec']:>7.1f}s {r['tick'] * 1000:>7.2f}ms "
+            f"{r['tick'] / r['monitored'] * 1e6:>8.2f} {r['by_id'] * 1e6:>6.2f}us "
+            f"{r['scan'] * 1000:>8.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+SqliteReservationRepository の区間検索 SQL が索引を使っているかの確認。
+
+一時 DB に init_db() でスキーマを作り、_INDEXED_QUERIES の各 SQL と、
+query_reservations が組み立てる代表的な SQL の EXPLAIN QUERY PLAN を表示する。
+reservations を索引なしで全件走査する ("SCAN reservations") か、
+結果全体を並べ替える一時 B-tree ("USE TEMP B-TREE FOR ORDER BY") を使う SQL があれば終了コード 1。
+（同じ開始時刻の中だけを reservation_id で並べる "RIGHT PART OF ORDER BY" は許す）
+
+    $ cd src && python -m Simulator.check_query_plans
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+
+from datetime import datetime
+
+from Domain.reservation import ReservationStatus
+from Repository import db
+from Repository.reservation_repository import SqliteReservationRepository
+from time_utils import JST
+
+# EXPLAIN に渡す仮の値（プランは値によらない）
+PARAMS = {
+    "room_id": "room",
+    "t": 1736121600000000,
+    "since": 1736121600000000,
+    "until": 1736125200000000,
+    "cancelled": "CANCELLED",
+    "active": "ACTIVE",
+    "used": "USED",
+    "limit": 10,
+}
+
+
+DAY = datetime(2025, 1, 6, tzinfo=JST)
+CURSOR = "1736121600000000:room-1736121600"
+
+
+def queries():
+    """
+    (名前, SQL, パラメータ) を返す。
+    """
+    for name, sql in SqliteReservationRepository._INDEXED_QUERIES.items():
+        yield name, sql, PARAMS
+    build = SqliteReservationRepository._reservation_query
+    yield ("query: user upcoming", *build(None, "user", DAY, None, None, 100, None))
+    yield ("query: user page 2", *build(None, "user", DAY, None, None, 100, CURSOR))
+    yield ("query: room day", *build("room", None, DAY, DAY.replace(hour=23), None, 100, None))
+    yield (
+        "query: room+user active",
+        *build("room", "user", DAY, None, [ReservationStatus.ACTIVE], 100, CURSOR),
+    )
+
+
+def check(conn) -> int:
+    failures = 0
+    for name, sql, params in queries():
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        bad = [
+            detail
+            for detail in plan
+            if detail == "SCAN reservations" or detail == "USE TEMP B-TREE FOR ORDER BY"
+        ]
+        print(f"{name}: {'NG' if bad else 'ok'}")
+        for detail in plan:
+            print(f"    {detail}")
+        failures += bool(bad)
+    return failures
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_PATH"] = os.path.join(tmp, "plans.db")
+        db.init_db()
+        conn = db.get_connection()
+        # 統計がないと件数の少ない表で索引を使わないプランになりうるので、実運用に近い統計を入れる
+        conn.execute("ANALYZE")
+        failures = check(conn)
+        conn.close()
+        del os.environ["DB_PATH"]
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
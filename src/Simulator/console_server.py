@@ -0,0 +1,288 @@
+"""
+コンソール API のスタンドイン（負荷試験・障害試験用）。
+
+認証エンドポイントと /inferenceresults/devices/<device_id> を実装し、
+SmartCamera の Builder 関数で組み立てた本物と同じ形式のペイロードを返す。
+フレームレート・検出数・応答遅延・エラー率・ハングを設定で変えられる。
+
+    $ cd src && python -m Simulator.console_server --port 8081 --latency-ms 20 --error-rate 0.01
+    # CONSOLE_ENDPOINT=http://localhost:8081 AUTH_ENDPOINT=http://localhost:8081/auth
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import secrets
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from Simulator.payload_factory import (
+    build_inference_item,
+    build_object_detection_payload,
+    random_detections,
+)
+from time_utils import JST
+
+
+class _Server(ThreadingHTTPServer):
+    # 大量の同時接続を受けられるよう、listen backlog を広げておく
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+@dataclass
+class FakeConsoleConfig:
+    """
+    スタンドインの挙動設定。
+    """
+
+    # 1フレームあたりの検出数（min〜max の一様分布）
+    min_objects: int = 0
+    max_objects: int = 5
+    # 各デバイスが何秒ごとに新しいフレームを出すか
+    frame_interval_sec: float = 5.0
+    # 応答遅延（ミリ秒, 平均 latency_ms・標準偏差 latency_jitter_ms の正規分布, 0 未満は 0）
+    latency_ms: float = 0.0
+    latency_jitter_ms: float = 0.0
+    # 推論結果リクエストのうち 500 を返す割合 / ハングさせる割合と時間
+    error_rate: float = 0.0
+    hang_rate: float = 0.0
+    hang_sec: float = 30.0
+    # AreaCount ベクタを付けるか
+    with_area_count: bool = True
+    # 発行するトークンの有効期間
+    token_expires_in: int = 3600
+    # 事前に作っておくペイロードの種類数（リクエストごとに組み立てるとサーバー側が律速になるため）
+    payload_variants: int = 32
+    seed: int = 0
+
+
+class FakeConsoleServer:
+    """
+    FakeConsoleConfig に従って応答するローカル HTTP サーバー。start() で別スレッドで動く。
+    """
+
+    def __init__(
+        self,
+        config: Optional[FakeConsoleConfig] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.config = config or FakeConsoleConfig()
+        self._rng = random.Random(self.config.seed)
+        self._rng_lock = threading.Lock()
+        self._payloads = self._build_payloads()
+        self._tokens: set[str] = set()
+        self._started_at = time.time()
+
+        self._lock = threading.Lock()
+        self._counters = {
+            "auth_requests": 0,
+            "inference_requests": 0,
+            "unauthorized": 0,
+            "injected_errors": 0,
+            "injected_hangs": 0,
+        }
+
+        self._httpd = _Server((host, port), self._make_handler())
+        self._thread: Optional[threading.Thread] = None
+
+    # --- lifecycle ---
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def auth_url(self) -> str:
+        return f"{self.base_url}/auth"
+
+    def start(self) -> "FakeConsoleServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+    # --- payload ---
+
+    def _build_payloads(self) -> list:
+        cfg = self.config
+        payloads = []
+        for _ in range(cfg.payload_variants):
+            n = self._rng.randint(cfg.min_objects, cfg.max_objects)
+            detections = random_detections(n, self._rng)
+            area_counts = None
+            if cfg.with_area_count:
+                area_counts = {}
+                for d in detections:
+                    area_counts[d[0]] = area_counts.get(d[0], 0) + 1
+            payloads.append(build_object_detection_payload(detections, area_counts))
+        return payloads
+
+    def _frames_for(self, device_id: str, limit: int) -> list:
+        """
+        device_id の最新 limit フレームを新しい順に返す。
+        フレーム番号は経過時間から決まるので、同じ時刻に問い合わせれば同じ結果になる。
+        """
+        interval = self.config.frame_interval_sec
+        # デバイスごとに位相をずらして、全デバイスが同時に更新されないようにする
+        phase = (zlib.crc32(device_id.encode()) % 1000) / 1000 * interval
+        elapsed = time.time() - self._started_at + phase
+        latest = int(elapsed // interval)
+
+        items = []
+        for idx in range(latest, max(-1, latest - limit), -1):
+            frame_time = datetime.fromtimestamp(
+                self._started_at - phase + idx * interval, tz=JST
+            )
+            # コンソールの T と同じ yyyyMMddHHmmssfff 形式
+            ts = frame_time.strftime("%Y%m%d%H%M%S") + (
+                f"{frame_time.microsecond // 1000:03d}"
+            )
+            variant = zlib.crc32(f"{device_id}:{idx}".encode()) % len(self._payloads)
+            items.append(build_inference_item(device_id, ts, self._payloads[variant]))
+        return items
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counters[key] += 1
+
+    def _random(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    def _latency_sec(self) -> float:
+        cfg = self.config
+        with self._rng_lock:
+            ms = self._rng.gauss(cfg.latency_ms, cfg.latency_jitter_ms)
+        return max(0.0, ms) / 1000.0
+
+    # --- HTTP ---
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # ヘッダとボディを1回の送信にまとめる（Nagle + 遅延 ACK で 40ms 待たされないように）
+            wbufsize = 64 * 1024
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body: dict) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                if urlparse(self.path).path != "/auth":
+                    self._send_json(404, {"message": "not found"})
+                    return
+                server._count("auth_requests")
+                token = secrets.token_hex(16)
+                with server._lock:
+                    server._tokens.add(token)
+                self._send_json(
+                    200,
+                    {
+                        "access_token": token,
+                        "token_type": "Bearer",
+                        "expires_in": server.config.token_expires_in,
+                    },
+                )
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                prefix = "/inferenceresults/devices/"
+                if not url.path.startswith(prefix):
+                    self._send_json(404, {"message": "not found"})
+                    return
+
+                auth = self.headers.get("Authorization", "")
+                with server._lock:
+                    authorized = auth.removeprefix("Bearer ") in server._tokens
+                if not authorized:
+                    server._count("unauthorized")
+                    self._send_json(401, {"message": "unauthorized"})
+                    return
+
+                server._count("inference_requests")
+                cfg = server.config
+                if cfg.hang_rate and server._random() < cfg.hang_rate:
+                    server._count("injected_hangs")
+                    time.sleep(cfg.hang_sec)
+                else:
+                    time.sleep(server._latency_sec())
+                if cfg.error_rate and server._random() < cfg.error_rate:
+                    server._count("injected_errors")
+                    self._send_json(500, {"message": "injected error"})
+                    return
+
+                device_id = url.path[len(prefix) :]
+                query = parse_qs(url.query)
+                limit = int(query.get("limit", ["1"])[0])
+                self._send_json(200, {"data": server._frames_for(device_id, limit)})
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--min-objects", type=int, default=0)
+    parser.add_argument("--max-objects", type=int, default=5)
+    parser.add_argument("--frame-interval", type=float, default=5.0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--hang-sec", type=float, default=30.0)
+    parser.add_argument("--no-area-count", action="store_true")
+    args = parser.parse_args()
+
+    config = FakeConsoleConfig(
+        min_objects=args.min_objects,
+        max_objects=args.max_objects,
+        frame_interval_sec=args.frame_interval,
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        error_rate=args.error_rate,
+        hang_rate=args.hang_rate,
+        hang_sec=args.hang_sec,
+        with_area_count=not args.no_area_count,
+    )
+    server = FakeConsoleServer(config, host=args.host, port=args.port).start()
+    print(f"Fake console listening on {server.base_url} (auth: {server.auth_url})")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
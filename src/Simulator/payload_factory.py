@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import base64
+import random
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import flatbuffers
+
+from SmartCamera import BoundingBox
+from SmartCamera import BoundingBox2d
+from SmartCamera import CountData
+from SmartCamera import GeneralObject
+from SmartCamera import ObjectDetectionData
+from SmartCamera import ObjectDetectionTop
+
+# (class_id, score, left, top, right, bottom)
+Detection = Tuple[int, float, int, int, int, int]
+
+
+def random_detections(
+    count: int,
+    rng: Optional[random.Random] = None,
+    num_classes: int = 3,
+    width: int = 640,
+    height: int = 480,
+) -> List[Detection]:
+    """
+    ベンチマーク・負荷試験用に、それらしい検出結果を count 件作る。
+    """
+    rng = rng or random.Random()
+    detections = []
+    for _ in range(count):
+        left = rng.randint(0, width - 2)
+        top = rng.randint(0, height - 2)
+        right = rng.randint(left + 1, width)
+        bottom = rng.randint(top + 1, height)
+        detections.append(
+            (rng.randrange(num_classes), rng.random(), left, top, right, bottom)
+        )
+    return detections
+
+
+def build_object_detection_payload(
+    detections: Sequence[Optional[Detection]],
+    area_counts: Optional[Dict[int, int]] = None,
+) -> bytes:
+    """
+    SmartCamera の Builder 関数で ObjectDetectionTop バッファを組み立てる。
+    area_counts を渡すと AreaCount ベクタも付ける。
+    detections の None は BoundingBox を持たない検出（デコード時に読み飛ばされる）になる。
+    """
+    builder = flatbuffers.Builder(64 + 48 * len(detections))
+
+    objects = []
+    for detection in detections:
+        if detection is None:
+            GeneralObject.GeneralObjectStart(builder)
+            objects.append(GeneralObject.GeneralObjectEnd(builder))
+            continue
+        class_id, score, left, top, right, bottom = detection
+        BoundingBox2d.BoundingBox2dStart(builder)
+        BoundingBox2d.BoundingBox2dAddLeft(builder, left)
+        BoundingBox2d.BoundingBox2dAddTop(builder, top)
+        BoundingBox2d.BoundingBox2dAddRight(builder, right)
+        BoundingBox2d.BoundingBox2dAddBottom(builder, bottom)
+        bbox = BoundingBox2d.BoundingBox2dEnd(builder)
+
+        GeneralObject.GeneralObjectStart(builder)
+        GeneralObject.GeneralObjectAddClassId(builder, class_id)
+        GeneralObject.GeneralObjectAddBoundingBoxType(
+            builder, BoundingBox.BoundingBox.BoundingBox2d
+        )
+        GeneralObject.GeneralObjectAddBoundingBox(builder, bbox)
+        GeneralObject.GeneralObjectAddScore(builder, score)
+        objects.append(GeneralObject.GeneralObjectEnd(builder))
+
+    ObjectDetectionData.ObjectDetectionDataStartObjectDetectionListVector(
+        builder, len(objects)
+    )
+    for obj in reversed(objects):
+        builder.PrependUOffsetTRelative(obj)
+    object_list = builder.EndVector()
+
+    ObjectDetectionData.ObjectDetectionDataStart(builder)
+    ObjectDetectionData.ObjectDetectionDataAddObjectDetectionList(builder, object_list)
+    perception = ObjectDetectionData.ObjectDetectionDataEnd(builder)
+
+    area_count = None
+    if area_counts is not None:
+        counts = []
+        for class_id, count in sorted(area_counts.items()):
+            CountData.CountDataStart(builder)
+            CountData.CountDataAddClassId(builder, class_id)
+            CountData.CountDataAddCount(builder, count)
+            counts.append(CountData.CountDataEnd(builder))
+        ObjectDetectionTop.ObjectDetectionTopStartAreaCountVector(builder, len(counts))
+        for c in reversed(counts):
+            builder.PrependUOffsetTRelative(c)
+        area_count = builder.EndVector()
+
+    ObjectDetectionTop.ObjectDetectionTopStart(builder)
+    ObjectDetectionTop.ObjectDetectionTopAddPerception(builder, perception)
+    if area_count is not None:
+        ObjectDetectionTop.ObjectDetectionTopAddAreaCount(builder, area_count)
+    builder.Finish(ObjectDetectionTop.ObjectDetectionTopEnd(builder))
+    return bytes(builder.Output())
+
+
+def build_inference_item(
+    device_id: str,
+    timestamp: str,
+    payload: bytes,
+) -> dict:
+    """
+    コンソールの /inferenceresults/devices/<id> が返す data 要素1件と同じ形の dict を作る。
+    """
+    return {
+        "id": f"{device_id}-{timestamp}",
+        "device_id": device_id,
+        "inference_result": {
+            "DeviceID": device_id,
+            "Inferences": [
+                {"T": timestamp, "O": base64.b64encode(payload).decode("ascii")}
+            ],
+        },
+    }
@@ -26,14 +26,34 @@ from Repository.user_repository import (
     InMemoryUserRepository,
     SqliteUserRepository,
 )
+from Repository.room_repository import InMemoryRoomRepository, SqliteRoomRepository
 from Repository.db import init_db
+from Repository.inference_log import InferenceLogWriter
 from Services.penalty_service import PenaltyService
 from Services.room_state_manager import RoomStateManager
 from Services.occupancy_provider import (
     OccupancyProvider,
     CameraOccupancyProvider,
     DummyOccupancyProvider,
+    FleetOccupancyProvider,
+    ResilientOccupancyProvider,
 )
+from Services.circuit_breaker import CircuitBreaker
+from Services.fleet_poller import FleetPoller
+from Services.occupancy_pipeline import (
+    ChannelOccupancyProvider,
+    LatestValueChannel,
+    OccupancyFetcher,
+    OccupancySample,
+)
+from Services.deadline_scheduler import DeadlineScheduler
+from Services.adaptive_poller import AdaptivePollingPolicy
+from Services.monitoring_engine import MonitoringEngine
+from Services.batch_state_engine import BatchStateEngine
+from Services.availability_service import AvailabilityService
+from Domain.room import Room
+from Domain.reservation import ReservationStatus
+from Services.decode_pool import DecodePool
 
 load_dotenv()
 
@@ -41,6 +61,7 @@ load_dotenv()
 MIN_RESERVE_MINUTES = int(os.getenv("MIN_RESERVE_MINUTES", "15"))  # 最短 15 分
 MAX_RESERVE_MINUTES = int(os.getenv("MAX_RESERVE_MINUTES", "120"))  # 最長 120 分
 MAX_RESERVE_DAYS_AHEAD = int(os.getenv("MAX_RESERVE_DAYS_AHEAD", "7"))  # 7日先まで
+RESERVATION_BUFFER_MINUTES = 5  # 予約と予約の間に空ける時間（前後それぞれ）
 
 log = logging.getLogger("werkzeug")
 log.setLevel(logging.ERROR)
@@ -50,8 +71,32 @@ app.secret_key = os.getenv("SECRET_KEY", "dev_secret_key")  # セッション利
 
 # --- 設定 ---
 POLLING_INTERVAL = 5  # 秒 (設計仕様)
+# カメラ取得のサーキットブレーカー: 連続失敗回数・開いてから再試行するまでの秒数
+CAMERA_BREAKER_FAILURES = int(os.getenv("CAMERA_BREAKER_FAILURES", "3"))
+CAMERA_BREAKER_RESET_SEC = float(os.getenv("CAMERA_BREAKER_RESET_SEC", "30"))
+# カメラが取れないとき、最後に取れた占有状態を何秒まで使い続けるか
+OCCUPANCY_MAX_STALE_SEC = float(os.getenv("OCCUPANCY_MAX_STALE_SEC", "60"))
+# カメラモードでは取得を別スレッドに分け、評価ループはチャネルの最新サンプルだけを見る
+OCCUPANCY_PIPELINE = os.getenv("OCCUPANCY_PIPELINE", "true").lower() == "true"
+# パイプライン使用時、予約ウィンドウ外ではカメラ取得間隔を POLL_FLOOR_SEC から POLL_CEILING_SEC まで伸ばす
+ADAPTIVE_POLLING = os.getenv("ADAPTIVE_POLLING", "true").lower() == "true"
+POLL_FLOOR_SEC = float(os.getenv("POLL_FLOOR_SEC", "30"))
+POLL_CEILING_SEC = float(os.getenv("POLL_CEILING_SEC", "900"))
+# STATE_SCHEDULER=deadline なら、遷移期限・占有変化・予約変更のときだけ評価する（polling なら5秒ごと）
+STATE_SCHEDULER = os.getenv("STATE_SCHEDULER", "deadline").lower()
+# 複数部屋を監視するときのワーカー（シャード）数
+ENGINE_WORKERS = int(os.getenv("ENGINE_WORKERS", "4"))
+# ENGINE_KIND=batch なら、全部屋の状態遷移を NumPy でまとめて計算する BatchStateEngine を使う
+ENGINE_KIND = os.getenv("ENGINE_KIND", "sharded").lower()
 
 # --- インスタンス初期化 ---
+# INFERENCE_LOG_DIR が指定されていれば、カメラの生ペイロードを記録する（障害再現のリプレイ用）
+inference_recorder = (
+    InferenceLogWriter(os.getenv("INFERENCE_LOG_DIR"))
+    if os.getenv("INFERENCE_LOG_DIR")
+    else None
+)
+
 # カメラリポジトリ (Device IDは.envから取得)
 ai_camera_repository = Repository.AiCameraRepository(
     console_endpoint=os.getenv("CONSOLE_ENDPOINT"),
@@ -59,10 +104,11 @@ ai_camera_repository = Repository.AiCameraRepository(
     client_id=os.getenv("CLIENT_ID"),
     client_secret=os.getenv("CLIENT_SECRET"),
     device_id=os.getenv("DEVICE_ID"),
+    recorder=inference_recorder,
 )
 
-# 部屋の状態管理 (今回は1部屋のみを想定。複数カメラの場合はリストで管理)
-ROOM_ID = "Room-A"
+# 既定の部屋（部屋レジストリが空のときに登録する / room_id 省略時に使う）
+ROOM_ID = os.getenv("ROOM_ID", "Room-A")
 
 # 環境変数 USE_SQLITE でバックエンドを切り替え
 USE_SQLITE = os.getenv("USE_SQLITE", "false").lower() == "true"
@@ -71,22 +117,72 @@ if USE_SQLITE:
     print("[Config] Using SqliteReservationRepository / SqlitePenaltyRepository / SqliteUserRepository")
     # SQLite テーブルがなければ作成
     init_db()
-    reservation_repo = SqliteReservationRepository(buffer_minutes=5)
+    reservation_repo = SqliteReservationRepository(buffer_minutes=RESERVATION_BUFFER_MINUTES)
     penalty_repo = SqlitePenaltyRepository()
     user_repo = SqliteUserRepository()
+    room_repo = SqliteRoomRepository()
 else:
     print("[Config] Using InMemoryReservationRepository / InMemoryPenaltyRepository / InMemoryUserRepository")
-    reservation_repo = InMemoryReservationRepository(buffer_minutes=5)
+    reservation_repo = InMemoryReservationRepository(buffer_minutes=RESERVATION_BUFFER_MINUTES)
     penalty_repo = InMemoryPenaltyRepository()
     user_repo = InMemoryUserRepository()
+    room_repo = InMemoryRoomRepository()
 
 penalty_service = PenaltyService(penalty_repo)
+availability_service = AvailabilityService(
+    reservation_repo,
+    buffer_minutes=RESERVATION_BUFFER_MINUTES,
+    min_minutes=MIN_RESERVE_MINUTES,
+    max_minutes=MAX_RESERVE_MINUTES,
+)
+
+
+def _parse_rooms_env(value: str) -> list[Room]:
+    """
+    ROOMS="Room-A=dev1;dev2,Room-B=dev3" 形式を Room のリストにする。
+    """
+    rooms = []
+    for entry in value.split(","):
+        room_id, _, devices = entry.strip().partition("=")
+        if room_id:
+            rooms.append(
+                Room(
+                    room_id=room_id,
+                    name=room_id,
+                    device_ids=[d.strip() for d in devices.split(";") if d.strip()],
+                )
+            )
+    return rooms
+
+
+# 部屋レジストリ: ROOMS で指定された部屋を登録し、空なら既定の部屋だけを登録する
+if os.getenv("ROOMS"):
+    room_repo.upsert_rooms(_parse_rooms_env(os.getenv("ROOMS")))
+rooms = room_repo.list_rooms()
+if not rooms:
+    default_device = os.getenv("DEVICE_ID")
+    rooms = [
+        room_repo.upsert_room(
+            Room(
+                room_id=ROOM_ID,
+                name=ROOM_ID,
+                device_ids=[default_device] if default_device else [],
+            )
+        )
+    ]
+if room_repo.get_room(ROOM_ID) is None:
+    ROOM_ID = rooms[0].room_id
+
+# 2部屋以上なら MonitoringEngine で全部屋を監視する（1部屋なら従来の単一部屋パイプライン）
+MULTI_ROOM = len(rooms) > 1
 
 room_manager = RoomStateManager(
     room_id=ROOM_ID,
     reservation_repo=reservation_repo,
     penalty_service=penalty_service,
 )
+for _name, _value in room_repo.get_room(ROOM_ID).state_params().items():
+    setattr(room_manager, _name, _value)
 
 # 最新の状態を保持する変数（API返却用）
 system_status = {
@@ -100,37 +196,71 @@ system_status = {
 }
 
 occupancy_provider: OccupancyProvider | None = None
+# 複数カメラ構成のときだけ使う
+fleet_poller: FleetPoller | None = None
+# OCCUPANCY_PIPELINE 有効時の取得スレッド
+occupancy_fetcher: OccupancyFetcher | None = None
+# STATE_SCHEDULER=deadline 時のスケジューラ
+state_scheduler: DeadlineScheduler | None = None
+# ADAPTIVE_POLLING 有効時の取得間隔ポリシー
+polling_policy: AdaptivePollingPolicy | None = None
+# MULTI_ROOM 時の監視エンジン
+monitoring_engine: MonitoringEngine | BatchStateEngine | None = None
+
+
+def evaluate_room(room_id: str, current_time: datetime) -> datetime | None:
+    """
+    部屋の占有状態で RoomStateManager を評価して system_status を更新し、
+    次に時間で遷移が起こりうる時刻を返す。
+    """
+    global system_status
+
+    is_occupied = occupancy_provider.get_is_occupied(current_time)
+
+    state_info = room_manager.update_state(is_occupied, current_time)
+
+    # Stub: 占有中なら 1, 空なら 0 として人数を入れておく
+    people_count = 1 if is_occupied else 0
+
+    system_status = {
+        "timestamp": format_jst_iso(current_time),
+        "room_id": room_id,
+        "people_count": people_count,
+        "is_used": is_occupied,
+        "room_state": state_info["state"],
+        "reservation_id": state_info["reservation_id"],
+        "alert": state_info["alert"],
+    }
+    return room_manager.next_deadline(current_time)
 
 
 def background_monitoring_task():
-    global system_status, occupancy_provider
     print("Monitoring task started.")
 
+    if monitoring_engine is not None:
+        monitoring_engine.run_forever(POLLING_INTERVAL)
+        return
+
+    if state_scheduler is not None:
+        state_scheduler.run_forever()
+        return
+
     while True:
+        tick_started = time.monotonic()
         try:
             current_time = now_jst()
 
-            is_occupied = occupancy_provider.get_is_occupied(current_time)
+            if fleet_poller is not None and occupancy_fetcher is None:
+                # 全カメラ分を並行取得して FleetOccupancyProvider に配る
+                fleet_poller.poll_once()
 
-            state_info = room_manager.update_state(is_occupied, current_time)
-
-            # Stub: 占有中なら 1, 空なら 0 として人数を入れておく
-            people_count = 1 if is_occupied else 0
-
-            system_status = {
-                "timestamp": format_jst_iso(current_time),
-                "room_id": ROOM_ID,
-                "people_count": people_count,
-                "is_used": is_occupied,
-                "room_state": state_info["state"],
-                "reservation_id": state_info["reservation_id"],
-                "alert": state_info["alert"],
-            }
+            evaluate_room(ROOM_ID, current_time)
 
         except Exception as e:
             print(f"Error in monitoring task: {e}")
 
-        time.sleep(POLLING_INTERVAL)
+        # tick の処理時間を差し引いて、POLLING_INTERVAL ごとに評価する
+        time.sleep(max(0.0, POLLING_INTERVAL - (time.monotonic() - tick_started)))
 
 
 def create_occupancy_provider(
@@ -138,13 +268,80 @@ def create_occupancy_provider(
 ) -> OccupancyProvider:
     """
     環境変数 OCCUPANCY_MODE に応じて、
-    CameraOccupancyProvider / DummyOccupancyProvider のどちらかを返す。
+    CameraOccupancyProvider (ResilientOccupancyProvider で包む) / DummyOccupancyProvider のどちらかを返す。
+    複数カメラ (DEVICE_IDS) の場合は FleetOccupancyProvider を返し、fleet_poller を設定する。
+    カメラモードで OCCUPANCY_PIPELINE が有効なら、それらを occupancy_fetcher に渡し、
+    ChannelOccupancyProvider を返す。
     """
+    global fleet_poller
     mode = os.getenv("OCCUPANCY_MODE", "dummy").lower()
 
     if mode == "camera":
-        print("[Config] Using CameraOccupancyProvider")
-        return CameraOccupancyProvider(ai_repo)
+        # OCCUPANCY_COUNT_MODE=area_count なら AreaCount ベクタだけを読む（なければ bbox をデコード）
+        count_mode = os.getenv("OCCUPANCY_COUNT_MODE", "area_count").lower()
+        if count_mode not in CameraOccupancyProvider.COUNT_MODES:
+            print(f"[Config] Unknown OCCUPANCY_COUNT_MODE={count_mode}, fallback to area_count")
+            count_mode = "area_count"
+        raw_ids = os.getenv("PERSON_CLASS_IDS", "").strip()
+        person_class_ids = (
+            [int(c) for c in raw_ids.split(",") if c.strip()] if raw_ids else None
+        )
+
+        # DEVICE_IDS (カンマ区切り) で複数カメラが指定されていれば、FleetPoller で並行取得する
+        device_ids = [
+            d.strip() for d in os.getenv("DEVICE_IDS", "").split(",") if d.strip()
+        ]
+        if len(device_ids) > 1:
+            max_workers = int(os.getenv("FLEET_MAX_WORKERS", "8"))
+            print(
+                f"[Config] Using FleetOccupancyProvider "
+                f"(devices={device_ids}, max_workers={max_workers})"
+            )
+            # DECODE_WORKERS > 0 ならデコードをワーカープール (DECODE_POOL_KIND=thread/process) に逃がす
+            decode_workers = int(os.getenv("DECODE_WORKERS", "0"))
+            decode_pool = None
+            if decode_workers > 0:
+                decode_kind = os.getenv("DECODE_POOL_KIND", "thread").lower()
+                if decode_kind not in DecodePool.KINDS:
+                    print(f"[Config] Unknown DECODE_POOL_KIND={decode_kind}, fallback to thread")
+                    decode_kind = "thread"
+                print(f"[Config] Using DecodePool (kind={decode_kind}, workers={decode_workers})")
+                decode_pool = DecodePool(
+                    workers=decode_workers,
+                    kind=decode_kind,
+                    prefer_area_count=count_mode == "area_count",
+                )
+
+            provider = FleetOccupancyProvider(
+                device_ids, person_class_ids, max_stale_sec=OCCUPANCY_MAX_STALE_SEC
+            )
+            fleet_poller = FleetPoller(
+                ai_repo,
+                max_workers=max_workers,
+                prefer_area_count=count_mode == "area_count",
+                decode_pool=decode_pool,
+                breaker_factory=lambda: CircuitBreaker(
+                    CAMERA_BREAKER_FAILURES, CAMERA_BREAKER_RESET_SEC
+                ),
+            )
+            fleet_poller.register(provider)
+        else:
+            print(
+                f"[Config] Using CameraOccupancyProvider "
+                f"(count_mode={count_mode}, person_class_ids={person_class_ids})"
+            )
+            # 障害時は即失敗させ、直近の値で代替する
+            provider = ResilientOccupancyProvider(
+                CameraOccupancyProvider(
+                    ai_repo, count_mode=count_mode, person_class_ids=person_class_ids
+                ),
+                breaker=CircuitBreaker(CAMERA_BREAKER_FAILURES, CAMERA_BREAKER_RESET_SEC),
+                max_stale_sec=OCCUPANCY_MAX_STALE_SEC,
+            )
+
+        if OCCUPANCY_PIPELINE:
+            return create_occupancy_pipeline(provider)
+        return provider
     elif mode == "dummy":
         print("[Config] Using DummyOccupancyProvider")
         return DummyOccupancyProvider(initial=False)
@@ -154,6 +351,167 @@ def create_occupancy_provider(
         return DummyOccupancyProvider(initial=False)
 
 
+def create_occupancy_pipeline(provider: OccupancyProvider) -> ChannelOccupancyProvider:
+    """
+    provider（と fleet_poller）を取得スレッド occupancy_fetcher に任せ、
+    評価ループ用に最新サンプルを読む ChannelOccupancyProvider を返す。
+    取得スレッドの起動は呼び出し側で行う。
+    """
+    global occupancy_fetcher, polling_policy
+    print("[Config] Using occupancy pipeline (fetcher thread + latest-value channel)")
+    channel = LatestValueChannel()
+    if ADAPTIVE_POLLING:
+        print(
+            f"[Config] Using AdaptivePollingPolicy "
+            f"(floor={POLL_FLOOR_SEC}s, ceiling={POLL_CEILING_SEC}s)"
+        )
+        polling_policy = AdaptivePollingPolicy(
+            reservation_repo,
+            room_manager,
+            fast_interval_sec=POLLING_INTERVAL,
+            floor_sec=POLL_FLOOR_SEC,
+            ceiling_sec=POLL_CEILING_SEC,
+        )
+    occupancy_fetcher = OccupancyFetcher(
+        provider,
+        channel,
+        interval_sec=POLLING_INTERVAL,
+        poller=fleet_poller,
+        next_interval=polling_policy.next_interval if polling_policy else None,
+    )
+    if polling_policy is not None:
+        # 予約が入ったら、バックオフ中でもすぐに取得間隔を計算し直させる
+        reservation_repo.add_listener(lambda room_id: occupancy_fetcher.wake())
+    # 取得スレッドが止まっても、古いサンプルで判定し続けないようにする。
+    # 鮮度は次の取得予定から数えるので、バックオフで間隔が延びている間は最後のサンプルを使い続ける
+    return ChannelOccupancyProvider(
+        channel,
+        max_sample_age_sec=OCCUPANCY_MAX_STALE_SEC,
+        next_fetch_at=occupancy_fetcher.next_fetch_at,
+    )
+
+
+_last_sample_occupied: bool | None = None
+
+
+def _on_occupancy_sample(sample: OccupancySample) -> None:
+    """
+    占有状態が前回のサンプルから変わったときだけ、スケジューラに部屋を評価させる。
+    """
+    global _last_sample_occupied
+    if sample.is_occupied != _last_sample_occupied:
+        _last_sample_occupied = sample.is_occupied
+        state_scheduler.mark_dirty(ROOM_ID)
+
+
+def create_state_scheduler() -> DeadlineScheduler | None:
+    """
+    STATE_SCHEDULER=deadline で、占有状態の変化を通知できる構成（パイプライン / dummy）なら
+    DeadlineScheduler を作って返す。それ以外は None（5秒ごとのポーリングで評価する）。
+    """
+    if STATE_SCHEDULER != "deadline":
+        print(f"[Config] Using polling monitor (interval={POLLING_INTERVAL}s)")
+        return None
+    if occupancy_fetcher is None and not isinstance(
+        occupancy_provider, DummyOccupancyProvider
+    ):
+        print("[Config] Occupancy pipeline is disabled, fallback to polling monitor")
+        return None
+
+    print("[Config] Using DeadlineScheduler")
+    scheduler = DeadlineScheduler(evaluate_room, room_ids=[ROOM_ID])
+    reservation_repo.add_listener(scheduler.mark_dirty)
+    if occupancy_fetcher is not None:
+        occupancy_fetcher.channel.subscribe(_on_occupancy_sample)
+    return scheduler
+
+
+def fleet_polling_task():
+    """
+    MULTI_ROOM のカメラモードで、全カメラ分を POLLING_INTERVAL ごとに並行取得する。
+    監視エンジンの tick とは別スレッドで回すので、カメラが遅くても状態評価は遅れない。
+    """
+    while True:
+        started = time.monotonic()
+        try:
+            fleet_poller.poll_once()
+        except Exception as e:
+            print(f"Error in fleet polling task: {e}")
+        time.sleep(max(0.0, POLLING_INTERVAL - (time.monotonic() - started)))
+
+
+def create_monitoring_engine(
+    ai_repo: Repository.AiCameraRepository, rooms: list[Room]
+) -> MonitoringEngine | BatchStateEngine:
+    """
+    部屋レジストリの全部屋を MonitoringEngine (ENGINE_KIND=batch なら BatchStateEngine) に登録して返す。
+    OCCUPANCY_MODE=camera なら部屋ごとに FleetOccupancyProvider を作り、
+    全部屋のカメラを1つの fleet_poller で取得する。dummy なら部屋ごとに DummyOccupancyProvider。
+    """
+    global fleet_poller
+    mode = os.getenv("OCCUPANCY_MODE", "dummy").lower()
+
+    if mode == "camera":
+        count_mode = os.getenv("OCCUPANCY_COUNT_MODE", "area_count").lower()
+        raw_ids = os.getenv("PERSON_CLASS_IDS", "").strip()
+        person_class_ids = (
+            [int(c) for c in raw_ids.split(",") if c.strip()] if raw_ids else None
+        )
+        fleet_poller = FleetPoller(
+            ai_repo,
+            max_workers=int(os.getenv("FLEET_MAX_WORKERS", "8")),
+            prefer_area_count=count_mode == "area_count",
+            breaker_factory=lambda: CircuitBreaker(
+                CAMERA_BREAKER_FAILURES, CAMERA_BREAKER_RESET_SEC
+            ),
+        )
+
+        def provider_factory(room: Room) -> OccupancyProvider:
+            provider = FleetOccupancyProvider(
+                room.device_ids, person_class_ids, max_stale_sec=OCCUPANCY_MAX_STALE_SEC
+            )
+            fleet_poller.register(provider)
+            return provider
+
+    else:
+
+        def provider_factory(room: Room) -> OccupancyProvider:
+            return DummyOccupancyProvider(initial=False)
+
+    if ENGINE_KIND == "batch":
+        print(
+            f"[Config] Using BatchStateEngine (rooms={len(rooms)}, occupancy_mode={mode})"
+        )
+        engine = BatchStateEngine(
+            reservation_repo, penalty_service, provider_factory, capacity=len(rooms)
+        )
+    else:
+        print(
+            f"[Config] Using MonitoringEngine "
+            f"(rooms={len(rooms)}, workers={ENGINE_WORKERS}, occupancy_mode={mode})"
+        )
+        engine = MonitoringEngine(
+            reservation_repo, penalty_service, provider_factory, workers=ENGINE_WORKERS
+        )
+    engine.add_rooms(rooms)
+    return engine
+
+
+def get_room_status(room_id: str) -> dict | None:
+    """
+    部屋1つの最新状態。未登録の部屋なら None。
+    """
+    if monitoring_engine is not None:
+        return monitoring_engine.get_status(room_id)
+    return system_status if room_id == ROOM_ID else None
+
+
+def get_room_manager(room_id: str) -> RoomStateManager | None:
+    if monitoring_engine is not None:
+        return monitoring_engine.get_manager(room_id)
+    return room_manager if room_id == ROOM_ID else None
+
+
 # --- API Routes ---
 
 
@@ -161,8 +519,32 @@ def create_occupancy_provider(
 def get_status():
     """
     現在の部屋の状態と推論の生データを返す
+
+    - ?room_id=Room-B          : その部屋の状態（省略時は既定の部屋）
+    - ?room_ids=Room-A,Room-B  : 指定部屋の状態をまとめて {"rooms": [...]} で返す
+    - ?all=true                : 全部屋の状態をまとめて返す
+    """
+    room_ids = request.args.get("room_ids")
+    if room_ids is not None or request.args.get("all", "").lower() == "true":
+        if monitoring_engine is not None:
+            ids = [r for r in room_ids.split(",") if r] if room_ids else None
+            return jsonify({"rooms": monitoring_engine.get_statuses(ids)})
+        ids = room_ids.split(",") if room_ids else [ROOM_ID]
+        return jsonify({"rooms": [system_status] if ROOM_ID in ids else []})
+
+    room_id = request.args.get("room_id", ROOM_ID)
+    status = get_room_status(room_id)
+    if status is None:
+        return jsonify({"error": f"unknown room_id: {room_id}"}), 404
+    return jsonify(status)
+
+
+@app.route("/api/rooms")
+def api_list_rooms():
     """
-    return jsonify(system_status)
+    部屋レジストリ（部屋・カメラ・判定パラメータ）の一覧を返す
+    """
+    return jsonify([r.to_dict() for r in room_repo.list_rooms()])
 
 
 @app.route("/")
@@ -192,6 +574,41 @@ def debug_inference():
     return ai_camera_repository.fetch_inference_result()
 
 
+@app.route("/debug/scheduler")
+def debug_scheduler():
+    """
+    DeadlineScheduler の統計（評価回数・起床理由・次の期限）を返す
+    （MULTI_ROOM 時は MonitoringEngine の統計）
+    """
+    if monitoring_engine is not None:
+        return jsonify(
+            {"mode": "engine", "engine_kind": ENGINE_KIND, **monitoring_engine.stats()}
+        )
+    if state_scheduler is None:
+        return jsonify({"mode": "polling", "interval_sec": POLLING_INTERVAL})
+    return jsonify({"mode": "deadline", **state_scheduler.stats()})
+
+
+@app.route("/debug/camera/stats")
+def debug_camera_stats():
+    """
+    カメラリポジトリの統計情報（トークンキャッシュの hit/miss/refresh、ブレーカーの状態等）を返す
+    """
+    stats = ai_camera_repository.get_stats()
+    if fleet_poller is not None:
+        stats["fleet"] = fleet_poller.stats()
+    # ブレーカーの状態と、前回値で代替した回数
+    if occupancy_fetcher is not None:
+        # 取得スレッド・チャネルの統計（背圧・間引き）と、その中のプロバイダの統計
+        stats["pipeline"] = occupancy_fetcher.stats()
+        stats["pipeline"]["stale_samples"] = occupancy_provider.stale_samples
+        if polling_policy is not None:
+            stats["pipeline"]["polling_policy"] = polling_policy.stats()
+    elif isinstance(occupancy_provider, (ResilientOccupancyProvider, FleetOccupancyProvider)):
+        stats["occupancy"] = occupancy_provider.stats()
+    return jsonify(stats)
+
+
 @app.route("/debug/reservations", methods=["POST"])
 def debug_create_reservation():
     """
@@ -248,19 +665,27 @@ def debug_set_occupancy():
     デバッグ用: ダミーモード時に占有状態をオン/オフ切り替えるAPI。
 
     body 例:
-    { "occupied": true }
+    { "occupied": true, "room_id": "Room-A" }   # room_id 省略時は ROOM_ID
     """
     global occupancy_provider
 
-    if not isinstance(occupancy_provider, DummyOccupancyProvider):
+    data = request.get_json(force=True) or {}
+    room_id = data.get("room_id", ROOM_ID)
+    if monitoring_engine is not None:
+        provider = monitoring_engine.get_provider(room_id)
+    else:
+        provider = occupancy_provider if room_id == ROOM_ID else None
+
+    if not isinstance(provider, DummyOccupancyProvider):
         return jsonify({"error": "DummyOccupancyProvider is not active"}), 400
 
-    data = request.get_json(force=True) or {}
     occupied = bool(data.get("occupied"))
 
-    occupancy_provider.set_occupied(occupied)
+    provider.set_occupied(occupied)
+    if state_scheduler is not None:
+        state_scheduler.mark_dirty(room_id)
 
-    return jsonify({"occupied": occupied})
+    return jsonify({"occupied": occupied, "room_id": room_id})
 
 
 @app.route("/debug/state_params", methods=["GET", "POST"])
@@ -269,10 +694,15 @@ def debug_state_params():
     RoomStateManager の時間パラメータを確認・変更するためのデバッグ用エンドポイント。
     GET: 現在値を返す
     POST: 指定された値だけ上書きする
+    ?room_id=... で部屋を指定する（省略時は ROOM_ID）
     """
     from flask import jsonify, request
 
-    # ここで room_manager はグローバルを前提にしている
+    room_id = request.args.get("room_id", ROOM_ID)
+    room_manager = get_room_manager(room_id)
+    if room_manager is None:
+        return jsonify({"error": f"unknown room_id: {room_id}"}), 404
+
     if request.method == "GET":
         return jsonify(
             {
@@ -304,6 +734,14 @@ def debug_state_params():
     room_manager.cleanup_margin_sec = _int_or_default(
         "cleanup_margin_sec", room_manager.cleanup_margin_sec
     )
+    # 期限が変わるので評価し直させる
+    if monitoring_engine is not None:
+        monitoring_engine.mark_dirty(room_id)
+    if state_scheduler is not None:
+        state_scheduler.mark_all_dirty()
+    if polling_policy is not None:
+        polling_policy.reset()
+        occupancy_fetcher.wake()
 
     return jsonify(
         {
@@ -315,6 +753,20 @@ def debug_state_params():
     )
 
 
+def _on_clock_changed() -> None:
+    """
+    仮想時計が飛んだので、眠っている期限・取得間隔を計算し直させる。
+    """
+    if monitoring_engine is not None:
+        monitoring_engine.mark_all_dirty()
+    if state_scheduler is not None:
+        state_scheduler.mark_all_dirty()
+    if polling_policy is not None:
+        polling_policy.reset()
+    if occupancy_fetcher is not None:
+        occupancy_fetcher.wake()
+
+
 @app.route("/debug/time", methods=["GET"])
 def debug_get_time():
     """
@@ -330,6 +782,7 @@ def debug_set_time():
 
     if mode == "real":
         clear_simulated_time()
+        _on_clock_changed()
         return jsonify(get_time_status())
 
     if mode == "simulated":
@@ -348,6 +801,7 @@ def debug_set_time():
         except ValueError as e:
             return jsonify({"error": str(e)}), 400
 
+        _on_clock_changed()
         return jsonify(get_time_status())
 
     return jsonify({"error": "mode must be 'real' or 'simulated'"}), 400
@@ -438,43 +892,179 @@ def api_room_status():
     現在の部屋状態（room_state, is_occupied, reservation_id, alert 等）を返す。
     ※現状の index() と同じ中身で構わない。
     """
-    return jsonify(system_status)
+    room_id = request.args.get("room_id", ROOM_ID)
+    status = get_room_status(room_id)
+    if status is None:
+        return jsonify({"error": f"unknown room_id: {room_id}"}), 404
+    return jsonify(status)
 
 
 @app.route("/api/reservations", methods=["GET"])
 def api_list_reservations():
-    user_id = request.args.get("user_id")
-    date_str = request.args.get("date")  # "2025-11-29" など
+    """
+    予約一覧（開始時刻順）。絞り込みは reservation_repo.query_reservations に任せる。
+
+    クエリ:
+      room_id  (既定は ROOM_ID)
+      user_id
+      date     "2025-11-29" … その日に始まる予約（from / to より優先）
+      from, to ISO8601 … from <= start_time < to
+      status   "ACTIVE,USED" のようにカンマ区切り
+      limit    1 ページの件数（既定 100）
+      cursor   前のページの next_cursor
+    返り値: {"reservations": [...], "next_cursor": str | null}
+    """
+    room_id = request.args.get("room_id", ROOM_ID)
+    user_id = request.args.get("user_id") or None
+
+    try:
+        date_str = request.args.get("date")  # "2025-11-29" など
+        if date_str:
+            start_from = parse_jst_datetime(date_str).replace(
+                hour=0, minute=0, second=0, microsecond=0
+            )
+            start_to = start_from + timedelta(days=1)
+        else:
+            start_from = (
+                parse_jst_datetime(request.args["from"]) if request.args.get("from") else None
+            )
+            start_to = parse_jst_datetime(request.args["to"]) if request.args.get("to") else None
+    except ValueError:
+        return jsonify({"error": "date must be YYYY-MM-DD, from/to must be ISO8601"}), 400
+
+    statuses = None
+    if request.args.get("status"):
+        try:
+            statuses = [
+                ReservationStatus(s.strip().upper())
+                for s in request.args["status"].split(",")
+                if s.strip()
+            ]
+        except ValueError:
+            return jsonify({"error": "unknown status"}), 400
 
-    all_res = reservation_repo.get_reservations_for_room(ROOM_ID)
+    try:
+        reservations, next_cursor = reservation_repo.query_reservations(
+            room_id=room_id,
+            user_id=user_id,
+            start_from=start_from,
+            start_to=start_to,
+            statuses=statuses,
+            limit=int(request.args.get("limit", "100")),
+            cursor=request.args.get("cursor") or None,
+        )
+    except ValueError as e:
+        # limit / cursor の形式違い
+        return jsonify({"error": str(e)}), 400
 
-    result = []
-    for r in all_res:
-        # user_id で絞る
-        if user_id and r.user_id != user_id:
-            continue
+    result = [
+        {
+            "reservation_id": r.reservation_id,
+            "user_id": r.user_id,
+            "room_id": r.room_id,
+            "start_time": r.start_time.isoformat(),
+            "end_time": r.end_time.isoformat(),
+            "status": r.status.value,
+        }
+        for r in reservations
+    ]
+    return jsonify({"reservations": result, "next_cursor": next_cursor})
 
-        # date で絞る（start_time の日付で判定）
-        if date_str:
-            try:
-                target_date = datetime.fromisoformat(date_str).date()
-            except ValueError:
-                return jsonify({"error": "date must be YYYY-MM-DD"}), 400
-            if r.start_time.date() != target_date:
-                continue
 
-        result.append(
-            {
-                "reservation_id": r.reservation_id,
-                "user_id": r.user_id,
-                "room_id": r.room_id,
-                "start_time": r.start_time.isoformat(),
-                "end_time": r.end_time.isoformat(),
-                "status": r.status.value,
-            }
+def _parse_availability_day(date_str: str | None):
+    try:
+        return datetime.fromisoformat(date_str).date() if date_str else None
+    except ValueError:
+        return None
+
+
+@app.route("/api/availability")
+def api_availability():
+    """
+    部屋の1日分の空き時間（バッファ・最短/最長の予約時間を考慮）を返す。
+
+    クエリ: room_id（既定は ROOM_ID）, date "2025-11-29"
+    返り値: {"room_id", "date", "buffer_minutes", "min_minutes", "max_minutes",
+             "free": [{"start", "end", "max_minutes"}]}
+    過去の時刻と、MAX_RESERVE_DAYS_AHEAD より先の日は空きなしとして返す。
+    """
+    room_id = request.args.get("room_id", ROOM_ID)
+    if room_repo.get_room(room_id) is None:
+        return jsonify({"error": f"unknown room_id: {room_id}"}), 404
+    day = _parse_availability_day(request.args.get("date"))
+    if day is None:
+        return jsonify({"error": "date (YYYY-MM-DD) is required"}), 400
+
+    now = now_jst()
+    free = []
+    if day <= (now + timedelta(days=MAX_RESERVE_DAYS_AHEAD)).date():
+        free = availability_service.free_intervals(room_id, day, now)
+    return jsonify(
+        {
+            "room_id": room_id,
+            "date": day.isoformat(),
+            "buffer_minutes": RESERVATION_BUFFER_MINUTES,
+            "min_minutes": MIN_RESERVE_MINUTES,
+            "max_minutes": MAX_RESERVE_MINUTES,
+            "free": [
+                {
+                    "start": format_jst_iso(f["start"]),
+                    "end": format_jst_iso(f["end"]),
+                    "max_minutes": f["max_minutes"],
+                }
+                for f in free
+            ],
+        }
+    )
+
+
+@app.route("/api/availability/rooms")
+def api_available_rooms():
+    """
+    指定した時間帯に予約を入れられる部屋の一覧。
+
+    クエリ: date "2025-11-29", start_time "15:00", end_time "15:30"（POST /api/reservations と同じ形式）
+    返り値: {"start", "end", "rooms": [room_id, ...]}
+    過去の開始時刻と、MAX_RESERVE_DAYS_AHEAD より先の日は予約できないので rooms は空で返す。
+    """
+    date_str = request.args.get("date")
+    start_hm = request.args.get("start_time")
+    end_hm = request.args.get("end_time")
+    if not date_str or not start_hm or not end_hm:
+        return jsonify({"error": "date, start_time, end_time are required"}), 400
+    try:
+        start_dt = parse_jst_datetime(f"{date_str}T{start_hm}:00+09:00")
+        end_dt = parse_jst_datetime(f"{date_str}T{end_hm}:00+09:00")
+    except ValueError:
+        return jsonify({"error": "invalid date/time format"}), 400
+    if end_dt <= start_dt:
+        return jsonify({"error": "end_time must be after start_time"}), 400
+
+    duration_minutes = (end_dt - start_dt).total_seconds() / 60.0
+    if not MIN_RESERVE_MINUTES <= duration_minutes <= MAX_RESERVE_MINUTES:
+        return (
+            jsonify(
+                {
+                    "error": f"予約時間は {MIN_RESERVE_MINUTES}〜{MAX_RESERVE_MINUTES} 分にしてください"
+                }
+            ),
+            400,
         )
 
-    return jsonify(result)
+    # POST /api/reservations と同じ条件で断られる時間帯は、どの部屋も空いていない扱いにする
+    now = now_jst()
+    latest_allowed = now + timedelta(days=MAX_RESERVE_DAYS_AHEAD)
+    rooms = []
+    if start_dt >= now and start_dt.date() <= latest_allowed.date():
+        room_ids = [r.room_id for r in room_repo.list_rooms()]
+        rooms = availability_service.free_rooms(room_ids, start_dt, end_dt)
+    return jsonify(
+        {
+            "start": format_jst_iso(start_dt),
+            "end": format_jst_iso(end_dt),
+            "rooms": rooms,
+        }
+    )
 
 
 @app.route("/api/reservations", methods=["POST"])
@@ -604,7 +1194,15 @@ def ping():
 
 
 if __name__ == "__main__":
-    occupancy_provider = create_occupancy_provider(ai_camera_repository)
+    if MULTI_ROOM:
+        monitoring_engine = create_monitoring_engine(ai_camera_repository, rooms)
+        if fleet_poller is not None:
+            threading.Thread(target=fleet_polling_task, daemon=True).start()
+    else:
+        occupancy_provider = create_occupancy_provider(ai_camera_repository)
+        state_scheduler = create_state_scheduler()
+        if occupancy_fetcher is not None:
+            occupancy_fetcher.start()
 
     t = threading.Thread(target=background_monitoring_task, daemon=True)
     t.start()
@@ -336,23 +336,31 @@ async function loadReservations() {
   if (userId) params.set("user_id", userId);
   if (date) params.set("date", date);
 
-  const res = await fetch(`/api/reservations?${params.toString()}`);
-  const text = await res.text();
+  // next_cursor が返ってくる間はページを読み足す
+  const data = [];
+  let cursor = null;
+  do {
+    if (cursor) params.set("cursor", cursor);
+    const res = await fetch(`/api/reservations?${params.toString()}`);
+    const text = await res.text();
+
+    let page = null;
+    try {
+      page = JSON.parse(text);
+    } catch (e) {
+      err.textContent = `JSON parse error: ${text}`;
+      return;
+    }
 
-  let data = null;
-  try {
-    data = JSON.parse(text);
-  } catch (e) {
-    err.textContent = `JSON parse error: ${text}`;
-    return;
-  }
+    if (!res.ok || !Array.isArray(page.reservations)) {
+      err.textContent = page.error || "unexpected response";
+      return;
+    }
+    data.push(...page.reservations);
+    cursor = page.next_cursor;
+  } while (cursor);
   err.textContent = "";
 
-  if (!Array.isArray(data)) {
-    err.textContent = "unexpected response";
-    return;
-  }
-
   const tbody = document.querySelector("#reservationsTable tbody");
   const rows = data
     .map((r) => {
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 
 JST = ZoneInfo("Asia/Tokyo")
 
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_EPOCH_JST = _EPOCH.astimezone(JST)
+_US = timedelta(microseconds=1)
+
 # 仮想時計の内部状態
 _use_simulated: bool = False  # True のとき仮想時計を使う
 _scale: float = 1.0  # 1.0: 等速, 10.0: 10倍速 など
@@ -54,6 +58,21 @@ def parse_jst_datetime(s: str) -> datetime:
     return to_jst(dt)
 
 
+def to_epoch_us(dt: datetime) -> int:
+    """
+    datetime を UNIX エポックからのマイクロ秒（整数）にする。naive なら JST とみなす。
+    DB の時刻列（*_us）やバッチ判定で使う。float の秒だと境界で datetime の比較と食い違うので整数で持つ。
+    """
+    return (to_jst(dt) - _EPOCH) // _US
+
+
+def from_epoch_us(us: int) -> datetime:
+    """
+    to_epoch_us の逆。JST tz-aware の datetime を返す。
+    """
+    return _EPOCH_JST + timedelta(microseconds=us)
+
+
 def format_jst_iso(dt: datetime) -> str:
     """
     datetime を JST に統一した上で ISO8601 文字列 (+09:00付き) にする。
@@ -83,6 +102,17 @@ def set_simulated_time(
     _base_sim = to_jst(sim_now)
 
 
+def real_seconds_until(target: datetime) -> float:
+    """
+    （仮想時計を含む）現在時刻から target までの経過に、実時間で何秒かかるかを返す。
+    仮想時計が scale 倍速なら、その分だけ短くなる。過去なら 0 以下。
+    """
+    delta = (to_jst(target) - now_jst()).total_seconds()
+    if _use_simulated:
+        return delta / _scale
+    return delta
+
+
 def clear_simulated_time() -> None:
     global _use_simulated, _scale, _base_real, _base_sim
     _use_simulated = False